@@ -0,0 +1,405 @@
+"""
+Benchmark suite for the models and hot paths of T-RECS.
+
+Each benchmark is run over a grid of numbers of users |U|, items |I| and
+attributes |A|, and reports the number of steps per second and the peak
+memory allocated while running the steps. Results are saved as JSON and can
+be compared against a baseline saved by a previous run, so that performance
+regressions are caught.
+
+Absolute timings depend on the machine, so each run also times a fixed numpy
+kernel (see :func:`calibrate`) and saves the speed of each benchmark relative
+to it. The comparison uses these relative speeds, which makes it less
+sensitive to the speed of the machine, but not to its number of cores or to
+the BLAS library numpy is linked against. `benchmarks/baseline.json` should
+therefore be regenerated on the machine the comparison runs on, before making
+any changes:
+
+    python benchmarks/bench.py --output benchmarks/baseline.json
+
+Usage (from the root of the repository):
+
+    python benchmarks/bench.py                      # full grid
+    python benchmarks/bench.py --quick              # smallest sizes only
+    python benchmarks/bench.py --filter ContentFiltering --output results.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json --tolerance 0.3
+
+The script exits with status 1 if any benchmark is slower (or uses more
+memory) than the baseline by more than the tolerance.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# progress bars of the simulations would flood the output
+os.environ.setdefault("TQDM_DISABLE", "1")
+# make the package importable when the script runs from a source checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+# pylint: disable=wrong-import-position
+from trecs.components import Users, DNUsers  # noqa: E402
+from trecs.matrix_ops import inner_product, slerp, top_k_indices  # noqa: E402
+from trecs.models import (  # noqa: E402
+    BassModel,
+    ContentFiltering,
+    ImplicitMF,
+    PopularityRecommender,
+    SocialFiltering,
+)
+
+# (|U|, |I|, |A|)
+FULL_GRID = [(100, 500, 20), (500, 2000, 50), (1000, 5000, 100)]
+QUICK_GRID = FULL_GRID[:1]
+SEED = 1234
+# size of the matrices multiplied by the calibration kernel
+CALIBRATION_SIZE = 200
+
+
+def _users_and_items(num_users, num_items, num_attributes):
+    """ Random user profiles and item attributes """
+    rng = np.random.default_rng(SEED)
+    users = rng.random((num_users, num_attributes))
+    items = rng.random((num_attributes, num_items))
+    return users, items
+
+
+def _model_step(model):
+    """ Returns a function that runs one timestep of `model` """
+
+    def step():
+        model.run(timesteps=1, repeated_items=True)
+
+    return step
+
+
+def content_filtering(num_users, num_items, num_attributes):
+    users, items = _users_and_items(num_users, num_items, num_attributes)
+    model = ContentFiltering(
+        actual_user_representation=users, actual_item_representation=items, seed=SEED
+    )
+    model.startup_and_train(timesteps=1)
+    return _model_step(model)
+
+
+def social_filtering(num_users, num_items, num_attributes):
+    users, items = _users_and_items(num_users, num_items, num_attributes)
+    # the number of attributes of the model is not |A|, so the actual user
+    # profiles are passed as a Users object
+    model = SocialFiltering(
+        num_users=num_users,
+        num_items=num_items,
+        actual_user_representation=Users(actual_user_profiles=users, seed=SEED),
+        actual_item_representation=items,
+        seed=SEED,
+    )
+    return _model_step(model)
+
+
+def popularity(num_users, num_items, num_attributes):
+    users, items = _users_and_items(num_users, num_items, num_attributes)
+    # the number of attributes of the model is not |A|, so the actual user
+    # profiles are passed as a Users object
+    model = PopularityRecommender(
+        num_users=num_users,
+        num_items=num_items,
+        actual_user_representation=Users(actual_user_profiles=users, seed=SEED),
+        actual_item_representation=items,
+        seed=SEED,
+    )
+    return _model_step(model)
+
+
+def implicit_mf(num_users, num_items, num_attributes):
+    users, items = _users_and_items(num_users, num_items, num_attributes)
+    model = ImplicitMF(
+        actual_user_representation=users,
+        actual_item_representation=items,
+        num_latent_factors=min(num_attributes, 20),
+        seed=SEED,
+    )
+    model.startup_and_train(timesteps=2)
+
+    def step():
+        model.run(timesteps=1, repeated_items=True, reset_interactions=False)
+
+    return step
+
+
+def bass(num_users, num_items, num_attributes):  # pylint: disable=unused-argument
+    # the Bass model only supports one item, and users have one attribute
+    model = BassModel(num_users=num_users, num_items=1, seed=SEED)
+    return _model_step(model)
+
+
+def users_feedback(num_users, num_items, num_attributes):
+    user_profiles, items = _users_and_items(num_users, num_items, num_attributes)
+    users = Users(actual_user_profiles=user_profiles, seed=SEED)
+    users.compute_user_scores(items)
+    items_shown = np.random.default_rng(SEED).integers(num_items, size=(num_users, 10))
+
+    def step():
+        users.get_user_feedback(items_shown=items_shown, item_attributes=items)
+
+    return step
+
+
+def dn_users_feedback(num_users, num_items, num_attributes):
+    user_profiles, items = _users_and_items(num_users, num_items, num_attributes)
+    users = DNUsers(actual_user_profiles=user_profiles, seed=SEED)
+    users.compute_user_scores(items)
+    items_shown = np.random.default_rng(SEED).integers(num_items, size=(num_users, 10))
+
+    def step():
+        users.get_user_feedback(items_shown=items_shown, item_attributes=items)
+
+    return step
+
+
+def drifting_users_feedback(num_users, num_items, num_attributes):
+    user_profiles, items = _users_and_items(num_users, num_items, num_attributes)
+    users = Users(actual_user_profiles=user_profiles, drift=0.1, seed=SEED)
+    users.compute_user_scores(items)
+    items_shown = np.random.default_rng(SEED).integers(num_items, size=(num_users, 10))
+
+    def step():
+        users.get_user_feedback(items_shown=items_shown, item_attributes=items)
+
+    return step
+
+
+def lazy_drifting_users_feedback(num_users, num_items, num_attributes):
+    user_profiles, items = _users_and_items(num_users, num_items, num_attributes)
+    users = Users(actual_user_profiles=user_profiles, drift=0.1, seed=SEED, lazy_scores=True)
+    users.compute_user_scores(items)
+    items_shown = np.random.default_rng(SEED).integers(num_items, size=(num_users, 10))
+
+    def step():
+        users.get_user_feedback(items_shown=items_shown, item_attributes=items)
+
+    return step
+
+
+def generate_recommendations(num_users, num_items, num_attributes):
+    users, items = _users_and_items(num_users, num_items, num_attributes)
+    model = ContentFiltering(user_representation=users, item_representation=items, seed=SEED)
+
+    def step():
+        model.generate_recommendations(k=10)
+
+    return step
+
+
+def top_k(num_users, num_items, num_attributes):  # pylint: disable=unused-argument
+    scores = np.random.default_rng(SEED).random((num_users, num_items))
+
+    def step():
+        top_k_indices(scores, 10)
+
+    return step
+
+
+def inner_product_scores(num_users, num_items, num_attributes):
+    users, items = _users_and_items(num_users, num_items, num_attributes)
+
+    def step():
+        inner_product(users, items)
+
+    return step
+
+
+def slerp_drift(num_users, num_items, num_attributes):  # pylint: disable=unused-argument
+    rng = np.random.default_rng(SEED)
+    profiles = rng.random((num_users, num_attributes))
+    targets = rng.random((num_users, num_attributes))
+
+    def step():
+        slerp(profiles, targets, perc=0.1)
+
+    return step
+
+
+def import_trecs(num_users, num_items, num_attributes):  # pylint: disable=unused-argument
+    # each step imports the package in a fresh interpreter, as a worker would
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+    def step():
+        subprocess.run([sys.executable, "-c", "import trecs"], cwd=root, check=True)
+
+    return step
+
+
+BENCHMARKS = {
+    "import trecs": import_trecs,
+    "ContentFiltering.run": content_filtering,
+    "SocialFiltering.run": social_filtering,
+    "PopularityRecommender.run": popularity,
+    "ImplicitMF.run": implicit_mf,
+    "BassModel.run": bass,
+    "Users.get_user_feedback": users_feedback,
+    "Users.get_user_feedback[drift]": drifting_users_feedback,
+    "Users.get_user_feedback[drift,lazy]": lazy_drifting_users_feedback,
+    "DNUsers.get_user_feedback": dn_users_feedback,
+    "generate_recommendations": generate_recommendations,
+    "top_k_indices": top_k,
+    "inner_product": inner_product_scores,
+    "slerp": slerp_drift,
+}
+
+
+def time_steps(step, min_time=0.5, max_steps=1000):
+    """
+    Runs `step` repeatedly (after one warm-up call) for at least `min_time`
+    seconds and returns the number of steps per second.
+    """
+    step()
+    num_steps, elapsed = 0, 0.0
+    start = time.perf_counter()
+    while elapsed < min_time and num_steps < max_steps:
+        step()
+        num_steps += 1
+        elapsed = time.perf_counter() - start
+    return num_steps / elapsed
+
+
+def calibrate(min_time=0.5):
+    """
+    Returns the number of steps per second of a fixed numpy kernel (a matrix
+    product and a sort), which the speed of the benchmarks is measured against.
+    """
+    rng = np.random.default_rng(SEED)
+    left = rng.random((CALIBRATION_SIZE, CALIBRATION_SIZE))
+    right = rng.random((CALIBRATION_SIZE, CALIBRATION_SIZE))
+
+    def step():
+        np.sort(left @ right, axis=1)
+
+    return time_steps(step, min_time=min_time)
+
+
+def peak_memory(step, num_steps=3):
+    """
+    Returns the peak number of bytes allocated by `num_steps` calls to `step`,
+    on top of the memory allocated before the first call.
+    """
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in range(num_steps):
+            step()
+        return tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(grid, name_filter=None, min_time=0.5, calibration=None, log=print):
+    """
+    Runs the benchmarks whose name contains `name_filter` (all, if None) for
+    each size in `grid`.
+
+    Returns
+    --------
+        Results: dict
+            Maps the name of each case (benchmark and sizes) to its
+            `steps_per_sec`, its `relative_speed` (`steps_per_sec` divided by
+            the steps per second of :func:`calibrate`) and `peak_bytes`.
+    """
+    if calibration is None:
+        calibration = calibrate(min_time=min_time)
+    results = dict()
+    for name, setup in BENCHMARKS.items():
+        if name_filter is not None and name_filter not in name:
+            continue
+        for num_users, num_items, num_attributes in grid:
+            case = f"{name}[U={num_users},I={num_items},A={num_attributes}]"
+            step = setup(num_users, num_items, num_attributes)
+            steps_per_sec = time_steps(step, min_time=min_time)
+            result = {
+                "steps_per_sec": steps_per_sec,
+                "relative_speed": steps_per_sec / calibration,
+                "peak_bytes": peak_memory(step),
+            }
+            results[case] = result
+            log(
+                f"{case:<60} {result['steps_per_sec']:>10.1f} steps/s "
+                f"{result['peak_bytes'] / 2 ** 20:>10.2f} MiB"
+            )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results against a baseline. Speeds are compared relative to the
+    calibration kernel, unless the baseline was saved without them.
+
+    Returns
+    --------
+        Regressions: list of str
+            Description of the cases that are slower than the baseline, or
+            use more memory, by more than `tolerance` (a fraction).
+    """
+    regressions = list()
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        reference = baseline[case]
+        key = "relative_speed" if "relative_speed" in reference else "steps_per_sec"
+        speed = result[key] / reference[key]
+        if speed < 1 - tolerance:
+            regressions.append(f"{case}: {speed:.2f}x the baseline steps/s")
+        if reference["peak_bytes"] > 0:
+            memory = result["peak_bytes"] / reference["peak_bytes"]
+            if memory > 1 + tolerance:
+                regressions.append(f"{case}: {memory:.2f}x the baseline peak memory")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quick", action="store_true", help="only run the smallest sizes")
+    parser.add_argument("--filter", default=None, help="only run benchmarks with this substring")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per benchmark")
+    parser.add_argument("--output", default=None, help="file where results are saved as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed slowdown, as a fraction"
+    )
+    args = parser.parse_args(argv)
+
+    grid = QUICK_GRID if args.quick else FULL_GRID
+    calibration = calibrate(min_time=args.min_time)
+    results = run_benchmarks(
+        grid, name_filter=args.filter, min_time=args.min_time, calibration=calibration
+    )
+    report = {
+        "metadata": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "calibration_steps_per_sec": calibration,
+        },
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+#! /bin/bash
+
+set -ex # fail on first error, print commands
+
+SRC_DIR=${SRC_DIR:-$(pwd)}
+
+# the baseline depends on the machine: regenerate it locally before making changes with
+#   python benchmarks/bench.py --output benchmarks/baseline.json
+python "${SRC_DIR}"/benchmarks/bench.py --baseline "${SRC_DIR}"/benchmarks/baseline.json "$@"
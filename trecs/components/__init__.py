@@ -1,14 +1,20 @@
 """Components shared across multiple types of models (e.g., users and items)"""
-from .items import Items
+from .items import Items, ConsumedItems
 from .socialgraph import BinarySocialGraph
 from .users import Users, DNUsers, PredictedUserProfiles, PredictedScores
 from .creators import Creators
+from .history import DeltaHistory, DiskHistory, HistoryFactory
+from .schedule import RecordingSchedule, EveryNSteps, LogSpacedSteps, ExplicitSteps
 from .base_components import (
     Component,
     BaseComponent,
     BaseObservable,
+    CatalogBuffer,
     FromNdArray,
+    SparseComponent,
     SystemStateModule,
+    append_columns,
     register_observables,
+    sparse_component_class,
     unregister_observables,
 )
@@ -2,8 +2,12 @@
     variables of interest in the recommender systems
  """
 import inspect
+import warnings
 from abc import ABC, abstractmethod
+from collections.abc import MutableSequence
+from typing import Dict, Tuple
 import numpy as np
+import scipy.sparse as sp
 from trecs.logging import VerboseMode
 from trecs.random import Generator
 
@@ -11,6 +15,9 @@ from trecs.random import Generator
 class FromNdArray(np.ndarray, VerboseMode):
     """Subclass for Numpy's ndarrays."""
 
+    # views and slices are not verbose unless the array they come from is
+    verbose = False
+
     def __new__(cls, input_array, verbose=False):
         obj = np.asarray(input_array).view(cls)
         obj.verbose = verbose
@@ -20,14 +27,111 @@ class FromNdArray(np.ndarray, VerboseMode):
         pass
 
     def __array_finalize__(self, obj):
-        """ Set the verbosity based on the object passed in """
-        if obj is None:
-            return
-        self.verbose = getattr(  # pylint: disable=attribute-defined-outside-init
-            obj, "verbose", False
+        """Set the verbosity based on the object passed in. Views are created
+        very often, so they only get an attribute of their own if they are
+        verbose, and they never create a logger."""
+        if obj is not None and getattr(obj, "verbose", False):
+            self.verbose = True  # pylint: disable=attribute-defined-outside-init
+
+
+class CatalogBuffer(np.ndarray):
+    """
+    Backing storage of matrices that grow by columns as new items enter the
+    system (e.g., item attributes, predicted scores and actual user scores).
+
+    The buffer has room for more columns than are currently in use. Only the
+    first :attr:`num_columns` columns are active; they are exposed through
+    zero-copy views returned by :func:`append_columns`. When the buffer is
+    full, its capacity is doubled, so that appending columns takes amortized
+    constant time per column rather than a copy of the whole matrix.
+
+    Attributes
+    -----------
+
+        num_columns: int
+            Number of columns in use.
+    """
+
+    num_columns = 0
+
+    def __new__(cls, array, capacity=None):
+        array = np.asarray(array)
+        if capacity is None:
+            capacity = array.shape[1]
+        # the buffer owns its memory, so that it is the base of its views
+        obj = np.ndarray.__new__(cls, (array.shape[0], capacity), dtype=array.dtype)
+        obj[:, : array.shape[1]] = array
+        obj.num_columns = array.shape[1]
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.num_columns = getattr(obj, "num_columns", 0)  # pylint: disable=W0201
+
+    def is_active_view(self, array):
+        """ Returns True if `array` is the view of all the columns in use """
+        return (
+            array.shape == (self.shape[0], self.num_columns)
+            and array.dtype == self.dtype
+            and array.strides == self.strides
+            and np.byte_bounds(array)[0] == np.byte_bounds(self)[0]
         )
 
 
+def append_columns(array, new_columns):
+    """
+    Appends columns to a matrix, like `np.hstack([array, new_columns])`, but
+    in place whenever possible.
+
+    If `array` is the active view of a :class:`CatalogBuffer` with enough free
+    capacity, the new columns are written into the buffer and a view of the
+    grown matrix is returned, without copying the existing columns. Otherwise,
+    a new buffer with twice the required capacity is allocated. Since the
+    existing columns are never modified, views previously returned by this
+    function remain valid.
+
+    If `array` is a :class:`Component` (or any other subclass of
+    :obj:`numpy.ndarray`), the view returned is of the same class and shares
+    its attributes (e.g., the state history).
+
+    Parameters
+    -----------
+
+        array: :obj:`numpy.ndarray`
+            Matrix of size :math:`m\\times n`.
+
+        new_columns: :obj:`numpy.ndarray`
+            Matrix of size :math:`m\\times k`.
+
+    Returns
+    --------
+        grown_array: :obj:`numpy.ndarray`
+            Matrix of size :math:`m\\times (n+k)`.
+    """
+    new_columns = np.asarray(new_columns)
+    if new_columns.ndim == 1:
+        new_columns = new_columns.reshape((array.shape[0], -1))
+    num_columns = array.shape[1] + new_columns.shape[1]
+    dtype = np.result_type(array, new_columns)
+    buffer = array.base if isinstance(array, np.ndarray) else None
+    if (
+        not isinstance(buffer, CatalogBuffer)
+        or not buffer.is_active_view(array)
+        or buffer.dtype != dtype
+        or buffer.shape[1] < num_columns
+    ):
+        buffer = CatalogBuffer(np.asarray(array, dtype=dtype), capacity=2 * num_columns)
+    buffer[:, buffer.num_columns : num_columns] = new_columns
+    buffer.num_columns = num_columns
+    # the base of the view is the buffer itself, so that it can grow again
+    cls = type(array) if isinstance(array, np.ndarray) else np.ndarray
+    view = np.ndarray.__new__(
+        cls, (buffer.shape[0], num_columns), dtype=dtype, buffer=buffer, strides=buffer.strides
+    )
+    if hasattr(array, "__dict__"):
+        view.__dict__.update(array.__dict__)
+    return view
+
+
 # Observer methods for the observer design pattern
 def register_observables(observer, observables=None, observable_type=None):
     """Add items in observables to observer list"""
@@ -60,12 +164,30 @@ def unregister_observables(observer, observables):
 class BaseObservable(ABC):
     """Observable mixin for the observer design pattern."""
 
+    # schedule of the timesteps at which the observable is recorded; if None,
+    # the schedule of the model (by default, every timestep) applies
+    schedule = None
+
+    def set_schedule(self, schedule):
+        """
+        Sets the timesteps at which this observable is recorded by the model.
+
+        Parameters
+        -----------
+
+            schedule: :class:`~components.schedule.RecordingSchedule` or None
+                Schedule of the timesteps to record (e.g.,
+                :class:`~components.schedule.EveryNSteps`). If None, the
+                schedule of the model applies.
+        """
+        self.schedule = schedule
+
     def get_observable(self, **kwargs):
         """ Returns the value of this observable as a dict """
         data = kwargs.pop("data", None)
         if data is None:
             raise ValueError("Argument `data` cannot be None")
-        if not isinstance(data, list):
+        if not isinstance(data, (list, MutableSequence)):
             raise TypeError("Argument `data` must be a list")
         if len(data) > 0:
             name = getattr(self, "name", "Unnamed")
@@ -85,13 +207,34 @@ class BaseComponent(BaseObservable, VerboseMode, ABC):
         self.state_history = list()
         if isinstance(init_value, np.ndarray):
             init_value = np.copy(init_value)
+        elif sp.issparse(init_value):
+            init_value = sp.csr_matrix(init_value, copy=True)
         self.seed = seed
         self.state_history.append(init_value)
+        # timesteps of the states in the history
+        self.recorded_steps = [0]
 
     def get_component_state(self):
-        """ Return the history of the component's values as a dictionary """
+        """Return the history of the component's values as a dictionary. If the
+        history is stored on disk (see :func:`set_history`), the snapshots are
+        returned as memory maps, which are only read when accessed."""
         return self.get_observable(data=self.state_history)
 
+    def set_history(self, history):
+        """
+        Replaces the list where the state history is stored with another
+        list-like object, such as a :class:`~components.history.DiskHistory`.
+        The states recorded so far are moved to the new history.
+
+        Parameters
+        -----------
+
+            history: :obj:`collections.abc.MutableSequence`
+                Empty list-like object where the states are stored from now on.
+        """
+        history.extend(self.state_history)
+        self.state_history = history
+
     def observe(self, state, copy=True):  # pylint: disable=arguments-differ
         """Append the current value of the variable (by default a copy) to the
         state history"""
@@ -107,15 +250,33 @@ class BaseComponent(BaseObservable, VerboseMode, ABC):
 
 
 class Component(FromNdArray, BaseComponent):
-    """Class for components that make up the system state."""
+    """Class for components that make up the system state.
+
+    If the state passed in is a :mod:`scipy.sparse` matrix, the component is
+    created as an instance of the sparse counterpart of its class (see
+    :func:`sparse_component_class`) instead.
+    """
+
+    # mixins that the sparse counterpart of the class also inherits from
+    sparse_mixins: Tuple[type, ...] = ()
+
+    def __new__(cls, *args, **kwargs):
+        if args and sp.issparse(args[0]):
+            # sparse matrices can't be viewed as ndarrays
+            obj = sparse_component_class(cls)(args[0])
+            cls.__init__(obj, *args, **kwargs)
+            return obj
+        return FromNdArray.__new__(cls, *args, **kwargs)
 
     def __init__(
         self, current_state=None, size=None, verbose=False, seed=None
     ):  # pylint: disable=super-init-not-called
         # general input checks
         if current_state is not None:
-            if not isinstance(current_state, (list, np.ndarray)):
-                raise TypeError("current_state must be a list or numpy.ndarray")
+            if not isinstance(current_state, (list, np.ndarray)) and not sp.issparse(
+                current_state
+            ):
+                raise TypeError("current_state must be a list, numpy.ndarray or scipy.sparse")
         if current_state is None and size is None:
             raise ValueError("current_state and size can't both be None")
         if current_state is None and not isinstance(size, tuple):
@@ -131,6 +292,100 @@ class Component(FromNdArray, BaseComponent):
         self.observe(self, copy=True)
 
 
+class SparseComponent(sp.csr_matrix, BaseComponent):  # pylint: disable=too-many-ancestors
+    """
+    Component whose value is a :class:`scipy.sparse.csr_matrix`, rather than
+    a dense :obj:`numpy.ndarray`.
+
+    Subclasses of :class:`Component` (e.g.,
+    :class:`~components.users.PredictedUserProfiles` and
+    :class:`~components.items.Items`) return an instance of this class when
+    they are initialized with a sparse matrix. This makes it possible to store
+    large, mostly empty representations (such as social graphs) and to
+    multiply them in time proportional to their number of nonzero elements.
+
+    Each subclass of :class:`Component` has its own sparse counterpart (see
+    :func:`sparse_component_class`), so that the type of the component is
+    kept: e.g., a sparse :class:`~components.users.PredictedUserProfiles` is
+    still an instance of :class:`~components.users.PredictedUserProfiles`.
+    """
+
+    # class of the dense component that this class stands in for
+    component_class = Component
+
+    def __setitem__(self, key, value):
+        # single-element updates (e.g., following a user) are rare enough that
+        # changing the sparsity structure of the matrix is acceptable
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", sp.SparseEfficiencyWarning)
+            super().__setitem__(key, value)
+        if np.isscalar(value) and value == 0:
+            self.eliminate_zeros()
+
+    def __iadd__(self, other):
+        """ Adds a (sparse) matrix in place """
+        result = sp.csr_matrix(self + sp.csr_matrix(other))
+        self.data, self.indices, self.indptr = result.data, result.indices, result.indptr
+        return self
+
+    def store_state(self):
+        """ Store a copy of the component's value in the state history """
+        self.state_history.append(sp.csr_matrix(self, copy=True))
+
+    def __reduce__(self):
+        # the sparse counterparts are created on the fly, so they can't be
+        # found by name when unpickling
+        return _new_sparse_component, (self.component_class,), vars(self)
+
+
+# sparse counterparts of the subclasses of Component, created on first use
+_SPARSE_CLASSES: Dict[type, type] = dict()
+
+
+def sparse_component_class(component_class):
+    """
+    Returns the subclass of :class:`SparseComponent` that is used when
+    `component_class` (a subclass of :class:`Component`) is initialized with
+    a :mod:`scipy.sparse` matrix. The sparse class is registered as a virtual
+    subclass of `component_class`, so instances of either class pass
+    `isinstance` checks against `component_class`. It also inherits from the
+    :attr:`~Component.sparse_mixins` of `component_class`.
+
+    Parameters
+    -----------
+
+        component_class: type
+            Subclass of :class:`Component`.
+
+    Returns
+    --------
+        sparse_class: type
+            Subclass of :class:`SparseComponent`, named after
+            `component_class` (e.g., `SparsePredictedUserProfiles`).
+    """
+    if component_class is Component:
+        return SparseComponent
+    if component_class not in _SPARSE_CLASSES:
+        sparse_class = type(
+            f"Sparse{component_class.__name__}",
+            component_class.sparse_mixins + (SparseComponent,),
+            {
+                "__module__": component_class.__module__,
+                "__doc__": f"Sparse :class:`{component_class.__name__}`.",
+                "component_class": component_class,
+            },
+        )
+        component_class.register(sparse_class)
+        _SPARSE_CLASSES[component_class] = sparse_class
+    return _SPARSE_CLASSES[component_class]
+
+
+def _new_sparse_component(component_class):
+    """ Creates an empty sparse component of the given class, for unpickling """
+    sparse_class = sparse_component_class(component_class)
+    return sparse_class.__new__(sparse_class)
+
+
 class SystemStateModule:  # pylint: disable=too-few-public-methods
     """
     Mixin for observers of :class:`Component` observables. Implements the
@@ -0,0 +1,337 @@
+"""
+Backends that store the history of components and measurements on disk or
+delta-encoded, rather than as a list of full copies in memory
+"""
+from collections.abc import MutableSequence
+import os
+import numpy as np
+
+
+class _SnapshotFile:  # pylint: disable=too-few-public-methods
+    """ Reference to a snapshot stored in a `.npy` file """
+
+    def __init__(self, path):
+        self.path = path
+
+
+class DiskHistory(MutableSequence):  # pylint: disable=too-many-ancestors
+    """
+    List-like history that writes each array appended to it to its own `.npy`
+    file in `directory`, instead of keeping it in memory. Elements that are
+    not arrays (e.g., `None` or scalar measurements) are kept in memory.
+
+    Arrays are read back lazily: indexing the history returns a read-only
+    memory map of the file, so only the parts of the snapshot that are
+    actually used are loaded into memory.
+
+    It can replace the in-memory history of any component or measurement (see
+    :func:`~components.base_components.BaseComponent.set_history` and
+    :func:`~metrics.measurement.Measurement.set_history`), or of all the
+    components and measurements of a model (see the `history_dir` parameter
+    of :class:`~models.recommender.BaseRecommender`).
+
+    Parameters
+    -----------
+
+        directory: str
+            Directory where the snapshots are written. It is created if it does
+            not exist.
+
+        mmap_mode: str or None (optional, default: "r")
+            Memory-mapping mode passed to :func:`numpy.load` when a snapshot is
+            read. If None, snapshots are read into memory.
+    """
+
+    def __init__(self, directory, mmap_mode="r"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        self._entries = list()
+        self._num_files = 0
+
+    def _store(self, value):
+        """ Writes arrays to disk and returns the entry to keep in memory """
+        if not isinstance(value, np.ndarray) or value.dtype == object:
+            return value
+        path = os.path.join(self.directory, f"{self._num_files:08d}.npy")
+        self._num_files += 1
+        np.save(path, np.asarray(value))
+        return _SnapshotFile(path)
+
+    def _load(self, entry):
+        """ Returns the value of an entry, reading it from disk if necessary """
+        if isinstance(entry, _SnapshotFile):
+            return np.load(entry.path, mmap_mode=self.mmap_mode)
+        return entry
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(entry) for entry in self._entries[index]]
+        return self._load(self._entries[index])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self._entries[index] = [self._store(item) for item in value]
+        else:
+            self._entries[index] = self._store(value)
+
+    def __delitem__(self, index):
+        del self._entries[index]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def insert(self, index, value):
+        self._entries.insert(index, self._store(value))
+
+    def __repr__(self):
+        return f"DiskHistory({self.directory!r}, length={len(self)})"
+
+
+class _Keyframe:  # pylint: disable=too-few-public-methods
+    """ Snapshot stored in full """
+
+    def __init__(self, array):
+        self.array = array
+
+
+class _Delta:  # pylint: disable=too-few-public-methods
+    """ Snapshot stored as the elements that changed since the previous one """
+
+    def __init__(self, indices, values):
+        self.indices = indices
+        self.values = values
+
+
+class DeltaHistory(MutableSequence):  # pylint: disable=too-many-ancestors
+    """
+    List-like history that delta-encodes the arrays appended to it. Every
+    `keyframe_interval` snapshots (and whenever the shape or type of the
+    array changes, e.g., because new items were created), the array is stored
+    in full; otherwise, only the indices and values of the elements that
+    changed since the previous snapshot are stored. When most elements of a
+    matrix do not change between timesteps (e.g., the popularity of items or
+    the actual user scores), this takes a fraction of the memory of full
+    copies. Elements that are not arrays (e.g., `None`) are stored as they
+    are.
+
+    Any snapshot can be accessed by index: it is reconstructed from the
+    closest keyframe before it, which takes at most `keyframe_interval`
+    updates. Reading the snapshots in order only applies one update per
+    snapshot.
+
+    Parameters
+    -----------
+
+        keyframe_interval: int (optional, default: 10)
+            Maximum number of snapshots between keyframes (the first one
+            included).
+
+        max_density: float (optional, default: 0.5)
+            If more than this fraction of the elements of an array changed
+            since the previous snapshot, the array is stored in full.
+    """
+
+    def __init__(self, keyframe_interval=10, max_density=0.5):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be a positive integer")
+        self.keyframe_interval = keyframe_interval
+        self.max_density = max_density
+        self._entries = list()
+        # most recently reconstructed snapshot, as (index, array)
+        self._cache = None
+
+    def _encode(self, value, previous, since_keyframe):
+        """Returns the entry that stores `value`, given the previous snapshot
+        and the number of deltas since the last keyframe"""
+        if not isinstance(value, np.ndarray) or value.dtype == object:
+            return value
+        value = np.array(value)
+        if (
+            not isinstance(previous, np.ndarray)
+            or previous.shape != value.shape
+            or previous.dtype != value.dtype
+            or since_keyframe + 1 >= self.keyframe_interval
+        ):
+            return _Keyframe(value)
+        indices = np.flatnonzero(value != previous)
+        if indices.size > self.max_density * value.size:
+            return _Keyframe(value)
+        if value.size <= np.iinfo(np.int32).max:
+            indices = indices.astype(np.int32)
+        return _Delta(indices, value.ravel()[indices])
+
+    def _since_keyframe(self, index):
+        """ Number of consecutive deltas that end at `index` """
+        count = 0
+        while index >= 0 and isinstance(self._entries[index], _Delta):
+            count += 1
+            index -= 1
+        return count
+
+    def _decode(self, index):
+        """ Reconstructs the snapshot at (non-negative) `index` """
+        entry = self._entries[index]
+        if isinstance(entry, _Keyframe):
+            return entry.array.copy()
+        if not isinstance(entry, _Delta):
+            return entry
+        if self._cache is not None and self._cache[0] == index:
+            return self._cache[1].copy()
+        # walk back to the cached snapshot or to the closest keyframe, then
+        # apply the deltas forward
+        start = index
+        while isinstance(self._entries[start], _Delta):
+            if self._cache is not None and self._cache[0] == start - 1:
+                break
+            start -= 1
+        if isinstance(self._entries[start], _Delta):
+            snapshot = self._cache[1].copy()
+        else:
+            snapshot = self._entries[start].array.copy()
+            start += 1
+        flat = snapshot.ravel()
+        for position in range(start, index + 1):
+            delta = self._entries[position]
+            flat[delta.indices] = delta.values
+        self._cache = (index, snapshot)
+        return snapshot.copy()
+
+    def _make_keyframe(self, index):
+        """ Stores the snapshot at `index` in full, if it is a delta """
+        if 0 <= index < len(self._entries) and isinstance(self._entries[index], _Delta):
+            self._entries[index] = _Keyframe(self._decode(index))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._decode(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            raise TypeError("DeltaHistory does not support slice assignment")
+        if index < 0:
+            index += len(self)
+        # the next snapshot may depend on the one being replaced
+        self._make_keyframe(index + 1)
+        self._entries[index] = self._encode(value, None, 0)
+        self._cache = None
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for i in sorted(range(*index.indices(len(self))), reverse=True):
+                del self[i]
+            return
+        if index < 0:
+            index += len(self)
+        self._make_keyframe(index + 1)
+        del self._entries[index]
+        self._cache = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def insert(self, index, value):
+        if index < 0:
+            index += len(self)
+        index = min(max(index, 0), len(self))
+        if index == len(self) and index > 0:
+            # appending: encode as a delta from the last snapshot
+            previous = self._decode(index - 1)
+            entry = self._encode(value, previous, self._since_keyframe(index - 1))
+        else:
+            self._make_keyframe(index)
+            entry = self._encode(value, None, 0)
+        self._entries.insert(index, entry)
+        if isinstance(entry, _Keyframe) or not isinstance(entry, _Delta):
+            self._cache = None
+        else:
+            # the snapshot just appended is the most likely to be read next
+            self._cache = (index, np.array(value))
+
+    def nbytes(self):
+        """ Returns the number of bytes used by the arrays stored """
+        total = 0
+        for entry in self._entries:
+            if isinstance(entry, _Keyframe):
+                total += entry.array.nbytes
+            elif isinstance(entry, _Delta):
+                total += entry.indices.nbytes + entry.values.nbytes
+        return total
+
+    def __repr__(self):
+        return f"DeltaHistory(keyframe_interval={self.keyframe_interval}, length={len(self)})"
+
+
+class HistoryFactory:
+    """
+    Creates the histories of the measurements and system state components of
+    a model: a :class:`DiskHistory` in its own subdirectory of `directory`
+    or, if `directory` is None, a :class:`DeltaHistory`.
+
+    Parameters
+    -----------
+
+        directory: str or None (optional, default: None)
+            Directory where the histories are written.
+
+        keyframe_interval: int or None (optional, default: None)
+            Keyframe interval of the delta-encoded histories. It cannot be used
+            together with `directory`.
+    """
+
+    def __init__(self, directory=None, keyframe_interval=None):
+        if directory is not None and keyframe_interval is not None:
+            raise ValueError("history_dir and history_keyframe_interval cannot be used together")
+        self.directory = directory
+        self.keyframe_interval = keyframe_interval
+        self._directories = set()
+
+    def create(self, kind, name):
+        """
+        Returns a new history for the observable `name` (e.g., a measurement)
+        of the given `kind` (e.g., `"measurements"`).
+        """
+        if self.directory is None:
+            return DeltaHistory(self.keyframe_interval)
+        directory = os.path.join(self.directory, kind, name)
+        unique_directory, copy = directory, 1
+        while unique_directory in self._directories:
+            unique_directory, copy = f"{directory}_{copy}", copy + 1
+        self._directories.add(unique_directory)
+        return DiskHistory(unique_directory)
+
+    def move_histories(self, metrics, system_state, flush=None):
+        """
+        Moves the histories of the measurements and system state components
+        that are still kept in plain lists to new histories created by
+        :func:`create`.
+
+        Parameters
+        -----------
+
+            metrics: list
+                Measurements of the model.
+
+            system_state: list
+                System state components of the model.
+
+            flush: callable or None (optional, default: None)
+                Called before a history is moved, so that the measurements
+                computed in the background are not appended to the old one.
+        """
+        for kind, observables, attribute in (
+            ("measurements", metrics, "measurement_history"),
+            ("system_state", system_state, "state_history"),
+        ):
+            for observable in observables:
+                if isinstance(getattr(observable, attribute), (DiskHistory, DeltaHistory)):
+                    continue
+                if flush is not None:
+                    flush()
+                name = getattr(observable, "name", "")
+                observable.set_history(self.create(kind, name))
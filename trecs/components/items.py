@@ -1,7 +1,8 @@
 """ Class definition for Items in our recommender systems - can represent anything
     ranging from disease to consumer goods
 """
-from .base_components import Component
+import numpy as np
+from .base_components import Component, append_columns
 
 
 class Items(Component):  # pylint: disable=too-many-ancestors
@@ -51,3 +52,230 @@ class Items(Component):  # pylint: disable=too-many-ancestors
         Component.__init__(
             self, current_state=item_attributes, size=size, verbose=verbose, seed=seed
         )
+
+
+class ConsumedItems:
+    """
+    Compact record of the items each user has interacted with.
+
+    Interactions are stored as a packed bitset of size
+    :math:`|U|\\times\\lceil |I| / 8 \\rceil`, where bit `i` of row `u` is set if
+    user `u` has interacted with item `i`. This takes 1/64 of the memory of a
+    dense matrix of item indices. It is used internally in
+    :class:`~models.recommender.BaseRecommender` to avoid recommending the same
+    item twice when repeated items are not allowed.
+
+    It can be passed as the `mask` of the functions of :mod:`trecs.matrix_ops`
+    in place of a :math:`|U|\\times|I|` boolean matrix: it supports the
+    indexing of rows (`consumed[users]`) and of elements (`consumed[users,
+    items]`) and `consumed.sum(axis=1)`, and it masks scores with
+    :func:`mask_scores` without unpacking the bitset.
+
+    Parameters
+    -------------
+
+    num_users: int
+        The number of users in the system.
+
+    num_items: int
+        The number of items in the system.
+
+    Attributes
+    ------------
+
+    bits: :obj:`numpy.ndarray`
+        The packed bitset, with dtype `uint8`. Bits are stored in little-endian
+        order within each byte.
+
+    num_consumed: :obj:`numpy.ndarray`
+        A :math:`|U|` array with the number of distinct items each user has
+        interacted with.
+    """
+
+    def __init__(self, num_users, num_items):
+        self.num_users = num_users
+        self.num_items = num_items
+        self.bits = np.zeros((num_users, self._num_bytes(num_items)), dtype=np.uint8)
+        self.num_consumed = np.zeros(num_users, dtype=int)
+        # buffer where masked scores are written, reused across calls
+        self._masked_scores = None
+
+    @staticmethod
+    def _num_bytes(num_items):
+        """ Number of bytes needed to store one bit per item """
+        return (num_items + 7) // 8
+
+    def add_items(self, num_new_items):
+        """
+        Makes room for items that were just created. New items have not been
+        interacted with by any user.
+
+        Parameters
+        -----------
+
+        num_new_items: int
+            The number of new items added to the system.
+        """
+        self.num_items += num_new_items
+        missing_bytes = self._num_bytes(self.num_items) - self.bits.shape[1]
+        if missing_bytes > 0:
+            self.bits = append_columns(
+                self.bits, np.zeros((self.num_users, missing_bytes), dtype=np.uint8)
+            )
+
+    def mark(self, users, items):
+        """
+        Records that each user in `users` interacted with the corresponding
+        item in `items`.
+
+        Parameters
+        -----------
+
+        users: :obj:`numpy.ndarray`
+            Array of user indices.
+
+        items: :obj:`numpy.ndarray`
+            Array of item indices, of the same length as `users`.
+        """
+        users, items = np.broadcast_arrays(np.asarray(users), np.asarray(items))
+        byte_idxs = items >> 3
+        bit_values = np.left_shift(1, items & 7).astype(np.uint8)
+        already_set = (self.bits[users, byte_idxs] & bit_values) != 0
+        # the same (user, item) pair may appear more than once
+        new_pairs = np.unique(users[~already_set] * self.num_items + items[~already_set])
+        np.add.at(self.num_consumed, new_pairs // self.num_items, 1)
+        np.bitwise_or.at(self.bits, (users, byte_idxs), bit_values)
+
+    @property
+    def shape(self):
+        """ Shape of the boolean matrix of consumed items """
+        return (self.num_users, self.num_items)
+
+    def to_mask(self, users=None):
+        """
+        Returns the consumed items as a boolean matrix.
+
+        Parameters
+        -----------
+
+        users: :obj:`numpy.ndarray` or None (optional, default: None)
+            Indices of the users (rows) to return. If None, all users are
+            returned.
+
+        Returns
+        --------
+
+            mask: :obj:`numpy.ndarray`
+                A :math:`|U|\\times|I|` boolean matrix where element `[u, i]` is
+                True if user `u` has interacted with item `i`.
+        """
+        bits = self.bits if users is None else self.bits[users]
+        return np.unpackbits(bits, axis=-1, count=self.num_items, bitorder="little").view(bool)
+
+    def __getitem__(self, key):
+        """Returns the rows of the given users (`consumed[users]`), or whether
+        each user has interacted with the corresponding item (`consumed[users,
+        items]`), as booleans."""
+        if not isinstance(key, tuple):
+            return self.to_mask(key)
+        users, items = np.broadcast_arrays(np.asarray(key[0]), np.asarray(key[1]))
+        return ((self.bits[users, items >> 3] >> (items & 7)) & 1).astype(bool)
+
+    def __array__(self, dtype=None):
+        mask = self.to_mask()
+        return mask if dtype is None else mask.astype(dtype)
+
+    def sum(self, axis=None):
+        """ Number of consumed items, in total or for each user (`axis=1`) """
+        if axis in (1, -1):
+            return self.num_consumed.copy()
+        if axis is None:
+            return self.num_consumed.sum()
+        return self.to_mask().sum(axis=axis)
+
+    def mask_scores(self, scores):
+        """
+        Returns a copy of `scores` in which the scores of the items each user
+        has interacted with are replaced by `-inf`. Only the consumed
+        positions are written, so the bitset is not unpacked.
+
+        The copy is written to a buffer that is reused by the next call, so it
+        must not be kept.
+
+        Parameters
+        -----------
+
+        scores: :obj:`numpy.ndarray`
+            A :math:`|U|\\times|I|` matrix of scores.
+
+        Returns
+        --------
+
+            masked: :obj:`numpy.ndarray`
+                The masked scores, with the dtype of `np.where(mask, -np.inf,
+                scores)`.
+        """
+        scores = np.asarray(scores)
+        dtype = np.result_type(scores, -np.inf)
+        buffer = self._masked_scores
+        if buffer is None or buffer.shape != scores.shape or buffer.dtype != dtype:
+            buffer = np.empty(scores.shape, dtype=dtype)
+            self._masked_scores = buffer
+        np.copyto(buffer, scores)
+        # expand the bits of the nonzero bytes into (user, item) pairs
+        users, byte_idxs = np.nonzero(self.bits)
+        packed = self.bits[users, byte_idxs]
+        byte_bits = np.unpackbits(packed[:, np.newaxis], axis=1, bitorder="little")
+        pairs, bit_idxs = np.nonzero(byte_bits)
+        buffer[users[pairs], byte_idxs[pairs] * 8 + bit_idxs] = -np.inf
+        return buffer
+
+    def to_item_indices(self):
+        """
+        Returns the consumed items in the format of the deprecated
+        :attr:`~models.recommender.BaseRecommender.indices` attribute.
+
+        Returns
+        --------
+
+            indices: :obj:`numpy.ndarray`
+                A :math:`|U|\\times|I|` matrix where element `[u, i]` is `i`,
+                or -1 if user `u` has interacted with item `i`.
+        """
+        indices = np.tile(np.arange(self.num_items), (self.num_users, 1))
+        indices[self.to_mask()] = -1
+        return indices
+
+    @classmethod
+    def from_item_indices(cls, item_indices, num_items):
+        """
+        Creates the record of consumed items from a matrix with the indices of
+        the items each user has *not* interacted with, as passed to the
+        deprecated `item_indices` argument of
+        :func:`~models.recommender.BaseRecommender.generate_recommendations`.
+
+        Parameters
+        -----------
+
+        item_indices: :obj:`numpy.ndarray`
+            Matrix whose row `u` holds the indices of the items that user `u`
+            has not interacted with. Negative indices are ignored.
+
+        num_items: int
+            The number of items in the system.
+
+        Returns
+        --------
+
+            consumed: :class:`ConsumedItems`
+        """
+        item_indices = np.asarray(item_indices)
+        num_users = item_indices.shape[0]
+        unconsumed = np.zeros((num_users, num_items), dtype=bool)
+        users = np.repeat(np.arange(num_users), item_indices.shape[1])
+        items = item_indices.ravel()
+        unconsumed[users[items >= 0], items[items >= 0]] = True
+        consumed = cls(num_users, num_items)
+        consumed.bits = np.packbits(~unconsumed, axis=1, bitorder="little")
+        consumed.num_consumed = num_items - unconsumed.sum(axis=1)
+        return consumed
@@ -0,0 +1,176 @@
+"""
+Schedules that determine at which timesteps measurements and system state
+components are recorded
+"""
+from abc import ABC, abstractmethod
+import math
+import numpy as np
+
+
+class RecordingSchedule(ABC):
+    """
+    Abstract schedule of the timesteps at which a measurement or system state
+    component is recorded. Timesteps are counted from the creation of the
+    model: the value before the first timestep is recorded as timestep 0,
+    and the value after the `n`-th timestep as timestep `n`.
+
+    Schedules are set with
+    :func:`~components.base_components.BaseObservable.set_schedule`, or for
+    all the measurements and components of a model with the
+    `recording_schedule` parameter of
+    :class:`~models.recommender.BaseRecommender`. On the timesteps that are
+    not recorded, measurements are not computed at all.
+
+    Parameters
+    -----------
+
+        record_last: bool (optional, default: True)
+            If True, the last timestep of every call to
+            :func:`~models.recommender.BaseRecommender.run` is recorded too.
+    """
+
+    def __init__(self, record_last=True):
+        self.record_last = record_last
+
+    @abstractmethod
+    def is_scheduled(self, step):
+        """ Returns True if timestep `step` is part of the schedule """
+
+    def records(self, step, last_step=False):
+        """
+        Returns True if the value at timestep `step` must be recorded.
+
+        Parameters
+        -----------
+
+            step: int
+                Timestep, counted from the creation of the model.
+
+            last_step: bool (optional, default: False)
+                True if `step` is the last timestep of the current run.
+        """
+        return self.is_scheduled(step) or (last_step and self.record_last)
+
+
+class EveryNSteps(RecordingSchedule):
+    """
+    Records every `n`-th timestep (i.e., timesteps `n`, `2n`, `3n`, ...).
+
+    Parameters
+    -----------
+
+        n: int
+            Number of timesteps between recordings.
+
+        record_last: bool (optional, default: True)
+            See :class:`RecordingSchedule`.
+    """
+
+    def __init__(self, n, record_last=True):
+        if n < 1:
+            raise ValueError("n must be a positive integer")
+        self.n = n
+        RecordingSchedule.__init__(self, record_last)
+
+    def is_scheduled(self, step):
+        return step % self.n == 0
+
+
+class LogSpacedSteps(RecordingSchedule):
+    """
+    Records timesteps that are evenly spaced on a logarithmic scale: the
+    timesteps closest to :math:`10^{k/d}` for :math:`k=0,1,2,\\dots`, where
+    :math:`d` is `steps_per_decade` (e.g., with `steps_per_decade=3`,
+    timesteps 1, 2, 5, 10, 22, 46, 100, ...). Early timesteps, when the
+    system changes the fastest, are recorded more often than later ones.
+
+    Parameters
+    -----------
+
+        steps_per_decade: int (optional, default: 10)
+            Number of timesteps recorded between consecutive powers of 10.
+            Timesteps closer than one step to each other are only recorded
+            once.
+
+        record_last: bool (optional, default: True)
+            See :class:`RecordingSchedule`.
+    """
+
+    def __init__(self, steps_per_decade=10, record_last=True):
+        if steps_per_decade < 1:
+            raise ValueError("steps_per_decade must be a positive integer")
+        self.steps_per_decade = steps_per_decade
+        RecordingSchedule.__init__(self, record_last)
+
+    def is_scheduled(self, step):
+        if step < 1:
+            return False
+        k = round(self.steps_per_decade * math.log10(step))
+        # the rounding of the exponent may be off by one near the boundaries
+        return any(
+            round(10 ** (j / self.steps_per_decade)) == step for j in (k - 1, k, k + 1) if j >= 0
+        )
+
+
+class ExplicitSteps(RecordingSchedule):
+    """
+    Records the timesteps in a given list.
+
+    Parameters
+    -----------
+
+        steps: iterable of int
+            Timesteps that are recorded.
+
+        record_last: bool (optional, default: False)
+            See :class:`RecordingSchedule`.
+    """
+
+    def __init__(self, steps, record_last=False):
+        self.steps = frozenset(int(step) for step in steps)
+        RecordingSchedule.__init__(self, record_last)
+
+    def is_scheduled(self, step):
+        return step in self.steps
+
+
+def is_recorded(observable, default_schedule, step, last_step=False):
+    """
+    Returns True if `observable` is recorded at timestep `step`, following its
+    own schedule or, if it has none, `default_schedule` (if both are None, it
+    is recorded at every timestep).
+    """
+    schedule = observable.schedule
+    if schedule is None:
+        schedule = default_schedule
+    return schedule is None or schedule.records(step, last_step)
+
+
+def recorded_timesteps(observables):
+    """
+    Returns the timesteps at which the observables were recorded, as a
+    dictionary with the key `"timesteps"` (the timesteps of the first
+    observable that follows the schedule of the model) and, for the
+    observables recorded at other timesteps, `"<name>_timesteps"`.
+    """
+    recorded_steps = dict()
+    for observable in observables:
+        steps = getattr(observable, "recorded_steps", None)
+        # otherwise, the history was not (only) recorded by the model
+        if steps is not None and len(steps) == observable.get_timesteps():
+            recorded_steps[id(observable)] = np.array(steps)
+    reference = next(
+        (
+            observable
+            for observable in observables
+            if observable.schedule is None and id(observable) in recorded_steps
+        ),
+        observables[0],
+    )
+    default_steps = np.arange(reference.get_timesteps())
+    timesteps = {"timesteps": recorded_steps.get(id(reference), default_steps)}
+    for observable in observables:
+        steps = recorded_steps.get(id(observable))
+        if steps is not None and not np.array_equal(steps, timesteps["timesteps"]):
+            timesteps[f"{getattr(observable, 'name', 'Unnamed')}_timesteps"] = steps
+    return timesteps
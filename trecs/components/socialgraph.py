@@ -11,13 +11,24 @@ class BinarySocialGraph(VerboseMode):
     :attr:`~trecs.models.recommender.BaseRecommender.users_hat` attribute
     to gain the basic functionality of a binary social graph.
 
-    It assumes a network adjacency matrix of size `|U|x|U|`.
+    It assumes a network adjacency matrix of size `|U|x|U|`, which can be
+    either a dense :obj:`numpy.ndarray` or a :mod:`scipy.sparse` matrix.
     """
 
     # expect these to be initialized
     users_hat = np.array([])
     num_users = np.array([])
 
+    def _invalidate_user(self, user_index):
+        """
+        Marks the predicted scores of a user whose connections changed as out
+        of date, if the class keeps track of them (see
+        :meth:`~trecs.models.recommender.BaseRecommender.invalidate_scores`).
+        """
+        invalidate_scores = getattr(self, "invalidate_scores", None)
+        if invalidate_scores is not None:
+            invalidate_scores(users=[user_index])
+
     def follow(self, user_index, following_index):
         """
         Method to follow another user -- that is, to create a unidirectional
@@ -45,6 +56,7 @@ class BinarySocialGraph(VerboseMode):
             )
         if self.users_hat[following_index, user_index] == 0:
             self.users_hat[following_index, user_index] = 1
+            self._invalidate_user(following_index)
         elif self.is_verbose():
             self.log(f"User {following_index} was already following user {user_index}")
 
@@ -75,6 +87,7 @@ class BinarySocialGraph(VerboseMode):
             )
         if self.users_hat[following_index, user_index] == 1:
             self.users_hat[following_index, user_index] = 0
+            self._invalidate_user(following_index)
         elif self.is_verbose():
             self.log(f"User {following_index} was not following user {user_index}")
 
@@ -105,10 +118,12 @@ class BinarySocialGraph(VerboseMode):
             )
         if self.users_hat[user1_index, user2_index] == 0:
             self.users_hat[user1_index, user2_index] = 1
+            self._invalidate_user(user1_index)
         elif self.is_verbose():
             self.log(f"User {user2_index} was already following user {user1_index}")
         if self.users_hat[user2_index, user1_index] == 0:
             self.users_hat[user2_index, user1_index] = 1
+            self._invalidate_user(user2_index)
         elif self.is_verbose():
             self.log(f"User {user1_index} was already following user {user2_index}")
 
@@ -139,9 +154,11 @@ class BinarySocialGraph(VerboseMode):
             )
         if self.users_hat[user1_index, user2_index] == 1:
             self.users_hat[user1_index, user2_index] = 0
+            self._invalidate_user(user1_index)
         elif self.is_verbose():
             self.log(f"User {user2_index} was not following user {user1_index}")
         if self.users_hat[user2_index, user1_index] == 1:
             self.users_hat[user2_index, user1_index] = 0
+            self._invalidate_user(user2_index)
         elif self.is_verbose():
             self.log(f"User {user1_index} was not following user {user2_index}")
@@ -3,12 +3,21 @@ Suite of classes related to users of the system, including predicted user-item
 scores, predicted user profiles, actual user profiles, and a Users class (which
 encapsulates some of these concepts)
 """
+import weakref
 import numpy as np
-
-from trecs.matrix_ops import contains_row, slerp, inner_product
+from numpy.lib.stride_tricks import as_strided
+import scipy.sparse as sp
+
+from trecs.matrix_ops import (
+    blocked_inner_product,
+    contains_row,
+    inner_product,
+    normalize_matrix,
+    slerp,
+)
 from trecs.random import Generator
-from trecs.utils import check_consistency
-from .base_components import Component, BaseComponent
+from trecs.utils import check_consistency, cast_to_dtype
+from .base_components import Component, BaseComponent, append_columns
 
 
 class PredictedScores(Component):  # pylint: disable=too-many-ancestors
@@ -25,31 +34,211 @@ class PredictedScores(Component):  # pylint: disable=too-many-ancestors
         )
 
 
-class PredictedUserProfiles(Component):  # pylint: disable=too-many-ancestors
+class NormalizedRowsCache:  # pylint: disable=no-member
+    """
+    Mixin for components whose rows are normalized to unit length every time
+    they are scored (e.g., by :func:`~trecs.matrix_ops.inner_product`). The
+    normalized rows are computed once and cached until the component is
+    written. It works with both dense and sparse components.
+
+    Every write to the component must call :func:`invalidate_norms`.
+    Assignments through the component or its views (e.g., `profiles[users, :]
+    = values`, which only renormalizes those rows) do so automatically, as do
+    the NumPy ufuncs that write into dense components (see
+    :class:`DenseNormalizedRowsCache`). The cache is also tied to the arrays
+    that hold the values of the component, so it is not used once they are
+    replaced (e.g., by `sparse_profiles += values`).
+
+    Writes that bypass the component, such as passing `np.asarray(profiles)`
+    as the `out` argument of a NumPy function or modifying the `data` of a
+    sparse component, must be followed by a call to :func:`invalidate_norms`.
+    """
+
+    # normalized rows; shape of the component and (weak references to) the
+    # arrays that held its values when they were computed; and indices of the
+    # rows that changed since then (all of them if the cache is None). Only
+    # set on the components themselves, not on their views
+    _normalized = None
+    _normalized_from = None
+    _stale_rows = None
+
+    def _init_norm_cache(self):
+        """ Starts with an empty cache """
+        self._normalized = None
+        self._normalized_from = None
+        self._stale_rows = None
+
+    def _norm_cache_owner(self):
+        """Returns the component whose cache covers this array: the array
+        itself or, for views, the component it is a view of (None if there is
+        no such component)"""
+        array = self
+        while array is not None:
+            if "_normalized" in getattr(array, "__dict__", ()):
+                return array
+            array = getattr(array, "base", None)
+        return None
+
+    def _value_arrays(self):
+        """ Arrays that hold the values of the component """
+        if sp.issparse(self):
+            return (self.data, self.indices, self.indptr)
+        return (self,)
+
+    def invalidate_norms(self, rows=None):
+        """
+        Marks the normalized rows as out of date. When called on a view of the
+        component, all the rows of the component are marked.
+
+        Parameters
+        -----------
+
+            rows: int, slice, :obj:`numpy.ndarray` or None (optional, default: None)
+                Index of the rows that changed. If None, all rows changed.
+        """
+        owner = self._norm_cache_owner()
+        if owner is None:
+            return
+        if rows is None or owner is not self or self._normalized is None or sp.issparse(self):
+            owner._init_norm_cache()  # pylint: disable=protected-access
+            return
+        try:
+            rows = np.arange(self.shape[0])[rows].ravel()
+        except (IndexError, TypeError, ValueError):
+            self._init_norm_cache()
+            return
+        self._stale_rows = rows if self._stale_rows is None else np.union1d(self._stale_rows, rows)
+
+    def _norm_cache_is_current(self):
+        """Returns True if the cached rows were computed from the arrays that
+        currently hold the values of the component"""
+        if self._normalized is None or self._normalized_from[0] != self.shape:
+            return False
+        arrays = self._value_arrays()
+        return all(ref() is array for ref, array in zip(self._normalized_from[1], arrays))
+
+    def normalized_rows(self):
+        """
+        Returns the rows normalized to unit length (rows of zeros stay
+        zero), as a read-only matrix.
+
+        Returns
+        --------
+            normalized: :obj:`numpy.ndarray`, :obj:`scipy.sparse.csr_matrix` or None
+                Sparse if the component is sparse. None if the rows are not
+                cached (e.g., for arrays derived from the component).
+        """
+        if "_normalized" not in vars(self) or self.ndim != 2:
+            return None
+        if sp.issparse(self):
+            matrix = sp.csr_matrix(self)
+        else:
+            matrix = np.asarray(self)
+        if not self._norm_cache_is_current():
+            self._normalized = normalize_matrix(matrix, axis=1)
+            refs = tuple(weakref.ref(array) for array in self._value_arrays())
+            self._normalized_from = (self.shape, refs)
+            self._stale_rows = None
+        elif self._stale_rows is not None:
+            rows = self._stale_rows
+            self._normalized[rows] = normalize_matrix(matrix[rows], axis=1)
+            self._stale_rows = None
+        if sp.issparse(self._normalized):
+            self._normalized.data.flags.writeable = False
+            return self._normalized
+        normalized = self._normalized.view()
+        normalized.flags.writeable = False
+        return normalized
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.invalidate_norms(key[0] if isinstance(key, tuple) and key else key)
+
+
+class DenseNormalizedRowsCache(NormalizedRowsCache):
+    """
+    :class:`NormalizedRowsCache` for dense components, which also marks the
+    normalized rows as out of date when a NumPy ufunc writes into the
+    component or one of its views: in-place arithmetic (e.g., `profiles +=
+    values`), the `out` argument (e.g., `np.add(a, b, out=profiles)`) and
+    unbuffered operations (e.g., `np.add.at(profiles, users, values)`).
+    """
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        outputs = kwargs.get("out", ())
+        written = outputs + inputs[:1] if method == "at" else outputs
+        for array in written:
+            if isinstance(array, NormalizedRowsCache):
+                array.invalidate_norms()
+        # apply the ufunc to plain arrays, then wrap the results as NumPy
+        # would have done
+        inputs = tuple(_as_plain_array(array) for array in inputs)
+        if outputs:
+            kwargs["out"] = tuple(_as_plain_array(array) for array in outputs)
+        if "where" in kwargs:
+            kwargs["where"] = _as_plain_array(kwargs["where"])
+        result = getattr(ufunc, method)(*inputs, **kwargs)
+        if method == "at":
+            return None
+        if outputs:
+            return outputs[0] if len(outputs) == 1 else outputs
+        if isinstance(result, tuple):
+            return tuple(self._wrap_result(array) for array in result)
+        return self._wrap_result(result)
+
+    def _wrap_result(self, result):
+        """ Returns arrays as instances of the class of the component """
+        if isinstance(result, np.ndarray):
+            return self.__array_wrap__(result)  # pylint: disable=no-member
+        return result
+
+
+def _as_plain_array(array):
+    """ Views the arrays that cache their normalized rows as plain arrays """
+    if isinstance(array, DenseNormalizedRowsCache):
+        return array.view(np.ndarray)
+    return array
+
+
+class PredictedUserProfiles(
+    DenseNormalizedRowsCache, Component
+):  # pylint: disable=too-many-ancestors
     """
     User profiles as predicted by the model. This class is a container
     compatible with Numpy operations and it does not make assumptions on the
-    size of the representation.
+    size of the representation. Its normalized rows are cached (see
+    :class:`NormalizedRowsCache`).
     """
 
-    def __init__(self, user_profiles=None, size=None, verbose=False, seed=None):
+    sparse_mixins = (NormalizedRowsCache,)
+
+    def __init__(
+        self, user_profiles=None, size=None, verbose=False, seed=None
+    ):  # pylint: disable=super-init-not-called
         self.name = "predicted_user_profiles"
+        NormalizedRowsCache._init_norm_cache(self)
         Component.__init__(self, current_state=user_profiles, size=size, verbose=verbose, seed=seed)
 
 
-class ActualUserProfiles(Component):  # pylint: disable=too-many-ancestors
+class ActualUserProfiles(DenseNormalizedRowsCache, Component):  # pylint: disable=too-many-ancestors
     """
     Real user profiles, unknown to the model. This class is a container
     compatible with Numpy operations and it does not make assumptions on the
-    size of the representation.
+    size of the representation. Its normalized rows are cached (see
+    :class:`NormalizedRowsCache`).
     """
 
-    def __init__(self, user_profiles=None, size=None, verbose=False, seed=None):
+    sparse_mixins = (NormalizedRowsCache,)
+
+    def __init__(
+        self, user_profiles=None, size=None, verbose=False, seed=None
+    ):  # pylint: disable=super-init-not-called
         self.name = "actual_user_profiles"
+        NormalizedRowsCache._init_norm_cache(self)
         Component.__init__(self, current_state=user_profiles, size=size, verbose=verbose, seed=seed)
 
 
-class Users(BaseComponent):  # pylint: disable=too-many-ancestors
+class Users(BaseComponent):  # pylint: disable=too-many-ancestors,too-many-instance-attributes
     """
     Class representing users in the system.
 
@@ -120,6 +309,26 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         seed: int, None (optional, default: None)
             Seed for random generator.
 
+        dtype: :obj:`numpy.dtype` or None (optional, default: None)
+            If not None, the user profiles and scores are stored with this
+            floating-point type (e.g., `numpy.float32`). If None, the type of
+            the inputs is kept (random profiles are `float64`).
+
+        lazy_scores: bool (optional, default: False)
+            If True, :meth:`compute_user_scores` does not compute the full
+            matrix of actual scores when it is called again after the first
+            time (e.g., after user profiles drift). Instead,
+            :meth:`get_user_feedback` computes only the scores of the items
+            shown to each user, and the full matrix is computed when
+            :attr:`actual_user_scores` is read (e.g., by
+            :class:`~metrics.measurement.MSEMeasurement`, or when the state of
+            the users is recorded). Calls to :meth:`compute_user_scores` then
+            no longer record the actual scores in the state history: they are
+            only recorded with the rest of the system state. This only applies
+            if `score_fn` is :func:`~matrix_ops.inner_product` (or
+            :func:`~matrix_ops.blocked_inner_product`) and the item attributes
+            are dense; otherwise, scores are always computed in full.
+
     Attributes
     ------------
 
@@ -170,6 +379,8 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         verbose=False,
         seed=None,
         attention_exp=0.0,
+        dtype=None,
+        lazy_scores=False,
     ):  # pylint: disable=too-many-arguments
         self.rng = Generator(seed=seed)
         # general input checks
@@ -185,6 +396,7 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         if actual_user_scores is not None:
             if not isinstance(actual_user_scores, (list, np.ndarray)):
                 raise TypeError("actual_user_profiles must be a list or numpy.ndarray")
+        given_profiles = actual_user_profiles
         if actual_user_profiles is None and size is not None:
             row_zeros = np.zeros(size[1])  # one row vector of zeroes
             while actual_user_profiles is None or contains_row(actual_user_profiles, row_zeros):
@@ -195,17 +407,47 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         num_users = check_consistency(
             users=actual_user_profiles, user_item_scores=actual_user_scores, num_users=num_users
         )[0]
-        self.actual_user_profiles = ActualUserProfiles(np.asarray(actual_user_profiles))
+        self.dtype = dtype
+        actual_user_profiles = cast_to_dtype(np.asarray(actual_user_profiles), dtype)
+        # profiles drift in place, so they must not share memory with the
+        # array passed by the caller
+        if isinstance(given_profiles, np.ndarray) and np.may_share_memory(
+            actual_user_profiles, given_profiles
+        ):
+            actual_user_profiles = actual_user_profiles.copy()
+        self.actual_user_profiles = ActualUserProfiles(actual_user_profiles)
         self.interact_with_items = interact_with_items
         self.drift = drift
         self.attention_exp = attention_exp
         assert callable(score_fn)
         self.score_fn = score_fn  # function that dictates how scores will be generated
-        self.actual_user_scores = actual_user_scores
+        self.lazy_scores = lazy_scores
+        self.actual_user_scores = cast_to_dtype(actual_user_scores, dtype)
         self.user_vector = np.arange(num_users, dtype=int)
+        # work arrays of get_user_feedback, reused across timesteps
+        self._feedback_buffers = None
+        self._attention_cache = None
+        self._drift_work = None
         self.name = "actual_user_scores"
         BaseComponent.__init__(self, verbose=verbose, init_value=self.actual_user_scores)
 
+    @property
+    def actual_user_scores(self):
+        """ Matrix of actual scores, computed first if lazy scores are pending """
+        if self._pending_items is not None:
+            items, self._pending_items = self._pending_items, None
+            actual_scores = self.score_fn(
+                user_profiles=self.actual_user_profiles, item_attributes=items
+            )
+            self._actual_user_scores[:, :] = cast_to_dtype(actual_scores, self.dtype)
+        return self._actual_user_scores
+
+    @actual_user_scores.setter
+    def actual_user_scores(self, value):
+        self._actual_user_scores = value
+        # item attributes whose scores have not been computed yet
+        self._pending_items = None
+
     def set_score_function(self, score_fn):
         """Users "score" items before "deciding" which item to interact with.
             This function makes it possible to set an arbitrary function as the
@@ -246,9 +488,21 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         """
         if not callable(self.score_fn):
             raise TypeError("score function must be callable")
+        if (
+            self.lazy_scores
+            and self._actual_user_scores is not None
+            and self.score_fn in (inner_product, blocked_inner_product)
+            and isinstance(item_attributes, np.ndarray)
+            and self._actual_user_scores.shape[1] == item_attributes.shape[1]
+        ):
+            # scores are computed when they are read
+            self._pending_items = item_attributes
+            return
+        self._pending_items = None
         actual_scores = self.score_fn(
             user_profiles=self.actual_user_profiles, item_attributes=item_attributes
         )
+        actual_scores = cast_to_dtype(actual_scores, self.dtype)
         if self.actual_user_scores is None:
             self.actual_user_scores = actual_scores
         else:
@@ -274,7 +528,8 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         new_scores = self.score_fn(
             user_profiles=self.actual_user_profiles, item_attributes=new_items
         )
-        self.actual_user_scores = np.hstack([self.actual_user_scores, new_scores])
+        new_scores = cast_to_dtype(new_scores, self.dtype)
+        self.actual_user_scores = append_columns(self.actual_user_scores, new_scores)
         self.store_state()
 
     def get_actual_user_scores(self, user=None):
@@ -339,15 +594,16 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         item_attributes = kwargs.pop("item_attributes", None)
         if items_shown is None:
             raise ValueError("Items can't be None")
-        reshaped_user_vector = self.user_vector.reshape((items_shown.shape[0], 1))
-        user_interactions = self.actual_user_scores[reshaped_user_vector, items_shown]
+        user_interactions = self._scores_of_items_shown(items_shown)
         if self.attention_exp != 0:
-            idxs = np.arange(items_shown.shape[1]) + 1
-            multiplier = np.power(idxs, self.attention_exp)
             # multiply each row by the attention coefficient
-            user_interactions = user_interactions * multiplier
-        sorted_user_preferences = user_interactions.argsort()[:, -1]
-        interactions = items_shown[self.user_vector, sorted_user_preferences]
+            multiplier = self._attention_multiplier(items_shown.shape[1])
+            if np.result_type(user_interactions, multiplier) == user_interactions.dtype:
+                np.multiply(user_interactions, multiplier, out=user_interactions)
+            else:
+                # e.g., integer scores
+                user_interactions = user_interactions * multiplier
+        interactions = self._select_items(user_interactions, items_shown)
         # logging information if requested
         if self.is_verbose():
             self.log(f"User scores for given items are:\n{str(user_interactions)}")
@@ -363,6 +619,65 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
             self.compute_user_scores(item_attributes)
         return interactions
 
+    def _scores_of_items_shown(self, items_shown):
+        """Gathers the actual scores of the items shown to each user into a
+        :math:`|U|\\times\\text{num_items_per_iter}` matrix. The matrix and
+        the indices used to fill it are reused across timesteps, so the
+        result is only valid until the next call."""
+        if self._pending_items is not None:
+            return self._score_items_shown(items_shown)
+        scores = np.asarray(self.actual_user_scores)
+        num_users = items_shown.shape[0]
+        # strides of the matrix of scores, in elements
+        (row_stride, col_stride), remainders = np.divmod(scores.strides, scores.itemsize)
+        if scores.size == 0 or remainders.any() or min(row_stride, col_stride) < 0:
+            return scores[self.user_vector.reshape((num_users, 1)), items_shown]
+        key = (items_shown.shape, scores.dtype)
+        if self._feedback_buffers is None or self._feedback_buffers[0] != key:
+            self._feedback_buffers = (
+                key,
+                np.empty(items_shown.shape, dtype=scores.dtype),
+                np.empty(items_shown.shape, dtype=np.intp),
+            )
+        _, gathered, flat_idxs = self._feedback_buffers
+        # index of element [user, item] in the memory of the matrix of scores,
+        # which may be a view of a wider buffer (see CatalogBuffer)
+        np.multiply(items_shown, col_stride, out=flat_idxs)
+        np.add(flat_idxs, (self.user_vector * row_stride).reshape((num_users, 1)), out=flat_idxs)
+        span = (scores.shape[0] - 1) * row_stride + (scores.shape[1] - 1) * col_stride + 1
+        memory = as_strided(scores, shape=(span,), strides=(scores.itemsize,), writeable=False)
+        return np.take(memory, flat_idxs, out=gathered)
+
+    def _score_items_shown(self, items_shown):
+        """Computes the scores of the items shown to each user, for lazy
+        scores, as the dot products of each (normalized) user profile with the
+        attributes of the items shown to that user."""
+        user_profiles = self.actual_user_profiles.normalized_rows()
+        if user_profiles is None:
+            user_profiles = normalize_matrix(np.asarray(self.actual_user_profiles), axis=1)
+        # |U| x num_items_per_iter x |A|
+        shown_attributes = np.asarray(self._pending_items).T[items_shown]
+        scores = np.einsum("uka,ua->uk", shown_attributes, user_profiles)
+        return cast_to_dtype(scores, self.dtype)
+
+    def _attention_multiplier(self, num_shown):
+        """Returns the attention coefficient of each of the `num_shown`
+        positions in which items are shown, computed once per number of items
+        shown and attention exponent."""
+        key = (num_shown, self.attention_exp)
+        if self._attention_cache is None or self._attention_cache[0] != key:
+            idxs = np.arange(1, num_shown + 1, dtype=float)
+            self._attention_cache = (key, np.power(idxs, self.attention_exp))
+        return self._attention_cache[1]
+
+    def _select_items(self, utilities, items_shown):
+        """Returns the item with the highest utility among the items shown to
+        each user. Ties are broken in favor of the item shown last."""
+        num_shown = items_shown.shape[1]
+        # argmax returns the first maximum, so search the reversed rows
+        choices = num_shown - 1 - utilities[:, ::-1].argmax(axis=1)
+        return items_shown[self.user_vector, choices]
+
     def update_profiles(self, item_attributes):
         """In the case of dynamic user profiles, we update the user's actual
         profiles with new values as each user profile "drifts" towards
@@ -377,9 +692,19 @@ class Users(BaseComponent):  # pylint: disable=too-many-ancestors
         """
         # we make no assumptions about whether the user profiles or item
         # attributes vectors are normalized
-        self.actual_user_profiles = slerp(
-            self.actual_user_profiles, item_attributes, perc=self.drift
-        )
+        profiles = np.asarray(self.actual_user_profiles)
+        item_attributes = np.asarray(item_attributes)
+        if not np.issubdtype(profiles.dtype, np.floating):
+            # integer profiles can't hold the rotated vectors
+            self.actual_user_profiles = ActualUserProfiles(
+                slerp(profiles, item_attributes, perc=self.drift)
+            )
+            return
+        if self._drift_work is None or self._drift_work.shape != profiles.shape:
+            self._drift_work = np.empty_like(profiles)
+        # rotate in place, so that the component (and its history) is kept
+        slerp(profiles, item_attributes, perc=self.drift, out=profiles, work=self._drift_work)
+        self.actual_user_profiles.invalidate_norms()
 
     def store_state(self):
         """ Store the actual user scores in the state history """
@@ -407,6 +732,19 @@ class DNUsers(Users):
         beta: float
             Parameter for the DN model (see docstring). Default value is fitted
             parameter from Webb et al. (2020).
+
+        error_cov: :obj:`numpy.ndarray` or None (optional, default: None)
+            Covariance matrix of the errors added to the normalized values of
+            the items shown to a user, of size
+            :math:`\\text{num_items_per_iter}\\times\\text{num_items_per_iter}`.
+            If None, the errors have unit variance and a correlation of 0.5
+            between any two items, as in Webb et al. (2020). The matrix is
+            copied and factorized once; assign a new matrix to change it.
+
+        dtype: :obj:`numpy.dtype` or None (optional, default: None)
+            If not None, the user profiles and scores are stored with this
+            floating-point type (e.g., `numpy.float32`), and the errors and
+            utilities are computed with it. See :class:`Users`.
     """
 
     def __init__(
@@ -423,6 +761,9 @@ class DNUsers(Users):
         beta=0.9739,
         verbose=False,
         seed=None,
+        lazy_scores=False,
+        error_cov=None,
+        dtype=None,
     ):  # pylint: disable=too-many-arguments
         Users.__init__(
             self,
@@ -435,10 +776,33 @@ class DNUsers(Users):
             score_fn,
             verbose,
             seed,
+            dtype=dtype,
+            lazy_scores=lazy_scores,
         )
         self.sigma = sigma
         self.omega = omega
         self.beta = beta
+        # read-only copy of the covariance matrix, and its factorization
+        self._error_cov = None
+        self._error_factor = None
+        self.error_cov = error_cov
+
+    @property
+    def error_cov(self):
+        """Covariance matrix of the errors, or None for the default one. It
+        is a read-only copy of the matrix that was set, which is factorized
+        once, when it is set."""
+        return self._error_cov
+
+    @error_cov.setter
+    def error_cov(self, value):
+        if value is None:
+            self._error_cov, self._error_factor = None, None
+            return
+        error_cov = np.array(value, dtype=float)
+        error_cov.flags.writeable = False
+        self._error_factor = _covariance_factor(error_cov)
+        self._error_cov = error_cov
 
     def get_user_feedback(self, *args, **kwargs):
         """
@@ -476,14 +840,14 @@ class DNUsers(Users):
         item_attributes = kwargs.pop("item_attributes", None)
         if items_shown is None:
             raise ValueError("Items can't be None")
-        reshaped_user_vector = self.user_vector.reshape((items_shown.shape[0], 1))
-        interaction_scores = self.actual_user_scores[reshaped_user_vector, items_shown]
+        interaction_scores = self._scores_of_items_shown(items_shown)
 
-        self.log("User scores for given items are:\n" + str(interaction_scores))
+        if self.is_verbose():
+            self.log("User scores for given items are:\n" + str(interaction_scores))
         item_utilities = self.calc_dn_utilities(interaction_scores)
-        sorted_user_preferences = item_utilities.argsort()[:, -1]
-        interactions = items_shown[self.user_vector, sorted_user_preferences]
-        self.log("Users interact with the following items respectively:\n" + str(interactions))
+        interactions = self._select_items(item_utilities, items_shown)
+        if self.is_verbose():
+            self.log("Users interact with the following items respectively:\n" + str(interactions))
 
         if self.drift > 0:
             if item_attributes is None:
@@ -515,9 +879,12 @@ class DNUsers(Users):
             normed_values: :obj:`numpy.ndarray`
                 The transformed utility values (i.e., :math:`z(\\textbf{v})`).
         """
+        return np.divide(user_item_scores.T, self._normalization(user_item_scores))  # |I| x |U|
+
+    def _normalization(self, user_item_scores):
+        """ Denominator of :math:`z(\\textbf{v})` for each user """
         summed_norms = np.linalg.norm(user_item_scores, ord=self.beta, axis=1)
-        denom = self.sigma + np.multiply(self.omega, summed_norms)
-        return np.divide(user_item_scores.T, denom)  # now |I| x |U|
+        return self.sigma + np.multiply(self.omega, summed_norms)
 
     def calc_dn_utilities(self, user_item_scores):
         """
@@ -549,12 +916,12 @@ class DNUsers(Users):
             Normalized & randomly perturbed utilities for different each
             pair of users and items in the recommendation set.
         """
-        normed_values = self.normalize_values(user_item_scores)
-        num_choices, num_users = normed_values.shape
-        eps = self.sample_from_error_dist(num_choices, num_users)
-        utility = normed_values + eps
-        # transform so |U| x |I|
-        return utility.T
+        user_item_scores = np.asarray(user_item_scores)
+        num_users, num_choices = user_item_scores.shape
+        # computed directly as |U| x |I|, in the buffer of the errors
+        utility = self._sample_errors(num_users, num_choices)
+        utility += user_item_scores / self._normalization(user_item_scores)[:, np.newaxis]
+        return utility
 
     def sample_from_error_dist(self, num_choices, num_users):
         """
@@ -580,15 +947,40 @@ class DNUsers(Users):
             Randomly sampled errors from the error distribution. Should have
             shape :math:`|I|\\times|U|`.
         """
-        mean = np.zeros(num_choices)
-        # in accordance with the DN model from Webb et al.,
-        # the following covariance matrix has the structure
-        # [ 1     0.5   ...   0.5   0.5 ]
-        # [ 0.5    1    ...   0.5   0.5 ]
-        # [ 0.5   0.5   ...    1    0.5 ]
-        # [ 0.5   0.5   ...   0.5    1  ]
-        cov = np.ones((num_choices, num_choices)) * 0.5
-        cov[np.arange(num_choices), np.arange(num_choices)] = 1
-        # generate |I| x |U| multivariate normal
-        eps = self.rng.multivariate_normal(mean, cov, size=num_users).T
-        return eps
+        return self._sample_errors(num_users, num_choices).T
+
+    def _sample_errors(self, num_users, num_choices):
+        """Samples the errors of :func:`sample_from_error_dist` as a
+        :math:`|U|\\times|I|` matrix, without building or factorizing the
+        default covariance matrix."""
+        # errors are float32 only if the scores are
+        single = self.dtype is not None and np.dtype(self.dtype) == np.float32
+        dtype = np.float32 if single else np.float64
+        if self.error_cov is None:
+            # in accordance with the DN model from Webb et al., the covariance
+            # matrix has 1 on the diagonal and 0.5 everywhere else: this is
+            # the covariance of sqrt(0.5) * (z_common + z_i), where z_common
+            # is shared by all the items shown to a user
+            samples = self.rng.standard_normal((num_users, num_choices + 1), dtype=dtype)
+            eps = samples[:, 1:]
+            eps += samples[:, :1]
+            eps *= np.sqrt(0.5, dtype=dtype)
+            return eps
+        factor = self._error_factor.astype(dtype, copy=False)
+        if factor.shape[0] != num_choices:
+            raise ValueError(
+                f"error_cov is {factor.shape[0]}x{factor.shape[0]}, but users choose "
+                f"between {num_choices} items"
+            )
+        return self.rng.standard_normal((num_users, num_choices), dtype=dtype) @ factor.T
+
+
+def _covariance_factor(cov):
+    """Returns a matrix :math:`L` such that :math:`LL^T` is the covariance
+    matrix `cov`, which may be positive semi-definite"""
+    cov = np.asarray(cov, dtype=float)
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
@@ -2,43 +2,72 @@
 Classes for logging
 """
 import logging
+import threading
 from abc import ABC
 
+# file where the messages of verbose objects are written
+LOG_FILE = "trecs.log"
+
+# handler shared by all the loggers of the process, created the first time an
+# object is made verbose
+_HANDLER = None
+_HANDLER_LOCK = threading.Lock()
+
+
+def _shared_handler():
+    """Returns the handler that writes messages to :data:`LOG_FILE`, creating
+    it if needed. The file is only opened when the first message is written."""
+    global _HANDLER  # pylint: disable=global-statement
+    with _HANDLER_LOCK:
+        if _HANDLER is None:
+            handler = logging.FileHandler(LOG_FILE, delay=True)
+            handler.setLevel(logging.DEBUG)
+            handler.setFormatter(logging.Formatter("%(name)s - %(message)s"))
+            _HANDLER = handler
+        return _HANDLER
+
 
 class VerboseMode(ABC):
-    """Abstract class for verbose mode"""
+    """Abstract class for verbose mode.
 
-    def __init__(self, name, verbose=False):
-        self._logger = DebugLogger(name, verbose)
+    Objects that are not verbose do not create a logger, so they cost nothing
+    to create; their :func:`is_verbose` is a plain attribute check. The first
+    object that is made verbose creates a single file handler, shared by all
+    the objects of the process, which writes to :data:`LOG_FILE`.
+    """
 
-    def __del__(self):
-        """
-        Closes the logging handler upon garbage collection.
-        """
-        self.close()
+    def __init__(self, name, verbose=False):
+        self._logger_name = name
+        self._logger = None
+        if verbose:
+            self.set_verbose(verbose)
 
     def set_verbose(self, toggle):
         """Toggle verbosity"""
         try:
+            if getattr(self, "_logger", None) is None:
+                self._logger = DebugLogger(getattr(self, "_logger_name", __name__.upper()))
             self._logger.set_verbose(toggle)
         except TypeError as err:
             print("set_verbose:", err)
 
     def is_verbose(self):
         """Return True if verbosity is enabled, False otherwise"""
-        return self._logger.is_verbose()
+        # objects created without calling __init__ (e.g., views of arrays)
+        # are never verbose
+        logger = getattr(self, "_logger", None)
+        return logger is not None and logger.verbose
 
     def log(self, msg):
         """ Log given message"""
-        self._logger.log(msg)
+        if self.is_verbose():
+            self._logger.log(msg)
 
     def close(self):
-        """ Close the logging file handler """
-        # occasionally verbose objects are created incidentally
-        # when performing matrix operations
-        if hasattr(self, "_logger"):
-            self._logger.handler.close()
-            self._logger.logger.removeHandler(self._logger.handler)
+        """Stops logging the messages of this object. The file handler is
+        shared by all objects and stays open."""
+        if getattr(self, "_logger", None) is not None:
+            self._logger.set_verbose(False)
 
 
 class DebugLogger:
@@ -47,53 +76,31 @@ class DebugLogger:
     def __init__(self, name, verbose=False):
         """Instantiate DebugLogger object
         @name: name of logger
-        @level: level of logger (see documentation of logging module)
+        @verbose: if True, DEBUG-level messages are written to the log file
         """
-        # create logger
         self.logger = logging.getLogger(name)
-        if verbose:
-            level = logging.DEBUG
-        else:
-            level = logging.INFO
-        self.logger.setLevel(level)
-
-        # create file handler and set level to debug
-        self.handler = logging.FileHandler("trecs.log")
-        self.handler.setLevel(logging.DEBUG)
-
-        # create formatter
-        formatter = logging.Formatter("%(name)s - %(message)s")
-
-        # add formatter to handler
-        self.handler.setFormatter(formatter)
-
-        # add handler to logger
-        self.logger.addHandler(self.handler)
-
-        # test
-        self._test_configured_logger()
-
-    def _test_configured_logger(self):
-        """Simple test to announce logger is enabled"""
-        self.logger.debug("Debugging module inizialized")
+        self.verbose = False
+        self.set_verbose(verbose)
 
     def log(self, message):
         """ Log at DEBUG level """
-        self.logger.debug(message)
+        if self.verbose:
+            self.logger.debug(message)
 
     def is_verbose(self):
         """Return True if debugger is enabled; That is, if debugger can log
         DEBUG-level messages
         """
-        return self.logger.isEnabledFor(logging.DEBUG)
+        return self.verbose
 
     def set_verbose(self, verbose=False):
         """ Enable/disable verbose """
         if not isinstance(verbose, bool):
             raise TypeError("verbose must be bool, got %s type" % type(verbose))
+        self.verbose = verbose
         if verbose:
-            level = logging.DEBUG
-        else:
-            level = logging.INFO
-
-        self.logger.setLevel(level)
+            handler = _shared_handler()
+            # loggers are shared by name, so the handler is only added once
+            if handler not in self.logger.handlers:
+                self.logger.addHandler(handler)
+            self.logger.setLevel(logging.DEBUG)
@@ -1,6 +1,10 @@
 """ Common matrix operations
 """
 import numpy as np
+import scipy.sparse as sp
+
+# default maximum size (in bytes) of the tiles used by blocked_inner_product
+DEFAULT_MEMORY_BUDGET = 64 * 2 ** 20
 
 
 def inner_product(user_profiles, item_attributes, normalize_users=True, normalize_items=False):
@@ -9,7 +13,10 @@ def inner_product(user_profiles, item_attributes, normalize_users=True, normaliz
     item attributes to return the scores (utility) each item possesses
     for each user. We call these matrices `user_profiles` and
     `item_attributes` but note that you could perform an arbitrary matrix
-    dot product with this method.
+    dot product with this method. Either matrix can be a :mod:`scipy.sparse`
+    matrix, in which case the cost of the product is proportional to its
+    number of nonzero elements; the scores are always returned as a dense
+    matrix.
 
     Parameters
     -----------
@@ -29,27 +36,429 @@ def inner_product(user_profiles, item_attributes, normalize_users=True, normaliz
     if normalize_users:
         # this is purely an optimization that prevents numpy from having
         # to multiply huge numbers
-        user_profiles = normalize_matrix(user_profiles, axis=1)
+        normalized = _cached_normalized_rows(user_profiles)
+        if normalized is None:
+            normalized = normalize_matrix(user_profiles, axis=1)
+        user_profiles = normalized
     if normalize_items:
         item_attributes = normalize_matrix(item_attributes.T, axis=1).T
     assert user_profiles.shape[1] == item_attributes.shape[0]
-    scores = np.dot(user_profiles, item_attributes)
+    scores = _dot(user_profiles, item_attributes)
     return scores
 
 
+def _cached_normalized_rows(matrix):
+    """Returns the normalized rows of `matrix` if it caches them (see
+    :class:`~trecs.components.users.NormalizedRowsCache`), or None"""
+    normalized_rows = getattr(matrix, "normalized_rows", None)
+    if normalized_rows is None:
+        return None
+    return normalized_rows()
+
+
+def _dot(matrix1, matrix2):
+    """Dot product of two matrices, either of which may be sparse. The result
+    is always dense.
+    """
+    if not sp.issparse(matrix1) and not sp.issparse(matrix2):
+        return np.dot(matrix1, matrix2)
+    result = matrix1 @ matrix2
+    if sp.issparse(result):
+        return result.toarray()
+    return np.asarray(result)
+
+
+def _norms(matrix, axis=1):
+    """Euclidean norms of the rows (axis=1) or columns (axis=0) of a matrix,
+    which may be sparse, as a column vector
+    """
+    if sp.issparse(matrix):
+        return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=axis))).reshape((-1, 1))
+    return np.linalg.norm(matrix, axis=axis)[:, np.newaxis]
+
+
+def _divide_rows(matrix, divisor):
+    """Divides each row of a matrix, which may be sparse, by the corresponding
+    element of the column vector `divisor`. Rows with a zero divisor are set to
+    zero. Single-precision matrices stay in single precision.
+    """
+    # integers are promoted to float64, float32 stays float32
+    dtype = np.result_type(matrix.dtype, np.float32)
+    if sp.issparse(matrix):
+        inverse = np.zeros(divisor.shape, dtype=dtype)
+        np.divide(1.0, divisor, out=inverse, where=divisor != 0)
+        return sp.csr_matrix(sp.diags(inverse.ravel()) @ matrix)
+    return np.divide(matrix, divisor, out=np.zeros(matrix.shape, dtype=dtype), where=divisor != 0)
+
+
+def blocked_inner_product(  # pylint: disable=too-many-arguments,too-many-locals,too-many-branches
+    user_profiles,
+    item_attributes,
+    normalize_users=True,
+    normalize_items=False,
+    out=None,
+    memory_budget=DEFAULT_MEMORY_BUDGET,
+    item_block_size=None,
+):
+    """
+    Memory-bounded version of :func:`inner_product`. Users (and optionally
+    items) are processed in tiles, so that the temporary arrays needed to
+    score each tile never take more than roughly `memory_budget` bytes, and
+    each tile is written into the output matrix `out`. Unlike
+    :func:`inner_product`, no full-size normalized copies of the inputs are
+    made.
+
+    It can be used as the `score_fn` of any
+    :class:`~trecs.models.recommender.BaseRecommender`; in that case, the
+    predicted scores are written in place. To change the memory budget, use
+    e.g. `functools.partial(blocked_inner_product, memory_budget=2**20)`.
+
+    Parameters
+    -----------
+
+        user_profiles: :obj:`array_like`
+            First factor of the dot product, which should provide a
+            representation of users.
+
+        item_attributes: :obj:`array_like`
+            Second factor of the dot product, which should provide a
+            representation of items.
+
+        normalize_users: bool (optional, default: True)
+            If True, each user profile is normalized to unit length.
+
+        normalize_items: bool (optional, default: False)
+            If True, each item attribute vector is normalized to unit length.
+
+        out: :obj:`numpy.ndarray` or None (optional, default: None)
+            Matrix of size :math:`|U|\\times|I|` where the scores are written.
+            If None, a new matrix is allocated.
+
+        memory_budget: int (optional, default: 64 MiB)
+            Approximate maximum size (in bytes) of each tile of scores.
+
+        item_block_size: int or None (optional, default: None)
+            Number of items in each tile. If None, a tile includes as many
+            items as fit in the memory budget (typically, all items).
+
+    Returns
+    --------
+        scores: :obj:`numpy.ndarray`
+    """
+    if normalize_users:
+        normalized = _cached_normalized_rows(user_profiles)
+        if normalized is not None:
+            user_profiles, normalize_users = normalized, False
+    if not sp.issparse(user_profiles):
+        user_profiles = np.asarray(user_profiles)
+    if not sp.issparse(item_attributes):
+        item_attributes = np.asarray(item_attributes)
+    if len(user_profiles.shape) == 1:
+        # turn vector into matrix with one row
+        user_profiles = user_profiles[np.newaxis, :]
+    assert user_profiles.shape[1] == item_attributes.shape[0]
+    num_users, num_items = user_profiles.shape[0], item_attributes.shape[1]
+    dtype = np.result_type(user_profiles.dtype, item_attributes.dtype)
+    if normalize_users or normalize_items:
+        dtype = np.result_type(dtype, np.float32)
+    if out is None:
+        out = np.empty((num_users, num_items), dtype=dtype)
+    if out.shape != (num_users, num_items):
+        raise ValueError(f"out must have shape {(num_users, num_items)}, got {out.shape}")
+    if normalize_users:
+        user_norms = _norms(user_profiles, axis=1)
+    if normalize_items:
+        item_norms = _norms(item_attributes, axis=0)
+    if item_block_size is None:
+        # one row of scores should fit in the memory budget
+        item_block_size = max(1, memory_budget // out.itemsize)
+    item_block_size = min(num_items, item_block_size)
+    user_block_size = max(1, memory_budget // (max(1, item_block_size) * out.itemsize))
+    for item_start in range(0, num_items, item_block_size):
+        item_block = slice(item_start, item_start + item_block_size)
+        items = item_attributes[:, item_block]
+        if normalize_items:
+            # only normalize where divisor is not zero
+            items = _divide_rows(items.T, item_norms[item_block, :]).T
+        for user_start in range(0, num_users, user_block_size):
+            user_block = slice(user_start, user_start + user_block_size)
+            users = user_profiles[user_block, :]
+            if normalize_users:
+                users = _divide_rows(users, user_norms[user_block, :])
+            scores = out[user_block, item_block]
+            if (
+                not sp.issparse(users)
+                and not sp.issparse(items)
+                and scores.flags.c_contiguous
+                and scores.dtype == np.result_type(users, items)
+            ):
+                # write the tile directly into the output matrix
+                np.dot(users, items, out=scores)
+            else:
+                scores[:, :] = _dot(users, items)
+    return out
+
+
 def normalize_matrix(matrix, axis=1):
     """Normalize a matrix so that each row vector has a Euclidean norm of 1.
-    If a vector is passed in, we treat it as a matrix with a single row.
+    If a vector is passed in, we treat it as a matrix with a single row. If a
+    sparse matrix is passed in, a sparse matrix is returned.
     """
     if len(matrix.shape) == 1:
         # turn vector into matrix with one row
         matrix = matrix[np.newaxis, :]
-    divisor = np.linalg.norm(matrix, axis=axis)[:, np.newaxis]
+    divisor = _norms(matrix, axis=axis)
     # only normalize where divisor is not zero
-    result = np.divide(matrix, divisor, out=np.zeros(matrix.shape), where=divisor != 0)
+    result = _divide_rows(matrix, divisor)
     return result
 
 
+def top_k_indices(matrix, k, mask=None):
+    """Returns the column indices of the `k` largest values in each row of
+    `matrix`, ordered from the highest to the lowest value. Ties are broken in
+    favor of the higher column index, so the result is the same as
+    `np.fliplr(matrix.argsort(kind="stable")[:, -k:])`. However, when `k` is
+    less than half the number of columns, the `k` winners of each row are
+    found with a partial selection and only they are sorted, which avoids a
+    full sort of every row; only the rows in which the `k`-th largest value is
+    tied with a value that was left out are fully sorted.
+
+    Parameters
+    -----------
+
+        matrix: :obj:`numpy.ndarray`
+            Matrix of values (e.g., predicted scores). If a vector is passed in,
+            we treat it as a matrix with a single row.
+
+        k: int
+            Number of columns to select in each row.
+
+        mask: :obj:`numpy.ndarray` or None (optional, default: None)
+            Boolean matrix with the same shape as `matrix`. Columns for which
+            the mask is True are never selected, unless a row has fewer than
+            `k` columns that are not masked. A
+            :class:`~trecs.components.items.ConsumedItems` bitset can be
+            passed instead; only its set bits are written to the scores.
+
+    Returns
+    --------
+        indices: :obj:`numpy.ndarray`
+            Matrix of size `matrix.shape[0] x k`.
+    """
+    matrix = np.asarray(matrix)
+    if mask is not None:
+        matrix = _masked(matrix, mask)
+    if len(matrix.shape) == 1:
+        # turn vector into matrix with one row
+        matrix = matrix[np.newaxis, :]
+    num_rows, num_cols = matrix.shape
+    if k <= 0:
+        return np.zeros((num_rows, 0), dtype=int)
+    if 2 * k >= num_cols:
+        # most of the columns are selected, so sorting the rows is faster
+        return np.fliplr(matrix.argsort(axis=1, kind="stable"))[:, :k]
+    # partial selection: the last k columns of the partition are the winners,
+    # and the column before them holds the largest of the other values
+    kth = num_cols - k
+    partition = np.argpartition(matrix, (kth - 1, kth), axis=1)
+    boundary = np.take_along_axis(matrix, partition[:, kth - 1 : kth + 1], axis=1)
+    # sort the winners by column index, so that the stable sort of their
+    # values breaks ties in favor of the higher column index
+    winners = np.sort(partition[:, kth:], axis=1)
+    del partition
+    order = np.take_along_axis(matrix, winners, axis=1).argsort(axis=1, kind="stable")
+    indices = np.fliplr(np.take_along_axis(winners, order, axis=1))
+    # in rows where the k-th largest value is tied with a value that was left
+    # out, the partition picked arbitrary columns among the tied ones
+    tied = np.where(boundary[:, 0] == boundary[:, 1])[0]
+    if tied.size > 0:
+        indices[tied] = np.fliplr(matrix[tied].argsort(axis=1, kind="stable"))[:, :k]
+    return indices
+
+
+def _masked(matrix, mask):
+    """Returns a copy of `matrix` with `-inf` where `mask` is True. Packed
+    masks (e.g., :class:`~trecs.components.items.ConsumedItems`) only write the
+    masked positions, into a buffer of their own."""
+    mask_scores = getattr(mask, "mask_scores", None)
+    if mask_scores is not None:
+        return mask_scores(matrix)
+    return np.where(mask, -np.inf, matrix)
+
+
+# the weights of rank_weighted_sample halve at least every 10 ranks, so values
+# ranked this many positions after the k-th have less than 2^-53 of its weight
+RANK_SAMPLE_MARGIN = 10 * 53
+
+
+def rank_weighted_sample(matrix, k, rng, mask=None):
+    """Samples `k` distinct column indices in each row of `matrix`, with
+    probabilities that decrease exponentially with the rank of the values in
+    the row: each column is half as likely to be drawn as the column ranked
+    :math:`(n-1)/(n/10)` positions above it (about 10 positions), where
+    :math:`n` is the number of columns that are not masked, so that the
+    weight of the highest-ranked column is :math:`2^{n/10}` times the weight
+    of the lowest-ranked one. Columns are drawn one at a time without
+    replacement, independently for each row, and returned in the order in
+    which they are drawn.
+
+    All rows are sampled at once with the Gumbel-top-`k` trick: the `k`
+    largest values of the log-weights perturbed with Gumbel noise are a
+    sample without replacement. Only the top :math:`k+530` values of each row
+    are ranked, since columns ranked lower have less than :math:`2^{-53}`
+    times the weight of the `k`-th one.
+
+    Parameters
+    -----------
+
+        matrix: :obj:`numpy.ndarray`
+            Matrix of values (e.g., predicted scores).
+
+        k: int
+            Number of columns to sample in each row. Each row must have at
+            least `k` columns that are not masked.
+
+        rng: :obj:`numpy.random.Generator`
+            Random generator used to draw the samples.
+
+        mask: :obj:`numpy.ndarray` or None (optional, default: None)
+            Boolean matrix with the same shape as `matrix`, or a
+            :class:`~trecs.components.items.ConsumedItems` bitset. Columns for
+            which the mask is True are never sampled.
+
+    Returns
+    --------
+        indices: :obj:`numpy.ndarray`
+            Matrix of size `matrix.shape[0] x k`.
+    """
+    matrix = np.asarray(matrix)
+    if len(matrix.shape) == 1:
+        matrix = matrix[np.newaxis, :]
+        mask = None if mask is None else np.asarray(mask)[np.newaxis, :]
+    num_rows, num_cols = matrix.shape
+    if k <= 0:
+        return np.zeros((num_rows, 0), dtype=int)
+    num_unmasked = np.full(num_rows, num_cols) if mask is None else num_cols - mask.sum(axis=1)
+    # candidates ranked from the highest to the lowest value
+    num_candidates = min(num_cols, k + RANK_SAMPLE_MARGIN)
+    candidates = top_k_indices(matrix, num_candidates, mask=mask)
+    ranks = np.arange(num_candidates)
+    # log-weight of each rank: log(2) * (n / 10) * (n - 1 - rank) / (n - 1),
+    # up to a constant per row
+    slope = np.log(2) * num_unmasked / (10 * np.maximum(num_unmasked - 1, 1))
+    keys = -slope[:, np.newaxis] * ranks + rng.gumbel(size=(num_rows, num_candidates))
+    # masked columns are ranked last
+    keys[ranks >= num_unmasked[:, np.newaxis]] = -np.inf
+    picks = top_k_indices(keys, k)
+    return np.take_along_axis(candidates, picks, axis=1)
+
+
+# rows with fewer than this many times k columns available are sampled by
+# ranking all their columns, since rejection sampling would rarely succeed
+REJECTION_MIN_RATIO = 2
+
+
+def sample_without_replacement(  # pylint: disable=too-many-arguments,too-many-locals,too-many-branches
+    num_rows, num_cols, k, rng, exclude=None, mask=None
+):
+    """Samples `k` distinct column indices uniformly at random in each row of
+    a `num_rows x num_cols` matrix, independently for each row, without
+    drawing the columns in `exclude` or the columns for which `mask` is True.
+
+    Columns are drawn with rejection sampling: all rows are drawn at once,
+    and only the draws that collide with another draw of the same row, with
+    an excluded column or with a masked column are drawn again. When at least
+    `2k` columns are available in a row, this takes a constant number of
+    rounds in expectation, so the cost is about :math:`O(|U|\\cdot k)`
+    rather than the :math:`O(|U|\\cdot|I|)` of a permutation per row. Rows in
+    which fewer columns are available are sampled by ranking random keys of
+    all their columns. If a row has fewer than `k` available columns, masked
+    columns, and then excluded columns, are drawn to make up the difference.
+
+    Parameters
+    -----------
+
+        num_rows: int
+            Number of rows (e.g., users).
+
+        num_cols: int
+            Number of columns (e.g., items). It must be at least `k`.
+
+        k: int
+            Number of columns to sample in each row.
+
+        rng: :obj:`numpy.random.Generator`
+            Random generator used to draw the samples.
+
+        exclude: :obj:`numpy.ndarray` or None (optional, default: None)
+            Matrix of size `num_rows x m` with column indices (e.g., items
+            already recommended) that are not drawn in each row.
+
+        mask: :obj:`numpy.ndarray` or None (optional, default: None)
+            Boolean matrix of size `num_rows x num_cols`, or a
+            :class:`~trecs.components.items.ConsumedItems` bitset, which is
+            only unpacked for rows with few available columns. Columns for
+            which the mask is True (e.g., items already consumed) are not drawn.
+
+    Returns
+    --------
+        indices: :obj:`numpy.ndarray`
+            Matrix of size `num_rows x k`.
+    """
+    if k > num_cols:
+        raise ValueError("Cannot sample more distinct columns than there are columns")
+    if k <= 0:
+        return np.zeros((num_rows, 0), dtype=int)
+    if exclude is not None:
+        exclude = np.asarray(exclude, dtype=int).reshape((num_rows, -1))
+        if exclude.shape[1] == 0:
+            exclude = None
+    num_available = np.full(num_rows, num_cols)
+    if mask is not None:
+        num_available -= mask.sum(axis=1)
+    if exclude is not None:
+        # count each excluded column once, and not if it is masked already
+        sorted_exclude = np.sort(exclude, axis=1)
+        distinct = np.ones(sorted_exclude.shape, dtype=bool)
+        distinct[:, 1:] = sorted_exclude[:, 1:] != sorted_exclude[:, :-1]
+        if mask is not None:
+            rows = np.arange(num_rows)[:, np.newaxis]
+            distinct &= ~mask[rows, sorted_exclude]
+        num_available -= distinct.sum(axis=1)
+
+    samples = np.empty((num_rows, k), dtype=int)
+    dense_rows = np.flatnonzero(num_available < REJECTION_MIN_RATIO * k)
+    if dense_rows.size > 0:
+        # rank random keys; masked and then excluded columns are ranked last
+        keys = rng.random((dense_rows.size, num_cols))
+        if mask is not None:
+            keys[mask[dense_rows]] += 1
+        if exclude is not None:
+            np.put_along_axis(keys, exclude[dense_rows], 2, axis=1)
+        samples[dense_rows] = top_k_indices(-keys, k)
+
+    rows = np.flatnonzero(num_available >= REJECTION_MIN_RATIO * k)
+    samples[rows] = rng.integers(num_cols, size=(rows.size, k))
+    while rows.size > 0:
+        draws = samples[rows]
+        rejected = np.zeros(draws.shape, dtype=bool)
+        # within each row, keep the first occurrence of each column
+        order = draws.argsort(axis=1, kind="stable")
+        sorted_draws = np.take_along_axis(draws, order, axis=1)
+        repeated = sorted_draws[:, 1:] == sorted_draws[:, :-1]
+        np.put_along_axis(rejected, order[:, 1:], repeated, axis=1)
+        if exclude is not None:
+            rejected |= (draws[:, :, np.newaxis] == exclude[rows, np.newaxis, :]).any(axis=2)
+        if mask is not None:
+            rejected |= mask[rows[:, np.newaxis], draws]
+        if not rejected.any():
+            break
+        draws[rejected] = rng.integers(num_cols, size=rejected.sum())
+        samples[rows] = draws
+        rows = rows[rejected.any(axis=1)]
+    return samples
+
+
 def contains_row(matrix, row):
     """Check if a numpy matrix contains a row with the same values as the
     variable `row`.
@@ -57,7 +466,7 @@ def contains_row(matrix, row):
     return (matrix == row).all(axis=1).any()
 
 
-def slerp(mat1, mat2, perc=0.05):
+def slerp(mat1, mat2, perc=0.05, out=None, work=None):  # pylint: disable=too-many-locals
     """Implements `spherical linear interpolation`_. Takes each row vector in
     mat1 and rotates it in the direction of the corresponding row vector in
     mat2. The angle of rotation is `(perc * the angle between the two row
@@ -67,6 +476,16 @@ def slerp(mat1, mat2, perc=0.05):
     will have row vectors that each have the same norm as mat1, but pointing
     in different directions.
 
+    Each rotated row is computed as a weighted sum of the two original rows,
+    with one pair of weights per row, so only vectors of one value per row
+    are allocated (plus `work`, if it is not given). Rows that are parallel
+    or almost parallel are interpolated linearly, which is the limit of the
+    rotation. Rows in exactly (or almost exactly) opposite directions do not
+    define a plane of rotation: they are rotated towards an arbitrary (but
+    deterministic) direction orthogonal to the row of mat1. Rows of mat1
+    that are zero stay zero, and rows of mat1 whose corresponding row of
+    mat2 is zero are not rotated.
+
     .. _`spherical linear interpolation`: https://en.wikipedia.org/wiki/Slerp
 
     Parameters
@@ -82,6 +501,20 @@ def slerp(mat1, mat2, perc=0.05):
         perc: float
             Parameter in [0,1] inclusive that specifies the percentage
             of rotation.
+
+        out: :obj:`numpy.ndarray` or None (optional, default: None)
+            Floating-point matrix where the result is written. It can be
+            `mat1` itself, to rotate its rows in place. If None, a new matrix
+            is allocated.
+
+        work: :obj:`numpy.ndarray` or None (optional, default: None)
+            Scratch matrix of the same shape as the result, which can be
+            reused across calls. If None, a new matrix is allocated.
+
+    Returns
+    --------
+        rotated: :obj:`numpy.ndarray`
+            The rotated matrix (`out`, if it was given).
     """
     assert 0 <= perc <= 1.0
     assert mat1.shape == mat2.shape  # arrays should have same dimension
@@ -89,26 +522,57 @@ def slerp(mat1, mat2, perc=0.05):
         # turn vector into matrix with one row
         mat1 = mat1[np.newaxis, :]
         mat2 = mat2[np.newaxis, :]
-    mat1_length = np.linalg.norm(mat1, axis=1)[:, np.newaxis]
-    mat2_length = np.linalg.norm(mat2, axis=1)[:, np.newaxis]
-    mat1_norm, mat2_norm = mat1 / mat1_length, mat2 / mat2_length
-    row_dot_product = (mat1_norm * mat2_norm).sum(axis=1)
+    mat1_length = np.sqrt(np.einsum("ij,ij->i", mat1, mat1))
+    mat2_length = np.sqrt(np.einsum("ij,ij->i", mat2, mat2))
+    lengths = mat1_length * mat2_length
+    nonzero = lengths > 0
+    cos_omega = np.divide(np.einsum("ij,ij->i", mat1, mat2), lengths, where=nonzero)
+    cos_omega[~nonzero] = 1.0
     # dot every user profile with its corresponding item attributes
-    omega = np.arccos(row_dot_product)
-    # note: bad things will happen if the vectors are in exactly opposite
-    # directions! this is a pathological case; we are using this function
-    # to calculate user profile drift after the user selects an item.
-    # but the dot product of a user profile and an item vector in opposite
-    # directions is very negative, so a user should almost never select an
-    # item in the opposite direction of its own profile.
-    if (omega == np.pi).any():
-        # raise error if vectors are in exactly opposite directions
-        raise ValueError(
-            "Cannot perform spherical interpolation between vectors in opposite direction"
-        )
-    sin_o = np.sin(omega)
-    unit_rot = (
-        np.sin((1.0 - perc) * omega) / sin_o * mat1_norm.T
-        + np.sin(perc * omega) / sin_o * mat2_norm.T
-    ).T
-    return unit_rot * mat1_length
+    omega = np.arccos(np.clip(cos_omega, -1.0, 1.0))
+    # sin(x * omega) / sin(omega) = x * sinc(x * omega / pi) / sinc(omega / pi),
+    # which is well-defined when omega goes to 0
+    sinc_omega = np.sinc(omega / np.pi)
+    # rows in (almost) opposite directions: sin(omega) vanishes, and the sum
+    # of the two rows would cancel out
+    opposite = sinc_omega < 1e-7
+    sinc_omega[opposite] = 1.0
+    mat1_weight = (1.0 - perc) * np.sinc((1.0 - perc) * omega / np.pi) / sinc_omega
+    mat2_weight = np.zeros_like(mat1_weight)
+    np.divide(
+        perc * np.sinc(perc * omega / np.pi) / sinc_omega * mat1_length,
+        mat2_length,
+        out=mat2_weight,
+        where=nonzero,
+    )
+    mat1_weight[~nonzero] = 1.0
+    opposite_rows = np.flatnonzero(opposite)
+    if opposite_rows.size > 0:
+        rotated_opposite = _rotate_orthogonally(mat1[opposite_rows], perc * omega[opposite_rows])
+    if out is None:
+        out = np.empty(mat1.shape, dtype=np.result_type(mat1, mat2, np.float32))
+    # a vector passed in as `out` is viewed as a matrix with one row
+    result = out.reshape(mat1.shape)
+    if work is None:
+        work = np.empty_like(result)
+    np.multiply(mat2, mat2_weight[:, np.newaxis], out=work.reshape(mat1.shape))
+    np.multiply(mat1, mat1_weight[:, np.newaxis], out=result)
+    result += work.reshape(mat1.shape)
+    if opposite_rows.size > 0:
+        result[opposite_rows] = rotated_opposite
+    return out
+
+
+def _rotate_orthogonally(rows, angles):
+    """Rotates each row by the corresponding angle towards a unit vector
+    orthogonal to it: the standard basis vector along which the row has its
+    smallest component, minus its projection on the row."""
+    rows = np.asarray(rows, dtype=float)
+    lengths = np.linalg.norm(rows, axis=1)[:, np.newaxis]
+    units = rows / lengths
+    basis = (np.arange(len(rows)), np.abs(units).argmin(axis=1))
+    orthogonal = -units * units[basis][:, np.newaxis]
+    orthogonal[basis] += 1.0
+    orthogonal /= np.linalg.norm(orthogonal, axis=1)[:, np.newaxis]
+    angles = angles[:, np.newaxis]
+    return lengths * (np.cos(angles) * units + np.sin(angles) * orthogonal)
@@ -10,3 +10,4 @@ from .measurement import (
     InteractionMeasurement,
     AverageFeatureScoreRange,
 )
+from .pipeline import MeasurementPipeline, SystemSnapshot
@@ -3,8 +3,7 @@ Set of various measurements that can be used to track outcomes of interest
 throughout a simulation
 """
 from abc import ABC, abstractmethod
-import networkx as nx
-from networkx import wiener_index
+from typing import Optional, Tuple
 import numpy as np
 from trecs.logging import VerboseMode
 from trecs.components import (
@@ -30,12 +29,28 @@ class Measurement(BaseObservable, VerboseMode, ABC):
     -----------
 
         measurement_history: list
-            List of measurements. A new element is added at each timestep.
+            List of measurements. A new element is added at each timestep
+            recorded (see :func:`~components.base_components.BaseObservable.set_schedule`).
+
+        recorded_steps: list
+            Timesteps at which the measurements in
+            :attr:`measurement_history` were taken.
 
         name: str
             Name of the measurement quantity.
+
+        snapshot_attributes: tuple or None
+            Attributes of the model that :func:`measure` reads (as dotted
+            paths, e.g., `"users.actual_user_scores"`). When measurements are
+            computed in the background (see the `async_measurements`
+            parameter of :class:`~models.recommender.BaseRecommender`), only
+            these attributes are copied for the measurement. If None (the
+            default for custom measurements), the measurement is always
+            computed synchronously.
     """
 
+    snapshot_attributes: Optional[Tuple[str, ...]] = None
+
     def __init__(self, name, verbose=False, init_value=None):
         self.name = name
         VerboseMode.__init__(self, __name__.upper(), verbose)
@@ -43,6 +58,8 @@ class Measurement(BaseObservable, VerboseMode, ABC):
         if isinstance(init_value, np.ndarray):
             init_value = np.copy(init_value)
         self.measurement_history.append(init_value)
+        # timesteps of the measurements in the history
+        self.recorded_steps = [0]
 
     def get_measurement(self):
         """
@@ -78,6 +95,22 @@ class Measurement(BaseObservable, VerboseMode, ABC):
             to_append = observation
         self.measurement_history.append(to_append)
 
+    def set_history(self, history):
+        """
+        Replaces the list where the measurements are stored with another
+        list-like object, such as a :class:`~components.history.DiskHistory`.
+        The measurements recorded so far are moved to the new history.
+
+        Parameters
+        -----------
+
+            history: :obj:`collections.abc.MutableSequence`
+                Empty list-like object where the measurements are stored from
+                now on.
+        """
+        history.extend(self.measurement_history)
+        self.measurement_history = history
+
     @abstractmethod
     def measure(self, recommender, **kwargs):
         """Function that should calculate some outcome of interest of the system
@@ -158,6 +191,8 @@ class InteractionMeasurement(Measurement):
             Name of the measurement component.
     """
 
+    snapshot_attributes = ("num_users", "num_items")
+
     def __init__(self, name="interaction_histogram", verbose=False):
         Measurement.__init__(self, name, verbose, init_value=None)
 
@@ -237,6 +272,8 @@ class JaccardSimilarity(Measurement):
             Name of the measurement component.
     """
 
+    snapshot_attributes = ()
+
     def __init__(self, pairs, name="jaccard_similarity", verbose=False):
         self.pairs = pairs
         Measurement.__init__(self, name, verbose, init_value=None)
@@ -358,6 +395,8 @@ class MSEMeasurement(Measurement):
             Name of the measurement component.
     """
 
+    snapshot_attributes = ("predicted_scores", "users.actual_user_scores")
+
     def __init__(self, verbose=False):
         Measurement.__init__(self, "mse", verbose=verbose, init_value=None)
 
@@ -423,9 +462,20 @@ class DiffusionTreeMeasurement(Measurement):
 
         _old_infection_state: array_like
             Infection state at the previous timestep.
+
+    If the measurement is not recorded at every timestep (see
+    :func:`~components.base_components.BaseObservable.set_schedule`), the
+    users infected between two recorded timesteps are added to the tree at
+    the next recorded timestep.
     """
 
+    snapshot_attributes = ("users_hat", "infection_state")
+
     def __init__(self, infection_state, verbose=False):
+        # networkx is slow to import, so it is only loaded by the
+        # measurements that use it
+        import networkx as nx  # pylint: disable=import-outside-toplevel
+
         self._old_infection_state = None
         self.diffusion_tree = nx.Graph()
         self._manage_new_infections(None, np.copy(infection_state))
@@ -499,6 +549,8 @@ class DiffusionTreeMeasurement(Measurement):
         """
         Plots the tree using the Networkx library API.
         """
+        import networkx as nx  # pylint: disable=import-outside-toplevel
+
         nx.draw(self.diffusion_tree, with_labels=True)
 
 
@@ -530,6 +582,8 @@ class StructuralVirality(DiffusionTreeMeasurement):
         --------
             Structural virality: float
         """
+        from networkx import wiener_index  # pylint: disable=import-outside-toplevel
+
         num_nodes = self.diffusion_tree.number_of_nodes()
         return wiener_index(self.diffusion_tree) / (num_nodes * (num_nodes - 1))
 
@@ -562,6 +616,8 @@ class AverageFeatureScoreRange(Measurement):
             Name of the measurement component.
     """
 
+    snapshot_attributes = ("num_users", "items_hat")
+
     def __init__(self, name="afsr", verbose=False):
         Measurement.__init__(self, name, verbose, init_value=None)
 
@@ -0,0 +1,155 @@
+"""
+Pipeline that computes measurements in a background thread, on snapshots of
+the state of the system, while the simulation moves on to the next timestep
+"""
+import queue
+import threading
+import numpy as np
+import scipy.sparse as sp
+
+
+class SystemSnapshot:  # pylint: disable=too-few-public-methods
+    """
+    Immutable copy of some attributes of a model (e.g., the predicted scores),
+    which measurements can read in place of the model itself.
+
+    Parameters
+    -----------
+
+        model: :class:`~models.recommender.BaseRecommender`
+            Model whose attributes are copied.
+
+        attributes: iterable of str
+            Attributes to copy. Attributes of attributes are given as dotted
+            paths (e.g., `"users.actual_user_scores"`).
+
+        cache: dict or None (optional, default: None)
+            Copies already made at the same timestep, indexed by path. Arrays
+            needed by several measurements are only copied once.
+    """
+
+    def __init__(self, model, attributes, cache=None):
+        cache = dict() if cache is None else cache
+        for path in attributes:
+            if path not in cache:
+                value = model
+                for attribute in path.split("."):
+                    value = getattr(value, attribute)
+                cache[path] = _freeze(value)
+            target = self
+            *parents, attribute = path.split(".")
+            for parent in parents:
+                if parent not in vars(target):
+                    setattr(target, parent, _Namespace())
+                target = getattr(target, parent)
+            setattr(target, attribute, cache[path])
+
+
+class _Namespace:  # pylint: disable=too-few-public-methods
+    """ Holds the attributes of nested objects in a snapshot """
+
+
+def _freeze(value):
+    """ Returns a read-only copy of arrays; other values are returned as they are """
+    if sp.issparse(value):
+        return value.copy()
+    if isinstance(value, np.ndarray):
+        value = np.array(value)
+        value.flags.writeable = False
+    return value
+
+
+class MeasurementPipeline:
+    """
+    Runs :func:`~metrics.measurement.Measurement.measure` in a background
+    thread. Measurements are computed one at a time, in the order in which
+    they were submitted, so measurements that depend on their previous values
+    (e.g., :class:`~metrics.measurement.DiffusionTreeMeasurement`) see the
+    same sequence of states as in synchronous mode. Most NumPy operations
+    release the GIL, so measurements run in parallel with the simulation.
+
+    At most `max_pending` measurements wait in the queue: beyond that,
+    :func:`submit` blocks until the worker catches up, which bounds the memory
+    used by the snapshots. The worker thread is started when needed and stops
+    after it has been idle for `idle_timeout` seconds.
+
+    Parameters
+    -----------
+
+        max_pending: int (optional, default: 8)
+            Maximum number of measurements waiting to be computed.
+
+        idle_timeout: float (optional, default: 1.0)
+            Seconds after which an idle worker thread stops.
+    """
+
+    def __init__(self, max_pending=8, idle_timeout=1.0):
+        if max_pending < 1:
+            raise ValueError("max_pending must be a positive integer")
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._error = None
+
+    def submit(self, metric, snapshot, **kwargs):
+        """
+        Schedules `metric.measure(snapshot, **kwargs)`.
+
+        Parameters
+        -----------
+
+            metric: :class:`~metrics.measurement.Measurement`
+                Measurement to compute.
+
+            snapshot: :class:`SystemSnapshot`
+                State of the system that the measurement reads.
+
+            kwargs:
+                Keyword arguments of the measurement (e.g., `interactions`).
+                Arrays are copied.
+        """
+        kwargs = {key: _freeze(value) for key, value in kwargs.items()}
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, daemon=True)
+                self._thread.start()
+            # blocks while the queue is full; the worker does not need the
+            # lock to take the next measurement
+            self._queue.put((metric, snapshot, kwargs))
+
+    def _work(self):
+        """ Computes the measurements in the queue """
+        while True:
+            try:
+                metric, snapshot, kwargs = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            try:
+                if self._error is None:
+                    metric.measure(snapshot, **kwargs)
+            except Exception as error:  # pylint: disable=broad-except
+                # raised in the main thread by flush()
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Waits until all the measurements submitted have been computed.
+
+        Raises
+        --------
+
+            Exception
+                The first exception raised by a measurement, if any. The
+                measurements submitted after it are skipped.
+        """
+        self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -5,3 +5,5 @@ from .content import ContentFiltering
 from .mf import ImplicitMF
 from .social import SocialFiltering
 from .popularity import PopularityRecommender
+from .ensemble import Ensemble
+from .batched import BatchedContentFiltering
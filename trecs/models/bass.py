@@ -2,7 +2,6 @@
 Bass Model for modeling the spread of infection. This can be applied to studying
 virality in online communications.
 """
-import networkx as nx
 import numpy as np
 from trecs.components import BinarySocialGraph
 from trecs.components import Component
@@ -171,6 +170,8 @@ class BassModel(BaseRecommender, BinarySocialGraph):
         if actual_item_representation is None:
             actual_item_representation = np.copy(item_representation)
         if user_representation is None:
+            import networkx as nx  # pylint: disable=import-outside-toplevel
+
             user_representation = SocialGraphGenerator.generate_random_graph(
                 num=num_users, p=0.3, seed=seed, graph_type=nx.fast_gnp_random_graph
             )
@@ -313,12 +314,14 @@ class BassModel(BaseRecommender, BinarySocialGraph):
 
     def draw_diffusion_tree(self):
         """ Draw diffusion tree using matplotlib """
+        self.flush_measurements()
         for metric in self.metrics:
             if hasattr(metric, "draw_tree"):
                 metric.draw_tree()
 
     def get_structural_virality(self):
         """ Return the value of the structural virality metric """
+        self.flush_measurements()
         for metric in self.metrics:
             if hasattr(metric, "get_structural_virality"):
                 return metric.get_structural_virality()
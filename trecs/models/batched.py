@@ -0,0 +1,353 @@
+"""
+Batched simulation of many independent replicates of a content filtering
+model, held in stacked arrays so that each step of the simulation runs as a
+few NumPy calls regardless of the number of replicates
+"""
+import numpy as np
+from tqdm import tqdm
+from trecs.matrix_ops import inner_product, sample_without_replacement, top_k_indices
+from trecs.metrics import MSEMeasurement, InteractionMeasurement
+from trecs.random import Generator
+from .content import ContentFiltering
+
+
+class BatchedContentFiltering:
+    """
+    Simulates :math:`R` independent replicates of a
+    :class:`~models.content.ContentFiltering` model at once.
+
+    The state of the replicates is stacked along a leading dimension: the
+    users' representations are stored in an :math:`R\\times|U|\\times|A|`
+    array, the items' representations in an :math:`R\\times|A|\\times|I|`
+    array, and the predicted and actual user scores in
+    :math:`R\\times|U|\\times|I|` arrays. Training, recommendations, user
+    feedback and measurements then run as one batched NumPy call per step,
+    so that, for small and medium populations, simulating :math:`R`
+    trajectories costs about as much Python overhead as simulating one.
+
+    The replicates are initialized from :math:`R` models with the same number
+    of users, items and attributes (e.g., created with different seeds). When
+    no random items are shown, each replicate follows exactly the same
+    trajectory as its model would if it were run on its own.
+
+    Only the features of :class:`~models.content.ContentFiltering` that
+    vectorize across replicates are supported: the default score function,
+    top-`k` recommendations, static user profiles (without drift) and the
+    default user behavior, including attention. Creators and recording
+    schedules are not supported.
+    :class:`~metrics.measurement.MSEMeasurement` and
+    :class:`~metrics.measurement.InteractionMeasurement` are computed for all
+    replicates at once; other measurements are not supported.
+
+    Parameters
+    -----------
+
+        models: list
+            List of :class:`~models.content.ContentFiltering` models, one per
+            replicate.
+
+        seed: int, None (optional, default: None)
+            Seed for the random generator used to pick random items in
+            startup mode.
+
+    Attributes
+    -----------
+
+        num_replicates: int
+            The number of replicates :math:`R`.
+
+        users_hat: :obj:`numpy.ndarray`
+            An :math:`R\\times|U|\\times|A|` array with the users'
+            representations of each replicate.
+
+        items_hat: :obj:`numpy.ndarray`
+            An :math:`R\\times|A|\\times|I|` array with the items'
+            representations of each replicate.
+
+        predicted_scores: :obj:`numpy.ndarray`
+            An :math:`R\\times|U|\\times|I|` array with the predicted scores of
+            each replicate.
+
+        actual_user_scores: :obj:`numpy.ndarray`
+            An :math:`R\\times|U|\\times|I|` array with the actual user scores
+            of each replicate.
+
+        consumed: :obj:`numpy.ndarray`
+            An :math:`R\\times|U|\\times|I|` boolean array where element
+            `[r, u, i]` is True if user `u` has interacted with item `i` in
+            replicate `r`.
+
+    Raises
+    --------
+
+        ValueError
+            If the models are not compatible with each other or use features
+            that are not supported in batched mode.
+
+    Examples
+    ----------
+
+        >>> models = [ContentFiltering(num_users=50, seed=seed) for seed in range(100)]
+        >>> batch = BatchedContentFiltering(models)
+        >>> batch.startup_and_train(timesteps=10)
+        >>> batch.run(timesteps=20)
+        >>> len(batch.get_measurements()["mse"])
+        100
+    """
+
+    def __init__(self, models, seed=None):
+        models = list(models)
+        self._check_models(models)
+        self.num_replicates = len(models)
+        first = models[0]
+        self.num_users = first.num_users
+        self.num_items = first.num_items
+        self.num_items_per_iter = first.num_items_per_iter
+        self.attention_exp = first.users.attention_exp
+        self.users_hat = np.stack([np.asarray(model.users_hat) for model in models])
+        self.items_hat = np.stack([np.asarray(model.items_hat) for model in models])
+        self.predicted_scores = np.stack([np.asarray(model.predicted_scores) for model in models])
+        self.actual_user_scores = np.stack(
+            [np.asarray(model.users.get_actual_user_scores()) for model in models]
+        )
+        self.consumed = np.stack([model.consumed_items.to_mask() for model in models])
+        self.random_state = Generator(seed)
+        # per-replicate histories of the measurements, starting from the
+        # measurements already recorded by the models
+        for model in models:
+            model.flush_measurements()
+        self.measurement_history = dict()
+        for metric in first.metrics:
+            self.measurement_history[metric.name] = [
+                list(model_metric.measurement_history)
+                for model in models
+                for model_metric in model.metrics
+                if model_metric.name == metric.name
+            ]
+
+    @staticmethod
+    def _check_models(models):
+        """ Checks that the models can be simulated as a batch """
+        if len(models) < 1:
+            raise ValueError("At least one model is needed")
+        first = models[0]
+        shape = (first.users_hat.shape, first.items_hat.shape)
+        for model in models:
+            if not isinstance(model, ContentFiltering):
+                raise ValueError("Only ContentFiltering models can be batched")
+            if (model.users_hat.shape, model.items_hat.shape) != shape:
+                raise ValueError(
+                    "All models must have the same number of users, items and attributes"
+                )
+            if model.num_items_per_iter != first.num_items_per_iter:
+                raise ValueError("All models must have the same num_items_per_iter")
+            if model.users.attention_exp != first.users.attention_exp:
+                raise ValueError("All models must have the same attention_exp")
+            if model.creators is not None:
+                raise ValueError("Creators are not supported in batched mode")
+            if model.probabilistic_recommendations:
+                raise ValueError("Probabilistic recommendations are not supported in batched mode")
+            if model.score_fn is not inner_product or model.users.score_fn is not inner_product:
+                raise ValueError("Only the default score function is supported in batched mode")
+            if model.users.drift > 0 or model.users.interact_with_items is not None:
+                raise ValueError("Only static users with default behavior can be batched")
+            BatchedContentFiltering._check_measurements(model)
+
+    @staticmethod
+    def _check_measurements(model):
+        """ Checks that the measurements of a model can be computed as a batch """
+        for metric in model.metrics:
+            if type(metric) not in (MSEMeasurement, InteractionMeasurement):
+                raise ValueError(f"Measurement {metric.name} is not supported in batched mode")
+        # every replicate records every timestep
+        schedules = [model.recording_schedule] + [metric.schedule for metric in model.metrics]
+        if any(schedule is not None for schedule in schedules):
+            raise ValueError("Recording schedules are not supported in batched mode")
+
+    def train(self):
+        """
+        Updates the predicted scores of all replicates with the (normalized)
+        inner product of user and item representations.
+        """
+        norms = np.linalg.norm(self.users_hat, axis=2, keepdims=True)
+        # normalized with the type of the predicted scores (see the `dtype`
+        # parameter of the models)
+        users = np.zeros(self.users_hat.shape, dtype=self.predicted_scores.dtype)
+        np.divide(self.users_hat, norms, out=users, where=norms != 0)
+        np.matmul(users, self.items_hat, out=self.predicted_scores)
+
+    def generate_recommendations(self, k=1, mask=None):
+        """
+        Returns the top-`k` items of each user in each replicate.
+
+        Parameters
+        -----------
+
+            k : int (optional, default: 1)
+                Number of items to recommend.
+
+            mask : :obj:`numpy.ndarray` or None (optional, default: None)
+                An :math:`R\\times|U|\\times|I|` boolean array where element
+                `[r, u, i]` is True if item `i` must not be recommended to user
+                `u` in replicate `r`.
+
+        Returns
+        ---------
+            Recommendations: :obj:`numpy.ndarray`
+                An :math:`R\\times|U|\\times k` array of item indices.
+        """
+        self._check_items_left(k, mask)
+        scores = self.predicted_scores.reshape((-1, self.num_items))
+        if mask is not None:
+            mask = mask.reshape((-1, self.num_items))
+        rec = top_k_indices(scores, k, mask=mask)
+        return rec.reshape((self.num_replicates, self.num_users, k))
+
+    def _check_items_left(self, k, mask):
+        """ Checks that every user has at least `k` items left to be shown """
+        if mask is not None and k > self.num_items - mask.sum(axis=2).max():
+            raise ValueError(
+                f"There are not enough items left to recommend {k} items to each user."
+            )
+
+    def recommend(self, startup=False, repeated_items=True):
+        """
+        Returns the items shown to each user in each replicate: the top items
+        according to the predicted scores, or random items in startup mode.
+        The random items shown to a user are distinct and, if repeated items
+        are not allowed, are sampled among the items that the user has not
+        interacted with.
+
+        Returns
+        --------
+            Items: :obj:`numpy.ndarray`
+                An :math:`R\\times|U|\\times\\text{num_items_per_iter}` array
+                of item indices.
+        """
+        mask = None if repeated_items else self.consumed
+        size = (self.num_replicates, self.num_users, self.num_items_per_iter)
+        if not startup:
+            return self.generate_recommendations(k=self.num_items_per_iter, mask=mask)
+        if mask is not None:
+            self._check_items_left(self.num_items_per_iter, mask)
+            mask = mask.reshape((-1, mask.shape[2]))
+        # the users of all replicates are sampled at once, as in BaseRecommender
+        items = sample_without_replacement(
+            self.num_replicates * self.num_users,
+            self.num_items,
+            self.num_items_per_iter,
+            self.random_state,
+            mask=mask,
+        )
+        return items.reshape(size)
+
+    def get_user_feedback(self, items_shown):
+        """
+        Returns the item each user interacts with in each replicate: the item
+        among `items_shown` with the highest actual score (weighted by the
+        attention coefficient of its position, if any), or the one shown last
+        among tied items.
+
+        Returns
+        --------
+            Interactions: :obj:`numpy.ndarray`
+                An :math:`R\\times|U|` array of item indices.
+        """
+        scores = np.take_along_axis(self.actual_user_scores, items_shown, axis=2)
+        if self.attention_exp != 0:
+            idxs = np.arange(items_shown.shape[2]) + 1
+            scores = scores * np.power(idxs, self.attention_exp)
+        # as in Users, ties are broken in favor of the item shown last
+        num_shown = items_shown.shape[2]
+        choices = num_shown - 1 - scores[:, :, ::-1].argmax(axis=2)[:, :, np.newaxis]
+        return np.take_along_axis(items_shown, choices, axis=2)[:, :, 0]
+
+    def _update_internal_state(self, interactions):
+        """
+        Each user's representation gains the attributes of the item they
+        interacted with, in every replicate.
+        """
+        # R x A x U attributes of the items chosen by each user
+        attributes = np.take_along_axis(self.items_hat, interactions[:, np.newaxis, :], axis=2)
+        self.users_hat += attributes.transpose((0, 2, 1))
+
+    def measure_content(self, interactions):
+        """
+        Records the measurements of all replicates at the current timestep.
+        """
+        if "mse" in self.measurement_history:
+            mse = ((self.predicted_scores - self.actual_user_scores) ** 2).mean(axis=(1, 2))
+            for history, value in zip(self.measurement_history["mse"], mse):
+                history.append(value)
+        if "interaction_histogram" in self.measurement_history:
+            # offset the item indices of each replicate to count them at once
+            offsets = self.num_items * np.arange(self.num_replicates)[:, np.newaxis]
+            histograms = np.bincount(
+                (interactions + offsets).ravel(), minlength=self.num_replicates * self.num_items
+            ).reshape((self.num_replicates, self.num_items))
+            for history, histogram in zip(
+                self.measurement_history["interaction_histogram"], histograms.astype(float)
+            ):
+                history.append(histogram)
+
+    def run(self, timesteps=50, startup=False, train_between_steps=True, repeated_items=True):
+        """
+        Runs the simulation of all replicates for the given timesteps. See
+        :func:`~models.recommender.BaseRecommender.run`.
+
+        Parameters
+        -----------
+
+            timestep : int (optional, default: 50)
+                Number of timesteps for simulation.
+
+            startup : bool (optional, default: False)
+                If True, users are shown random items.
+
+            train_between_steps : bool (optional, default: True)
+                If True, the models are retrained after each timestep.
+
+            repeated_items : bool (optional, default: True)
+                If True, users can interact with the same item more than once.
+        """
+        replicates, users = np.indices((self.num_replicates, self.num_users))
+        for _ in tqdm(range(timesteps)):
+            items_shown = self.recommend(startup=startup, repeated_items=repeated_items)
+            interactions = self.get_user_feedback(items_shown)
+            if not repeated_items:
+                self.consumed[replicates, users, interactions] = True
+            self._update_internal_state(interactions)
+            if train_between_steps:
+                self.train()
+            self.measure_content(interactions)
+
+    def startup_and_train(self, timesteps=50):
+        """
+        Runs the simulation in startup mode and then trains the models. See
+        :func:`~models.recommender.BaseRecommender.startup_and_train`.
+
+        Parameters
+        -----------
+
+            timesteps : int (optional, default: 50)
+                Number of timesteps for simulation
+        """
+        self.run(timesteps, startup=True, train_between_steps=False)
+        self.train()
+
+    def get_measurements(self):
+        """
+        Returns the measurements of all replicates.
+
+        Returns
+        --------
+            Measurements: dict
+                For each measurement (and for `"timesteps"`), a list with the
+                history of each replicate, in the same order as the models.
+        """
+        if len(self.measurement_history) < 1:
+            raise ValueError("No measurement module defined")
+        measurements = dict(self.measurement_history)
+        num_timesteps = len(next(iter(self.measurement_history.values()))[0])
+        measurements["timesteps"] = [np.arange(num_timesteps)] * self.num_replicates
+        return measurements
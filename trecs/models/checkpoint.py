@@ -0,0 +1,178 @@
+"""
+Saving and restoring the state of a simulation, so that it can be resumed later
+"""
+import os
+import pickle
+import numpy as np
+import scipy.sparse as sp
+from trecs.components import BaseComponent
+
+# pylint: disable=protected-access
+
+# name of the file where save_checkpoint stores everything but the arrays
+CHECKPOINT_STATE_FILE = "state.pkl"
+
+
+def checkpoint_arrays(model):
+    """
+    Returns the arrays that make up the state of the simulation run by
+    `model`, as a dictionary that maps the name of each array to the object
+    that holds it and the name of the attribute.
+    """
+    arrays = {
+        "users_hat": (model, "users_hat"),
+        "items_hat": (model, "items_hat"),
+        "items": (model, "items"),
+        "predicted_scores": (model, "predicted_scores"),
+        "actual_user_profiles": (model.users, "actual_user_profiles"),
+        "actual_user_scores": (model.users, "actual_user_scores"),
+        "consumed_items": (model.consumed_items, "bits"),
+        "num_consumed": (model.consumed_items, "num_consumed"),
+    }
+    if model.creators is not None:
+        arrays["actual_creator_profiles"] = (model.creators, "actual_creator_profiles")
+    # model-specific components monitored as part of the system state
+    # (e.g., the infection state of the Bass model)
+    saved = {id(getattr(owner, attribute)) for owner, attribute in arrays.values()}
+    monitored = {id(component) for component in model._system_state}
+    for attribute, value in vars(model).items():
+        if id(value) in monitored and id(value) not in saved:
+            if isinstance(value, np.ndarray) or sp.issparse(value):
+                arrays[attribute] = (model, attribute)
+    return arrays
+
+
+def save_checkpoint(model, path):
+    """
+    Saves the state of the simulation run by `model` to the directory
+    `path`, so that it can be resumed later with :func:`load_checkpoint`.
+
+    Each array (the representations of users and items, the actual user
+    profiles and scores, the predicted scores and the record of consumed
+    items) is saved as a `.npy` file (or as a `.npz` file, if sparse). The
+    state of the random generators, the measurement histories and the
+    state histories of the system state components are saved in the file
+    `state.pkl`.
+
+    Parameters
+    -----------
+
+        model: :class:`~models.recommender.BaseRecommender`
+            Model whose state is saved.
+
+        path: str
+            Directory where the checkpoint is saved. It is created if it
+            does not exist, and existing checkpoint files are overwritten.
+    """
+    os.makedirs(path, exist_ok=True)
+    model.flush_measurements()
+    state_histories, recorded_steps = dict(), dict()
+    for name, (owner, attribute) in checkpoint_arrays(model).items():
+        array = getattr(owner, attribute)
+        if sp.issparse(array):
+            sp.save_npz(os.path.join(path, f"{name}.npz"), sp.csr_matrix(array))
+        else:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(array))
+        if hasattr(array, "state_history"):
+            state_histories[name] = array.state_history
+            recorded_steps[name] = getattr(array, "recorded_steps", None)
+    state_histories["users"] = model.users.state_history
+    recorded_steps["users"] = model.users.recorded_steps
+    if model.creators is not None:
+        state_histories["creators"] = model.creators.state_history
+        recorded_steps["creators"] = model.creators.recorded_steps
+    state = {
+        "num_users": model.num_users,
+        "num_items": model.num_items,
+        "num_consumed_items": model.consumed_items.num_items,
+        "stale": (model._stale_users, model._stale_items),
+        "random_state": model.random_state.bit_generator.state,
+        "users_random_state": model.users.rng.bit_generator.state,
+        "numpy_random_state": np.random.get_state(),
+        # loggers hold file handles and are not saved
+        "metrics": [
+            {key: value for key, value in vars(metric).items() if key != "_logger"}
+            for metric in model.metrics
+        ],
+        "state_histories": state_histories,
+        "recorded_steps": recorded_steps,
+        "timestep": model.timestep,
+    }
+    with open(os.path.join(path, CHECKPOINT_STATE_FILE), "wb") as state_file:
+        pickle.dump(state, state_file)
+    if model.is_verbose():
+        model.log(f"Saved checkpoint to {path}")
+
+
+def load_checkpoint(model, path, mmap_mode="c"):
+    """
+    Restores into `model` the state of the simulation saved with
+    :func:`save_checkpoint`. The model must have been initialized with the
+    same parameters (e.g., number of users, score function and
+    measurements) as the model that was saved. After loading,
+    :func:`~models.recommender.BaseRecommender.run` continues the simulation
+    from where it was saved.
+
+    Dense arrays are memory-mapped, so loading is almost instantaneous and
+    each matrix is only read from disk when (and as far as) it is used.
+
+    Parameters
+    -----------
+
+        model: :class:`~models.recommender.BaseRecommender`
+            Model into which the state is loaded.
+
+        path: str
+            Directory where the checkpoint was saved.
+
+        mmap_mode: str or None (optional, default: "c")
+            Memory-mapping mode passed to :func:`numpy.load`. With the
+            default copy-on-write mode, the simulation can modify the
+            arrays without modifying the checkpoint. If None, the arrays
+            are read into memory.
+    """
+    with open(os.path.join(path, CHECKPOINT_STATE_FILE), "rb") as state_file:
+        state = pickle.load(state_file)
+    if len(state["metrics"]) != len(model.metrics):
+        raise ValueError("The checkpoint was saved by a model with different measurements")
+    model.flush_measurements()
+    state_histories = state["state_histories"]
+    replacements = dict()
+    for name, (owner, attribute) in checkpoint_arrays(model).items():
+        current = getattr(owner, attribute)
+        if os.path.exists(os.path.join(path, f"{name}.npz")):
+            array = sp.load_npz(os.path.join(path, f"{name}.npz"))
+        else:
+            array = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        if isinstance(current, BaseComponent):
+            # keep the type of the component, without copying the array
+            array = type(current)(array) if sp.issparse(array) else array.view(type(current))
+            for key, value in vars(current).items():
+                vars(array).setdefault(key, value)
+            if hasattr(array, "invalidate_norms"):
+                # the cached norms are those of the previous array
+                array.invalidate_norms()
+            if name in state_histories:
+                array.state_history = state_histories[name]
+            if state["recorded_steps"].get(name) is not None:
+                array.recorded_steps = state["recorded_steps"][name]
+        setattr(owner, attribute, array)
+        replacements[id(current)] = array
+    model._system_state = [replacements.get(id(c), c) for c in model._system_state]
+    model.users.state_history = state_histories["users"]
+    model.users.recorded_steps = state["recorded_steps"]["users"]
+    if model.creators is not None:
+        model.creators.state_history = state_histories["creators"]
+        model.creators.recorded_steps = state["recorded_steps"]["creators"]
+    model.timestep = state["timestep"]
+    for metric, metric_state in zip(model.metrics, state["metrics"]):
+        vars(metric).update(metric_state)
+    model.num_users = state["num_users"]
+    model.num_items = state["num_items"]
+    model.consumed_items.num_items = state["num_consumed_items"]
+    model._stale_users, model._stale_items = state["stale"]
+    model.random_state.bit_generator.state = state["random_state"]
+    model.users.rng.bit_generator.state = state["users_random_state"]
+    np.random.set_state(state["numpy_random_state"])
+    if model.is_verbose():
+        model.log(f"Loaded checkpoint from {path}")
@@ -1,6 +1,8 @@
 """ Content filtering class """
 import numpy as np
+import scipy.sparse as sp
 from trecs.metrics import MSEMeasurement
+from trecs.components import append_columns
 from trecs.random import Generator
 from trecs.utils import (
     non_none_values,
@@ -159,7 +161,9 @@ class ContentFiltering(BaseRecommender):
         # if the actual item representation is not specified, we assume
         # that the recommender system's beliefs about the item attributes
         # are the same as the "true" item attributes
-        if actual_item_representation is None:
+        if actual_item_representation is None and sp.issparse(item_representation):
+            actual_item_representation = item_representation.toarray()
+        elif actual_item_representation is None:
             actual_item_representation = np.copy(item_representation)
 
         measurements = [MSEMeasurement()]
@@ -199,9 +203,10 @@ class ContentFiltering(BaseRecommender):
                 the item that the user has interacted with.
 
         """
-        interactions_per_user = np.zeros((self.num_users, self.num_items))
-        interactions_per_user[self.users.user_vector, interactions] = 1
-        user_attributes = np.dot(interactions_per_user, self.items_hat.T)
+        # each user's profile gains the attributes of the item they interacted with
+        user_attributes = self.items_hat[:, interactions].T
+        if sp.issparse(user_attributes):
+            user_attributes = user_attributes.toarray()
         self.users_hat += user_attributes
 
     def process_new_items(self, new_items):
@@ -216,4 +221,7 @@ class ContentFiltering(BaseRecommender):
                 An array of items that represents new items that are being
                 added into the system. Should be :math:`|A|\\times|I|`
         """
-        self.items_hat = np.hstack([self.items_hat, new_items])
+        if sp.issparse(self.items_hat):
+            self.items_hat = sp.hstack([self.items_hat, new_items], format="csr")
+        else:
+            self.items_hat = append_columns(self.items_hat, new_items)
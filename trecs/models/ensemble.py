@@ -0,0 +1,258 @@
+"""
+Ensemble runner that simulates many replicates of the same model
+configuration, with different seeds, in parallel processes
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+# environment variables that control the number of threads used by the
+# most common BLAS implementations
+BLAS_THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def _limit_blas_threads(blas_threads):
+    """Limits the number of threads used by the BLAS libraries that are already
+    loaded in the current process, if threadpoolctl is installed. Otherwise,
+    only the environment variables inherited by the worker apply.
+    """
+    try:
+        from threadpoolctl import threadpool_limits  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return
+    threadpool_limits(limits=blas_threads, user_api="blas")
+
+
+def _run_replicate(model_factory, seed, startup_timesteps, timesteps, run_kwargs):
+    """
+    Creates the model of one replicate and runs the simulation. This is
+    executed in the worker processes.
+
+    Returns
+    --------
+        Measurements and system state (or None, if the model does not monitor
+        any system state component) of the replicate.
+    """
+    model = model_factory(seed=seed)
+    if startup_timesteps > 0:
+        model.startup_and_train(timesteps=startup_timesteps)
+    model.run(timesteps=timesteps, **run_kwargs)
+    try:
+        system_state = model.get_system_state()
+    except ValueError:
+        system_state = None
+    return model.get_measurements(), system_state
+
+
+class Ensemble:
+    """
+    Runs replicates of the same simulation with different seeds, in a pool of
+    worker processes.
+
+    Each replicate creates its model by calling `model_factory(seed=seed)`,
+    runs :func:`~models.recommender.BaseRecommender.startup_and_train` for
+    `startup_timesteps` timesteps (if any) and then
+    :func:`~models.recommender.BaseRecommender.run` for `timesteps`
+    timesteps. Models draw their random numbers from their own generator,
+    created from the seed, so the results of each replicate only depend on
+    its seed, regardless of the process where it runs and of the number of
+    workers. The global :mod:`numpy.random` state is left alone: factories
+    that need more random numbers should draw them from their own generator
+    (e.g., `numpy.random.default_rng(seed)`).
+
+    Since the factory is sent to the worker processes, it must be picklable:
+    for example, a function defined at the top level of a module, or a
+    :func:`functools.partial` of a model class.
+
+    Parameters
+    -----------
+
+        model_factory: callable
+            Function that takes a keyword argument `seed` and returns the model
+            (a :class:`~models.recommender.BaseRecommender`) of a replicate.
+            Model classes themselves can be used as factories.
+
+        seeds: list
+            Seeds of the replicates, one per replicate.
+
+        timesteps: int (optional, default: 50)
+            Number of timesteps of :func:`run`.
+
+        startup_timesteps: int (optional, default: 0)
+            Number of timesteps of :func:`startup_and_train`. If 0, the startup
+            phase is skipped.
+
+        run_kwargs: dict or None (optional, default: None)
+            Additional arguments passed to :func:`run` (e.g.,
+            `repeated_items` or `random_items_per_iter`).
+
+        max_workers: int or None (optional, default: None)
+            Maximum number of worker processes. If None, one worker per CPU is
+            used (but no more than the number of replicates). If 1, the
+            replicates run sequentially in the current process.
+
+        blas_threads: int or None (optional, default: 1)
+            Number of threads that BLAS may use in each worker. Since workers
+            already run in parallel, multithreaded BLAS in every worker would
+            oversubscribe the CPUs. If None, the thread count is not changed.
+
+        mp_context: :obj:`multiprocessing.context.BaseContext` or None \
+                    (optional, default: None)
+            Context used to start the workers (see :mod:`multiprocessing`). If
+            None, workers are started with the `"spawn"` method: forking a
+            process in which BLAS or other libraries have started threads may
+            deadlock, and new processes also pick up the BLAS thread limits.
+
+    Attributes
+    -----------
+
+        seeds: list
+            Seeds of the replicates.
+
+        measurements: list
+            Measurements of each replicate (in the same order as the seeds),
+            as returned by
+            :func:`~models.recommender.BaseRecommender.get_measurements`.
+            Empty until :func:`run` is called.
+
+        system_states: list
+            System state of each replicate, as returned by
+            :func:`~models.recommender.BaseRecommender.get_system_state`, or
+            None for the replicates whose model does not monitor any system
+            state component.
+
+    Examples
+    ----------
+
+        >>> from functools import partial
+        >>> factory = partial(ContentFiltering, num_users=100, num_items=500)
+        >>> ensemble = Ensemble(factory, seeds=range(100), timesteps=20)
+        >>> ensemble.run()
+        >>> len(ensemble.get_measurements()["mse"])
+        100
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        model_factory,
+        seeds,
+        timesteps=50,
+        startup_timesteps=0,
+        run_kwargs=None,
+        max_workers=None,
+        blas_threads=1,
+        mp_context=None,
+    ):
+        if not callable(model_factory):
+            raise TypeError("model_factory must be callable")
+        self.model_factory = model_factory
+        self.seeds = list(seeds)
+        if len(self.seeds) < 1:
+            raise ValueError("seeds must contain at least one seed")
+        self.timesteps = timesteps
+        self.startup_timesteps = startup_timesteps
+        self.run_kwargs = dict() if run_kwargs is None else dict(run_kwargs)
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer")
+        self.max_workers = min(max_workers, len(self.seeds))
+        self.blas_threads = blas_threads
+        if mp_context is None:
+            mp_context = multiprocessing.get_context("spawn")
+        self.mp_context = mp_context
+        self.measurements = list()
+        self.system_states = list()
+
+    def run(self):
+        """
+        Runs all the replicates. Results are stored in the same order as
+        :attr:`seeds`.
+        """
+        num_replicates = len(self.seeds)
+        args = (
+            [self.model_factory] * num_replicates,
+            self.seeds,
+            [self.startup_timesteps] * num_replicates,
+            [self.timesteps] * num_replicates,
+            [self.run_kwargs] * num_replicates,
+        )
+        if self.max_workers == 1:
+            results = list(map(_run_replicate, *args))
+        else:
+            results = self._run_pool(args)
+        self.measurements = [measurements for measurements, _ in results]
+        self.system_states = [system_state for _, system_state in results]
+
+    def _run_pool(self, args):
+        """ Runs the replicates in a pool of worker processes """
+        initializer, initargs = None, ()
+        saved_variables = {variable: os.environ.get(variable) for variable in BLAS_THREAD_VARIABLES}
+        if self.blas_threads is not None:
+            initializer, initargs = _limit_blas_threads, (self.blas_threads,)
+            # new workers inherit the environment of this process
+            for variable in BLAS_THREAD_VARIABLES:
+                os.environ[variable] = str(self.blas_threads)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self.mp_context,
+                initializer=initializer,
+                initargs=initargs,
+            ) as executor:
+                # map returns the results in the order of the seeds
+                return list(executor.map(_run_replicate, *args))
+        finally:
+            for variable, value in saved_variables.items():
+                if value is None:
+                    os.environ.pop(variable, None)
+                else:
+                    os.environ[variable] = value
+
+    @staticmethod
+    def _merge(results):
+        """ Merges a list of dictionaries into a dictionary of lists """
+        merged = dict()
+        for result in results:
+            for key, value in result.items():
+                merged.setdefault(key, list()).append(value)
+        return merged
+
+    def get_measurements(self):
+        """
+        Returns the measurements of all replicates.
+
+        Returns
+        --------
+            Measurements: dict
+                For each measurement (and for `"timesteps"`), a list with the
+                value returned by each replicate, in the same order as
+                :attr:`seeds`.
+        """
+        if len(self.measurements) < 1:
+            raise ValueError("The ensemble has not been run yet")
+        return self._merge(self.measurements)
+
+    def get_system_state(self):
+        """
+        Returns the system state of all replicates.
+
+        Returns
+        --------
+            System state: dict
+                For each system state component (and for `"timesteps"`), a list
+                with the value returned by each replicate, in the same order as
+                :attr:`seeds`.
+        """
+        if len(self.system_states) < 1:
+            raise ValueError("The ensemble has not been run yet")
+        if any(system_state is None for system_state in self.system_states):
+            raise ValueError("No system state component is monitored")
+        return self._merge(self.system_states)
@@ -2,16 +2,23 @@
 Implicit MF recommender system
 """
 import numpy as np
-from lenskit.algorithms import als
-import pandas as pd
 import warnings
 from trecs.metrics import MSEMeasurement
+from trecs.components import append_columns
 from trecs.random import Generator
 from trecs.validate import validate_user_item_inputs
 from trecs.utils import non_none_values
 from .recommender import BaseRecommender
 
 
+def _interactions_frame(user_item_ids=None):
+    """Returns a data frame of (user, item) interactions. Like LensKit, pandas
+    is slow to import, so it is only loaded when a model is created."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    return pd.DataFrame(user_item_ids, columns=["user", "item"])
+
+
 class ImplicitMF(BaseRecommender):
     """
     A customizable implicit matrix factorization recommendation system.
@@ -179,7 +186,7 @@ class ImplicitMF(BaseRecommender):
         self.num_latent_factors = num_attributes
         self.model_params = model_params
         self.als_model = None  # initialize empty model
-        self.all_interactions = pd.DataFrame(columns=["user", "item"])  # empty interactions matrix
+        self.all_interactions = _interactions_frame()  # empty interactions matrix
 
         # generate user and item representations as needed
         # note that these will be overwritten for all users/items with at least
@@ -217,7 +224,7 @@ class ImplicitMF(BaseRecommender):
         At each training timestep, we keep track of the user/item interactions.
         """
         user_item_ids = tuple(zip(self.users.user_vector, interactions))
-        interaction_df = pd.DataFrame(user_item_ids, columns=["user", "item"])
+        interaction_df = _interactions_frame(user_item_ids)
         self.all_interactions = self.all_interactions.append(interaction_df, ignore_index=True)
 
     def train(self):
@@ -229,6 +236,8 @@ class ImplicitMF(BaseRecommender):
         """
         # if there are new interactions present, retrain the
         if self.all_interactions.size > 0:
+            from lenskit.algorithms import als  # pylint: disable=import-outside-toplevel
+
             # run LensKit ImplicitMF training procedure to extract user/item latent
             # representations from interaction data.
             self.model_params["features"] = self.num_latent_factors
@@ -239,6 +248,7 @@ class ImplicitMF(BaseRecommender):
             user_index, item_index = list(set(model.user_index_)), list(set(model.item_index_))
             self.users_hat[user_index, :] = model.user_features_
             self.items_hat[:, item_index] = model.item_features_.T
+            self.invalidate_scores()
         # update predicted scores
         # when there are no new interactions to refit an MF from, it simply uses the
         # existing representation of user & item attributes to predict scores
@@ -269,7 +279,7 @@ class ImplicitMF(BaseRecommender):
         # reset interactions tracker so that interactions captured
         # are only for the duration of this particular run
         if reset_interactions:
-            self.all_interactions = pd.DataFrame(columns=["user", "item"])
+            self.all_interactions = _interactions_frame()
         super().run(
             timesteps,
             startup,
@@ -295,5 +305,5 @@ class ImplicitMF(BaseRecommender):
         """
         num_new_items = new_items.shape[1]
         avg_item = self.als_model.item_features_.T.mean(axis=1)
-        new_items = np.tile(avg_item, (num_new_items, 1)).T
-        self.items_hat = np.hstack([self.items_hat, new_items])
+        new_items = np.tile(avg_item, (num_new_items, 1)).T.astype(self.items_hat.dtype)
+        self.items_hat = append_columns(self.items_hat, new_items)
@@ -3,6 +3,7 @@ Popularity-based recommender system
 """
 import numpy as np
 from trecs.metrics import MSEMeasurement
+from trecs.components import append_columns
 from trecs.validate import validate_user_item_inputs
 from .recommender import BaseRecommender
 
@@ -169,6 +170,8 @@ class PopularityRecommender(BaseRecommender):
         histogram = np.zeros(self.num_items)
         np.add.at(histogram, interactions, 1)
         self.items_hat[:, :] = np.add(self.items_hat, histogram)
+        # only the items that users interacted with have changed
+        self.invalidate_scores(items=interactions)
 
     def process_new_items(self, new_items):
         """
@@ -181,5 +184,5 @@ class PopularityRecommender(BaseRecommender):
                 added into the system. Should be :math:`|A|\\times|I|`
         """
         # start popularity of new items as 0
-        new_representation = np.zeros(new_items.shape[1]).reshape(1, -1)
-        self.items_hat = np.hstack([self.items_hat, new_representation])
+        new_representation = np.zeros((1, new_items.shape[1]), dtype=self.items_hat.dtype)
+        self.items_hat = append_columns(self.items_hat, new_representation)
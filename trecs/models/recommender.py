@@ -3,24 +3,40 @@ BaseRecommender, the foundational class for all recommender systems
 implementable in our simulation library
 """
 from abc import ABC, abstractmethod
+import inspect
+import warnings
 import numpy as np
 from tqdm import tqdm
-from trecs.metrics import MeasurementModule
+from trecs.metrics import MeasurementModule, MeasurementPipeline, SystemSnapshot
 from trecs.components import (
     Users,
+    BaseComponent,
+    HistoryFactory,
     Items,
+    ConsumedItems,
     Creators,
     PredictedScores,
     PredictedUserProfiles,
     SystemStateModule,
+    append_columns,
 )
+from trecs.components.schedule import is_recorded, recorded_timesteps
 from trecs.logging import VerboseMode
-from trecs.matrix_ops import inner_product
+from trecs.profiling import ProfilingModule
+from trecs.matrix_ops import (
+    inner_product,
+    rank_weighted_sample,
+    sample_without_replacement,
+    top_k_indices,
+)
 from trecs.random import Generator
-from trecs.utils import is_valid_or_none
+from trecs.utils import is_valid_or_none, cast_to_dtype
+from .checkpoint import load_checkpoint, save_checkpoint
 
 
-class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
+class BaseRecommender(  # pylint: disable=too-many-instance-attributes
+    MeasurementModule, SystemStateModule, ProfilingModule, VerboseMode, ABC
+):
     """Abstract class representing a recommender system.
 
     The attributes and methods in this class can be generalized beyond
@@ -75,6 +91,70 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
             each candidate item. The score function should take as input
             user_profiles and item_attributes.
 
+        incremental_train: bool (optional, default: False)
+            If True, :func:`train` only recomputes the predicted scores of the
+            users (rows) and items (columns) whose representation changed since
+            the last call, and it does nothing if nothing changed. This requires
+            that `score_fn` scores each user-item pair independently of the
+            other users and items (as :func:`~trecs.matrix_ops.inner_product`
+            does). See :func:`invalidate_scores`.
+
+        dtype: :obj:`numpy.dtype` or None (optional, default: None)
+            Floating-point type used throughout the simulation. If not None,
+            the representations of users and items (including new items),
+            the actual user profiles and scores, and the predicted scores are
+            stored with this type, and integer representations (e.g., counts
+            of interactions) are stored with the signed integer type of the
+            same size. For example, `dtype=numpy.float32` halves the memory
+            used by large simulations. In single precision, the predicted
+            scores agree with double precision up to a relative error of about
+            `1e-6`, so the top-`k` items differ only between items whose
+            scores are within that tolerance of each other. If None, the type
+            of the inputs is kept (`float64` by default).
+
+        history_dir: str or None (optional, default: None)
+            If not None, the histories of the measurements and of the system
+            state components (e.g., the states recorded when
+            `record_base_state` is True) are written to disk in subdirectories
+            of this directory as the simulation runs, rather than kept in
+            memory. See :class:`~components.history.DiskHistory`.
+
+        history_keyframe_interval: int or None (optional, default: None)
+            If not None, the histories of the measurements and of the system
+            state components are delta-encoded in memory: a full copy of each
+            array is stored every `history_keyframe_interval` timesteps, and
+            only the elements that changed are stored in between. See
+            :class:`~components.history.DeltaHistory`. It cannot be used
+            together with `history_dir`.
+
+        recording_schedule: :class:`~components.schedule.RecordingSchedule` or None \
+                            (optional, default: None)
+            Timesteps at which the measurements and the system state
+            components are recorded, unless they have their own schedule (see
+            :func:`~components.base_components.BaseObservable.set_schedule`).
+            On the other timesteps, measurements are not computed at all. If
+            None, every timestep is recorded.
+
+        async_measurements: bool (optional, default: False)
+            If True, measurements are computed in a background thread, on a
+            copy of the attributes of the model that they read, while the
+            simulation moves on to the next timestep (see
+            :class:`~metrics.pipeline.MeasurementPipeline`). Measurements that
+            do not declare the attributes they read
+            (:attr:`~metrics.measurement.Measurement.snapshot_attributes`) are
+            still computed synchronously. Pending measurements are completed
+            by :func:`get_measurements` (or :func:`flush_measurements`).
+
+        max_pending_measurements: int (optional, default: 8)
+            Maximum number of measurements waiting to be computed in the
+            background. When the queue is full, the simulation waits for the
+            background thread to catch up.
+
+        profile: bool (optional, default: False)
+            If True, the wall time and the peak memory allocated by each phase
+            of each timestep are recorded (see :func:`get_profile`). Tracing
+            memory allocations slows down the simulation.
+
         verbose: bool (optional, default: False)
             If True, it enables verbose mode.
 
@@ -127,20 +207,32 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
 
         random_state: :class:`trecs.random.generators.Generator`
 
+        consumed_items: :class:`~components.items.ConsumedItems`
+            A compact :math:`|U| \\times |I|` bitset representing the past
+            interactions of each user. This keeps track of which items each
+            user has interacted with, so that it won't be presented to the user
+            again if `repeated_items` are not allowed.
+
         indices: :obj:`numpy.ndarray`
-            A :math:`|U| \\times |I|` array representing the past interactions of each
-            user. This keeps track of which items each user has interacted
-            with, so that it won't be presented to the user again if
-            `repeated_items` are not allowed.
+            Deprecated, use :attr:`consumed_items`. A copy of the consumed items
+            as a :math:`|U| \\times |I|` matrix of item indices, with -1 for
+            the items each user has interacted with.
 
         score_fn: callable
             Function that is used to calculate each user's predicted scores for
             each candidate item. The score function should take as input
             user_profiles and item_attributes.
+
+        dtype: :obj:`numpy.dtype` or None
+            Floating-point type used throughout the simulation, if any.
+
+        timestep: int
+            Number of timesteps simulated since the model was created
+            (including startup timesteps).
     """
 
     @abstractmethod
-    def __init__(  # pylint: disable=R0913,R0912,R0915
+    def __init__(  # pylint: disable=R0913,R0912,R0914,R0915
         self,
         users_hat,
         items_hat,
@@ -155,6 +247,14 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         record_base_state=False,
         system_state=None,
         score_fn=inner_product,
+        incremental_train=False,
+        dtype=None,
+        history_dir=None,
+        history_keyframe_interval=None,
+        recording_schedule=None,
+        async_measurements=False,
+        max_pending_measurements=8,
+        profile=False,
         verbose=False,
         seed=None,
     ):
@@ -162,14 +262,24 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         VerboseMode.__init__(self, __name__.upper(), verbose)
         # Initialize measurements
         MeasurementModule.__init__(self)
+        ProfilingModule.__init__(self, profile)
+        self._measurement_pipeline = None
+        if async_measurements:
+            self._measurement_pipeline = MeasurementPipeline(max_pending=max_pending_measurements)
         if measurements is not None:
             self.add_metrics(*measurements)
+        self.dtype = None if dtype is None else np.dtype(dtype)
         # init the recommender system's internal representation of users
         # and items
-        self.users_hat = PredictedUserProfiles(users_hat)
-        self.items_hat = Items(items_hat)
+        self.users_hat = PredictedUserProfiles(cast_to_dtype(users_hat, self.dtype))
+        self.items_hat = Items(cast_to_dtype(items_hat, self.dtype))
         assert callable(score_fn)  # score function must be a function
         self.score_fn = score_fn
+        # keep track of the predicted scores that are out of date
+        self.incremental_train = incremental_train
+        self._stale_users = None
+        self._stale_items = None
+        self._invalidated = False
         # set predicted scores
         self.predicted_scores = None
         self.train()
@@ -192,10 +302,12 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         if not is_valid_or_none(users, (list, np.ndarray, Users)):
             raise TypeError("users must be array_like or Users")
         if users is None:
-            self.users = Users(size=self.users_hat.shape, num_users=num_users, seed=seed)
+            self.users = Users(
+                size=self.users_hat.shape, num_users=num_users, seed=seed, dtype=self.dtype
+            )
         if isinstance(users, (list, np.ndarray)):
             # assume that's what passed in is the user's profiles
-            self.users = Users(actual_user_profiles=users, num_users=num_users)
+            self.users = Users(actual_user_profiles=users, num_users=num_users, dtype=self.dtype)
         if isinstance(users, Users):
             self.users = users
 
@@ -207,7 +319,7 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         if isinstance(items, (list, np.ndarray)):
             # will need to change this when Items no longer inherits from
             # ndarray
-            self.items = Items(items)
+            self.items = Items(cast_to_dtype(items, self.dtype))
         if isinstance(items, Items):
             self.items = items
 
@@ -236,8 +348,15 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         self.num_items = num_items
         self.num_items_per_iter = num_items_per_iter
         self.random_state = Generator(seed)
-        # Matrix keeping track of the items consumed by each user
-        self.indices = np.tile(np.arange(num_items), (num_users, 1))
+        # Bitset keeping track of the items consumed by each user
+        self.consumed_items = ConsumedItems(num_users, num_items)
+        self._histories = None
+        if history_dir is not None or history_keyframe_interval is not None:
+            self._histories = HistoryFactory(history_dir, history_keyframe_interval)
+        self._replace_histories()
+        self.recording_schedule = recording_schedule
+        # number of timesteps simulated since the creation of the model
+        self.timestep = 0
         if self.is_verbose():
             self.log("Recommender system ready")
             self.log(f"Num items: {self.num_items}")
@@ -264,11 +383,64 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         recommender system. Under default initialization, it updates
         :attr:`predicted_scores` with a dot product of user and item attributes.
 
+        If :attr:`incremental_train` is True, only the scores of users and
+        items that were invalidated with :func:`invalidate_scores` (and of any
+        new items) are recomputed.
+
         Returns
         --------
             predicted_scores: :class:`~components.users.PredictedScores`
         """
-        predicted_scores = self.score_fn(self.users_hat, self.items_hat)
+        if self.predicted_scores is None or not self.incremental_train:
+            self._train_all()
+            return
+        num_scored_items = self.predicted_scores.shape[1]
+        new_items = self.items_hat.shape[1] - num_scored_items
+        if new_items > 0:
+            # score the new columns only
+            new_scores = self.score_fn(self.users_hat, self.items_hat[:, num_scored_items:])
+            new_scores = cast_to_dtype(new_scores, self.dtype)
+            self.predicted_scores = append_columns(self.predicted_scores, new_scores)
+        if self._stale_users is None and self._stale_items is None:
+            if self.is_verbose():
+                self.log("Predicted scores are up to date")
+            return
+        if isinstance(self._stale_users, slice) or isinstance(self._stale_items, slice):
+            self._train_all()
+            return
+        if self._stale_users is not None:
+            users = self._stale_users
+            self.predicted_scores[users, :] = self.score_fn(
+                self.users_hat[users, :], self.items_hat
+            )
+        if self._stale_items is not None:
+            items = self._stale_items
+            self.predicted_scores[:, items] = self.score_fn(
+                self.users_hat, self.items_hat[:, items]
+            )
+        if self.is_verbose():
+            self.log(
+                "System updates predicted scores given by users (rows) "
+                "to items (columns):\n"
+                f"{str(self.predicted_scores)}"
+            )
+        self._stale_users, self._stale_items = None, None
+
+    def _train_all(self):
+        """
+        Recomputes the predicted scores of every user-item pair.
+        """
+        if (
+            self.predicted_scores is not None
+            and self.predicted_scores.shape == (self.users_hat.shape[0], self.items_hat.shape[1])
+            and self._score_fn_accepts_out()
+        ):
+            # the score function writes the new scores in place
+            self.score_fn(self.users_hat, self.items_hat, out=np.asarray(self.predicted_scores))
+            predicted_scores = self.predicted_scores
+        else:
+            predicted_scores = self.score_fn(self.users_hat, self.items_hat)
+            predicted_scores = cast_to_dtype(predicted_scores, self.dtype)
         if self.is_verbose():
             self.log(
                 "System updates predicted scores given by users (rows) "
@@ -278,16 +450,70 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         assert predicted_scores is not None
         if self.predicted_scores is None:
             self.predicted_scores = PredictedScores(predicted_scores)
-        else:
+        elif predicted_scores is not self.predicted_scores:
             # resize for new items if necessary
-            new_items = predicted_scores.shape[1] - self.predicted_scores.shape[1]
-            if new_items != 0:
-                self.predicted_scores = np.hstack(
-                    [self.predicted_scores, np.zeros((self.num_users, new_items))]
+            num_scored_items = self.predicted_scores.shape[1]
+            if predicted_scores.shape[1] != num_scored_items:
+                self.predicted_scores = append_columns(
+                    self.predicted_scores, predicted_scores[:, num_scored_items:]
                 )
-            self.predicted_scores[:, :] = predicted_scores
+            self.predicted_scores[:, :num_scored_items] = predicted_scores[:, :num_scored_items]
+        self._stale_users, self._stale_items = None, None
 
-    def generate_recommendations(self, k=1, item_indices=None):
+    def _score_fn_accepts_out(self):
+        """
+        Returns True if the score function accepts an `out` argument where the
+        scores are written (e.g., :func:`~trecs.matrix_ops.blocked_inner_product`).
+        """
+        try:
+            return "out" in inspect.signature(self.score_fn).parameters
+        except (TypeError, ValueError):
+            return False
+
+    def invalidate_scores(self, users=None, items=None):
+        """
+        Marks the predicted scores of some users and/or items as out of date, so
+        that they are recomputed by the next call to :func:`train` when
+        :attr:`incremental_train` is True. Models call this method in
+        :func:`_update_internal_state`; if the representation of users or items
+        is modified in any other way, this method should be called as well.
+
+        Parameters
+        -----------
+
+            users: :obj:`numpy.ndarray` or None (optional, default: None)
+                Indices of the users whose representation changed.
+
+            items: :obj:`numpy.ndarray` or None (optional, default: None)
+                Indices of the items whose representation changed.
+
+            If both `users` and `items` are None, all scores are invalidated.
+        """
+        self._invalidated = True
+        if users is None and items is None:
+            self._stale_users = slice(None)
+            return
+        if users is not None:
+            self._stale_users = self._merge_stale(self._stale_users, users)
+        if items is not None:
+            self._stale_items = self._merge_stale(self._stale_items, items)
+
+    @staticmethod
+    def _merge_stale(stale, indices):
+        """ Adds indices to the set of stale indices """
+        if isinstance(stale, slice):
+            return stale
+        if stale is None:
+            return np.unique(indices)
+        return np.union1d(stale, indices)
+
+    @property
+    def indices(self):
+        """ Deprecated: the consumed items as a matrix of item indices """
+        warnings.warn("indices is deprecated, use consumed_items", DeprecationWarning, stacklevel=2)
+        return self.consumed_items.to_item_indices()
+
+    def generate_recommendations(self, k=1, mask=None, item_indices=None):
         """
         Generate recommendations for each user.
 
@@ -297,54 +523,56 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
             k : int (optional, default: 1)
                 Number of items to recommend.
 
+            mask : :obj:`numpy.ndarray` or None (optional, default: None)
+                A :math:`|U|\\times|I|` boolean matrix where element `[u, i]` is
+                True if item `i` must not be recommended to user `u` (e.g.,
+                because the user has already interacted with it), or a
+                :class:`~components.items.ConsumedItems` bitset. It is used to
+                ensure that the user is presented with items they have not
+                already interacted with. If `None`, then the user may be
+                recommended items that they have already interacted with.
+
             item_indices : :obj:`numpy.ndarray` or None (optional, default: None)
-                A matrix containing the indices of the items each user has not yet
-                interacted with. It is used to ensure that the user is presented
-                with items they have not already interacted with. If `None`,
-                then the user may be recommended items that they have already
-                interacted with.
+                Deprecated, use `mask`. A matrix containing the indices of the
+                items each user has not yet interacted with.
 
         Returns
         ---------
             Recommendations: :obj:`numpy.ndarray`
         """
         if item_indices is not None:
-            if item_indices.size < self.num_users:
+            warnings.warn("item_indices is deprecated, use mask", DeprecationWarning, stacklevel=2)
+            mask = ConsumedItems.from_item_indices(item_indices, self.num_items)
+        if mask is not None:
+            num_items_unseen = mask.shape[1] - mask.sum(axis=1)
+            if (num_items_unseen == 0).any():
                 raise ValueError(
                     "At least one user has interacted with all items!"
                     "To avoid this problem, you may want to allow repeated items."
                 )
-            if k > item_indices.shape[1]:
+            if k > num_items_unseen.min():
                 raise ValueError(
                     f"There are not enough items left to recommend {k} items to each user."
                 )
         if k == 0:
             return np.array([]).reshape((self.num_users, 0)).astype(int)
-        row = np.repeat(self.users.user_vector, item_indices.shape[1])
-        row = row.reshape((self.num_users, -1))
-        s_filtered = self.predicted_scores[row, item_indices]
-        # scores are U x I; we can use argsort to sort the item indices
-        # from low to high scores
-        permutation = s_filtered.argsort()
-        rec = item_indices[row, permutation]
-        if self.is_verbose():
-            self.log(f"Row:\n{str(row)}")
-            self.log(f"Item indices:\n{str(item_indices)}")
-            self.log(f"Items ordered by preference (low to high) for each user:\n{str(rec)}")
+        if self.is_verbose() and mask is not None:
+            self.log(f"Items already interacted with:\n{str(np.asarray(mask))}")
         if self.probabilistic_recommendations:
             # the recommended items will not be exactly determined by
-            # predicted score; instead, we will sample from the sorted list
-            # such that higher-preference items get more probability mass
-            num_items_unseen = rec.shape[1]  # number of items unseen per user
-            probabilities = np.logspace(0.0, num_items_unseen / 10.0, num=num_items_unseen, base=2)
-            probabilities = probabilities / probabilities.sum()
-            picks = np.random.choice(num_items_unseen, k, replace=False, p=probabilities)
-            return rec[:, picks]
+            # predicted score; instead, each user gets an independent sample
+            # in which higher-preference items get more probability mass
+            rec = rank_weighted_sample(self.predicted_scores, k, self.random_state, mask=mask)
+            if self.is_verbose():
+                self.log(f"Items sampled (in order of selection) for each user:\n{str(rec)}")
+            return rec
         else:
-            # ensure that the highest scored items show up first
-            return np.fliplr(
-                rec[:, -k:],
-            )
+            # only the top-k items of each user are sorted; the highest scored
+            # items show up first
+            rec = top_k_indices(self.predicted_scores, k, mask=mask)
+            if self.is_verbose():
+                self.log(f"Top {k} items (high to low) for each user:\n{str(rec)}")
+            return rec
 
     def recommend(
         self,
@@ -399,29 +627,32 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
                 num_new_items = self.random_state.integers(0, random_items_per_iter + 1)
             num_recommended = self.num_items_per_iter - num_new_items
 
-        item_indices = self.indices
+        mask = None
         if not repeated_items:
-            # for each user, eliminate items that have been interacted with
-            item_indices = item_indices[np.where(item_indices >= 0)]
-            item_indices = item_indices.reshape((self.num_users, -1))
+            # for each user, eliminate items that have been interacted with;
+            # the bitset is applied to the scores without being unpacked
+            mask = self.consumed_items
 
-        recommended = self.generate_recommendations(k=num_recommended, item_indices=item_indices)
+        recommended = self.generate_recommendations(k=num_recommended, mask=mask)
 
         if self.is_verbose():
-            self.log(f"Choice among {item_indices.shape[0]} items")
-            if item_indices.shape[1] < num_new_items:
+            num_items_unseen = self.num_items
+            if mask is not None:
+                num_items_unseen -= self.consumed_items.num_consumed.max()
+            self.log(f"Choice among {num_items_unseen} items")
+            if num_items_unseen < num_new_items:
                 self.log("Insufficient number of items left!")
 
-        new_items = np.array([]).reshape((self.num_users, 0)).astype(int)
-        if num_new_items:
-            # no guarantees that randomly interleaved items do not overlap
-            # with recommended items
-            # also possible that item indices are repeated
-            col = self.random_state.integers(
-                item_indices.shape[1], size=(self.num_users, num_new_items)
-            )
-            row = np.repeat(self.users.user_vector, num_new_items).reshape((self.num_users, -1))
-            new_items = item_indices[row, col]
+        # randomly interleaved items are distinct, and differ from the items
+        # recommended to the same user (and from consumed items, if masked)
+        new_items = sample_without_replacement(
+            self.num_users,
+            self.num_items,
+            num_new_items,
+            self.random_state,
+            exclude=recommended,
+            mask=mask,
+        )
 
         items = np.zeros((self.num_users, self.num_items_per_iter), dtype=int)
         # generate indices for recommended and randomly interleaved columns
@@ -508,36 +739,84 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         """
         if not startup and self.is_verbose():
             self.log("Running recommendation simulation using recommendation algorithm...")
-        for timestep in tqdm(range(timesteps)):
-            if self.is_verbose():
-                self.log(f"Step {timestep}")
-            if self.creators is not None and not no_new_items:
+        if self._profiler is not None:
+            self._profiler.start()
+        try:
+            for timestep in tqdm(range(timesteps)):
+                self._run_step(
+                    timestep,
+                    timesteps,
+                    startup,
+                    train_between_steps,
+                    random_items_per_iter,
+                    vary_random_items_per_iter,
+                    repeated_items,
+                    no_new_items,
+                )
+        finally:
+            if self._profiler is not None:
+                self._profiler.stop()
+
+    def _run_step(  # pylint: disable=too-many-arguments
+        self,
+        timestep,
+        timesteps,
+        startup,
+        train_between_steps,
+        random_items_per_iter,
+        vary_random_items_per_iter,
+        repeated_items,
+        no_new_items,
+    ):
+        """
+        Runs one timestep of the simulation. See :func:`run` for the
+        parameters. If profiling is enabled, each phase of the timestep is
+        timed (see :func:`get_profile`).
+        """
+        if self.is_verbose():
+            self.log(f"Step {timestep}")
+        if self._profiler is not None:
+            self._profiler.start_step(self.timestep + 1)
+        if self.creators is not None and not no_new_items:
+            with self._phase("create_and_process_items"):
                 self.create_and_process_items()
+        with self._phase("recommend"):
             item_idxs = self.recommend(
                 startup=startup,
                 random_items_per_iter=random_items_per_iter,
                 vary_random_items_per_iter=vary_random_items_per_iter,
                 repeated_items=repeated_items,
             )
+        with self._phase("user_feedback"):
             # important: we use the true item attributes to get user feedback
             interactions = self.users.get_user_feedback(
                 items_shown=item_idxs, item_attributes=self.items
             )
             if not repeated_items:
-                self.indices[self.users.user_vector, interactions] = -1
+                self.consumed_items.mark(self.users.user_vector, interactions)
+        with self._phase("update_internal_state"):
+            self._invalidated = False
             self._update_internal_state(interactions)
-            if self.is_verbose():
-                self.log(
-                    "System updates user profiles based on last interaction:\n"
-                    + str(self.users_hat)
-                )
-            # update creators if any
-            if self.creators is not None:
+            if not self._invalidated:
+                # the model did not specify which scores are now out of date
+                self.invalidate_scores()
+        if self.is_verbose():
+            self.log(
+                "System updates user profiles based on last interaction:\n" + str(self.users_hat)
+            )
+        # update creators if any
+        if self.creators is not None:
+            with self._phase("update_creators"):
                 self.creators.update_profiles(interactions, self.items)
-            # train between steps:
-            if train_between_steps:
+        # train between steps:
+        if train_between_steps:
+            with self._phase("train"):
                 self.train()
-            self.measure_content(interactions, item_idxs, step=timestep)
+        self.timestep += 1
+        with self._phase("measure_content"):
+            self.measure_content(
+                interactions, item_idxs, step=timestep, last_step=timestep == timesteps - 1
+            )
 
     def startup_and_train(self, timesteps=50, no_new_items=False):
         """
@@ -567,9 +846,14 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         """
         # generate new items
         new_items = self.creators.generate_items()  # should be A x I
+        if self.dtype is not None:
+            # new items are stored like the existing ones
+            new_items = new_items.astype(self.items.dtype)
         self.num_items += new_items.shape[1]  # increment number of items
+        grown = ("items", "items_hat", "predicted_scores")
+        old_components = {attribute: getattr(self, attribute) for attribute in grown}
         # concatenate old items with new items
-        self.items = np.hstack([self.items, new_items])
+        self.items = append_columns(self.items, new_items)
         # generate new internal system representations of the items
         self.process_new_items(new_items)
         self.add_new_item_indices(new_items.shape[1])
@@ -577,20 +861,26 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         self.train()
         # have users update their own scores too
         self.users.score_new_items(new_items)
+        # the matrices that grew are new objects; keep monitoring them
+        for attribute, old_component in old_components.items():
+            if not isinstance(getattr(self, attribute), BaseComponent):
+                continue
+            self._system_state = [
+                getattr(self, attribute) if component is old_component else component
+                for component in self._system_state
+            ]
 
     def add_new_item_indices(self, num_new_items):
         """
-        Expands the indices matrix to include entries for new items that
-        were created.
+        Expands the record of consumed items to include entries for new items
+        that were created.
 
         Parameters
         -----------
             num_new_items (int): The number of new items added to the system
             in this iteration
         """
-        num_existing_items = self.indices.shape[1]
-        new_indices = num_existing_items + np.tile(np.arange(num_new_items), (self.num_users, 1))
-        self.indices = np.hstack([self.indices, new_indices])
+        self.consumed_items.add_items(num_new_items)
 
     def get_measurements(self):
         """
@@ -603,14 +893,12 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         """
         if len(self.metrics) < 1:
             raise ValueError("No measurement module defined")
+        self.flush_measurements()
         measurements = dict()
         for metric in self.metrics:
             measurements = {**measurements, **metric.get_measurement()}
         if "timesteps" not in measurements:
-            # pick first measurement's length for # of timesteps since they're
-            # going to be the same
-            elapsed = np.arange(self.metrics[0].get_timesteps())
-            measurements["timesteps"] = elapsed
+            measurements.update(recorded_timesteps(self.metrics))
         return measurements
 
     def get_system_state(self):
@@ -629,10 +917,7 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
         for component in self._system_state:
             state = {**state, **component.get_component_state()}
         if "timesteps" not in state:
-            # pick first measurement's length for # of timesteps since they're
-            # going to be the same
-            elapsed = np.arange(self._system_state[0].get_timesteps())
-            state["timesteps"] = elapsed
+            state.update(recorded_timesteps(self._system_state))
         # FIXME: this is needed because Users.actual_user_scores is initialized to None
         if (
             "actual_user_scores" in state
@@ -642,12 +927,14 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
             state["actual_user_scores"].pop(0)
         return state
 
-    def measure_content(self, interactions, items_shown, step):
+    def measure_content(self, interactions, items_shown, step, last_step=False):
         """
         TODO: UPDATE DOCUMENTATION
         Calls method in the :class:`Measurements` module to record metrics.
         For more details, see the :class:`Measurements` class and its measure
-        method.
+        method. Only the measurements and system state components whose
+        recording schedule includes the current timestep (:attr:`timestep`)
+        are recorded.
 
         Parameters
         -----------
@@ -655,8 +942,59 @@ class BaseRecommender(MeasurementModule, SystemStateModule, VerboseMode, ABC):
                 per users at a given time step.
 
             step (int): step on which the recorded interactions refers to.
+
+            last_step (bool): True if this is the last step of the current run.
         """
+        # measurements and components may have been added since the last step
+        self._replace_histories()
+        # copies of the arrays read by the measurements computed in the background
+        snapshot_cache = dict()
         for metric in self.metrics:
-            metric.measure(self, step=step, interactions=interactions, items_shown=items_shown)
+            if not is_recorded(metric, self.recording_schedule, self.timestep, last_step):
+                continue
+            if self._measurement_pipeline is None or metric.snapshot_attributes is None:
+                metric.measure(self, step=step, interactions=interactions, items_shown=items_shown)
+            else:
+                snapshot = SystemSnapshot(self, metric.snapshot_attributes, snapshot_cache)
+                self._measurement_pipeline.submit(
+                    metric, snapshot, step=step, interactions=interactions, items_shown=items_shown
+                )
+            metric.recorded_steps.append(self.timestep)
         for component in self._system_state:
-            component.store_state()
+            if is_recorded(component, self.recording_schedule, self.timestep, last_step):
+                component.store_state()
+                component.recorded_steps.append(self.timestep)
+
+    def flush_measurements(self):
+        """
+        Waits until the measurements computed in the background (if
+        `async_measurements` is True) are stored in the measurement histories.
+        """
+        if self._measurement_pipeline is not None:
+            self._measurement_pipeline.flush()
+
+    def _replace_histories(self):
+        """
+        Moves the histories that are still kept in plain lists to the
+        histories created by :class:`~components.history.HistoryFactory`, if
+        `history_dir` or `history_keyframe_interval` was set.
+        """
+        if self._histories is not None:
+            self._histories.move_histories(self.metrics, self._system_state, self.flush_measurements)
+
+    def save_checkpoint(self, path):
+        """
+        Saves the state of the simulation to the directory `path`, so that it
+        can be resumed later with :func:`load_checkpoint`. See
+        :func:`~models.checkpoint.save_checkpoint`.
+        """
+        save_checkpoint(self, path)
+
+    def load_checkpoint(self, path, mmap_mode="c"):
+        """
+        Restores the state of the simulation saved with
+        :func:`save_checkpoint`. The model must have been initialized with the
+        same parameters as the model that was saved. See
+        :func:`~models.checkpoint.load_checkpoint`.
+        """
+        load_checkpoint(self, path, mmap_mode=mmap_mode)
@@ -2,10 +2,10 @@
 Social filtering recommender system, where users get shown items that were
 interacted with by users in their social networks
 """
-import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 from trecs.metrics import MSEMeasurement
-from trecs.components import BinarySocialGraph
+from trecs.components import BinarySocialGraph, append_columns
 from trecs.random import SocialGraphGenerator
 from trecs.utils import get_first_valid, non_none_values
 from trecs.validate import validate_user_item_inputs
@@ -163,6 +163,8 @@ class SocialFiltering(BaseRecommender, BinarySocialGraph):
             raise ValueError("Number of users must be consistent across all inputs")
 
         if user_representation is None:
+            import networkx as nx  # pylint: disable=import-outside-toplevel
+
             user_representation = SocialGraphGenerator.generate_random_graph(
                 num=num_users, p=0.3, seed=seed, graph_type=nx.fast_gnp_random_graph
             )
@@ -172,7 +174,9 @@ class SocialFiltering(BaseRecommender, BinarySocialGraph):
         # if the actual item representation is not specified, we assume
         # that the recommender system's beliefs about the item attributes
         # are the same as the "true" item attributes
-        if actual_item_representation is None:
+        if actual_item_representation is None and sp.issparse(item_representation):
+            actual_item_representation = item_representation.toarray()
+        elif actual_item_representation is None:
             actual_item_representation = np.copy(item_representation)
 
         measurements = [MSEMeasurement()]
@@ -206,10 +210,16 @@ class SocialFiltering(BaseRecommender, BinarySocialGraph):
                 interacted with in the latest step. Namely, interactions_u represents
                 the index of the item that the user has interacted with.
         """
-        interactions_per_user = np.zeros((self.num_users, self.num_items))
-        interactions_per_user[self.users.user_vector, interactions] = 1
-        assert interactions_per_user.shape == self.items_hat.shape
-        self.items_hat[:, :] = np.add(self.items_hat, interactions_per_user)
+        if sp.issparse(self.items_hat):
+            interactions_per_user = sp.csr_matrix(
+                (np.ones(interactions.size), (self.users.user_vector, interactions)),
+                shape=self.items_hat.shape,
+            )
+            self.items_hat += interactions_per_user
+        else:
+            np.add.at(self.items_hat, (self.users.user_vector, interactions), 1)
+        # only the items that users interacted with have changed
+        self.invalidate_scores(items=interactions)
 
     def process_new_items(self, new_items):
         """
@@ -224,5 +234,13 @@ class SocialFiltering(BaseRecommender, BinarySocialGraph):
                 added into the system. Should be :math:`|A|\\times|I|`
         """
         # users have never interacted with new items
-        new_representation = np.zeros((self.num_users, new_items.shape[1]))
-        self.items_hat = np.hstack([self.items_hat, new_representation])
+        if sp.issparse(self.items_hat):
+            new_representation = sp.csr_matrix(
+                (self.num_users, new_items.shape[1]), dtype=self.items_hat.dtype
+            )
+            self.items_hat = sp.hstack([self.items_hat, new_representation], format="csr")
+        else:
+            new_representation = np.zeros(
+                (self.num_users, new_items.shape[1]), dtype=self.items_hat.dtype
+            )
+            self.items_hat = append_columns(self.items_hat, new_representation)
@@ -0,0 +1,215 @@
+"""
+Lightweight profiler that records the wall time and the peak memory allocated
+by each phase of each timestep of a simulation
+"""
+import time
+import tracemalloc
+import numpy as np
+
+
+class _NullPhase:  # pylint: disable=too-few-public-methods
+    """ Context manager that does nothing, used when profiling is disabled """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Phase:  # pylint: disable=too-few-public-methods
+    """ Context manager that measures one phase of a timestep """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start_time = None
+        self.start_bytes = None
+
+    def __enter__(self):
+        if self.profiler.tracing:
+            self.start_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start_time
+        peak_bytes = None
+        if self.start_bytes is not None:
+            peak_bytes = max(tracemalloc.get_traced_memory()[1] - self.start_bytes, 0)
+        self.profiler.record(self.name, elapsed, peak_bytes)
+        return False
+
+
+class Profiler:
+    """
+    Records, for each timestep of a simulation, the wall time spent in each
+    phase of the timestep (e.g., `"recommend"` or `"train"`) and the peak
+    number of bytes allocated during the phase, on top of the memory already
+    allocated when the phase started.
+
+    Memory is traced with :mod:`tracemalloc` (which NumPy reports its
+    allocations to), only while :func:`start` is in effect, since tracing
+    slows down allocations. Peak memory is not recorded on Python versions
+    earlier than 3.9.
+
+    Parameters
+    -----------
+
+        trace_memory: bool (optional, default: True)
+            If True, the peak memory allocated by each phase is recorded.
+
+    Examples
+    ----------
+
+        >>> profiler = Profiler()
+        >>> profiler.start()
+        >>> profiler.start_step(1)
+        >>> with profiler.phase("train"):
+        ...     model.train()
+        >>> profiler.stop()
+        >>> profiler.get_profile()["summary"]["train"]["total_time"]
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory and hasattr(tracemalloc, "reset_peak")
+        self._started_tracing = False
+        # True between start() and stop(), if memory is traced
+        self.tracing = False
+        self._steps = list()
+        # records of the current step, as {phase: (time, peak bytes)}
+        self._current = None
+        self._phases = list()
+
+    def start(self):
+        """ Starts tracing memory allocations, if needed """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.tracing = self.trace_memory
+
+    def stop(self):
+        """ Stops tracing memory allocations, if :func:`start` started it """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.tracing = False
+
+    def start_step(self, step):
+        """ Starts recording the phases of timestep `step` """
+        self._current = dict()
+        self._steps.append((step, self._current))
+
+    def phase(self, name):
+        """
+        Returns a context manager that records the phase `name` of the current
+        timestep.
+        """
+        return _Phase(self, name)
+
+    def record(self, name, elapsed, peak_bytes):
+        """ Adds a measurement of phase `name` to the current timestep """
+        if self._current is None:
+            self.start_step(None)
+        if name not in self._phases:
+            self._phases.append(name)
+        elapsed_total, peak_total = self._current.get(name, (0.0, None))
+        if peak_bytes is not None:
+            peak_total = peak_bytes if peak_total is None else max(peak_total, peak_bytes)
+        self._current[name] = (elapsed_total + elapsed, peak_total)
+
+    def get_profile(self):
+        """
+        Returns the measurements recorded so far.
+
+        Returns
+        --------
+            Profile: dict
+                A dictionary with two entries. `"summary"` maps each phase to
+                a dictionary with the number of timesteps in which the phase
+                ran (`"calls"`), the total, mean and maximum wall time in
+                seconds (`"total_time"`, `"mean_time"` and `"max_time"`), and
+                the largest peak of allocated bytes (`"peak_bytes"`, or None
+                if memory was not traced). `"steps"` is a table with one row
+                per timestep, as a dictionary of columns: `"step"`, and
+                `"<phase>_time"` and `"<phase>_peak_bytes"` for each phase
+                (NaN where the phase did not run in a timestep).
+        """
+        steps = {"step": np.array([step for step, _ in self._steps])}
+        summary = dict()
+        for name in self._phases:
+            times = np.array(
+                [records[name][0] if name in records else np.nan for _, records in self._steps]
+            )
+            peaks = np.array(
+                [
+                    records[name][1]
+                    if name in records and records[name][1] is not None
+                    else np.nan
+                    for _, records in self._steps
+                ]
+            )
+            steps[f"{name}_time"] = times
+            steps[f"{name}_peak_bytes"] = peaks
+            ran = ~np.isnan(times)
+            summary[name] = {
+                "calls": int(ran.sum()),
+                "total_time": float(times[ran].sum()),
+                "mean_time": float(times[ran].mean()) if ran.any() else 0.0,
+                "max_time": float(times[ran].max()) if ran.any() else 0.0,
+                "peak_bytes": int(np.nanmax(peaks)) if not np.isnan(peaks).all() else None,
+            }
+        return {"summary": summary, "steps": steps}
+
+
+class ProfilingModule:  # pylint: disable=too-few-public-methods
+    """
+    Mixin for models whose timesteps can be profiled.
+
+    Parameters
+    -----------
+
+        profile: bool (optional, default: False)
+            If True, each phase of each timestep is recorded by a
+            :class:`Profiler`.
+    """
+
+    def __init__(self, profile=False):
+        self._profiler = Profiler() if profile else None
+
+    def _phase(self, name):
+        """
+        Returns a context manager that times the phase `name` of the current
+        timestep if profiling is enabled, and does nothing otherwise.
+        """
+        if self._profiler is None:
+            return NULL_PHASE
+        return self._profiler.phase(name)
+
+    def get_profile(self):
+        """
+        Returns the wall time and the peak memory allocated by each phase of
+        the timesteps simulated so far by the model: `"create_and_process_items"`,
+        `"recommend"`, `"user_feedback"`, `"update_internal_state"`,
+        `"update_creators"`, `"train"` and `"measure_content"`. If
+        measurements are computed in the background, `"measure_content"`
+        only includes the time needed to hand them over. See
+        :func:`~profiling.Profiler.get_profile` for the format.
+
+        Returns
+        --------
+            Profile: dict
+
+        Raises
+        --------
+
+            ValueError
+                If the model was not created with `profile=True`.
+        """
+        if self._profiler is None:
+            raise ValueError("Profiling is not enabled")
+        return self._profiler.get_profile()
@@ -2,8 +2,8 @@
 Wrappers for numpy.random.Generator and networkx random graph generators
 """
 import warnings
-import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 
 
 class Generator(np.random.Generator):  # pylint: disable=too-few-public-methods
@@ -53,7 +53,8 @@ class SocialGraphGenerator:  # pylint: disable=too-few-public-methods
         """
 
         **Note:** to change type of graph, please include the `graph_type`
-        parameter.
+        parameter. To obtain the adjacency matrix as a
+        :class:`scipy.sparse.csr_matrix`, include `sparse=True`.
 
         Parameters
         -----------
@@ -65,7 +66,7 @@ class SocialGraphGenerator:  # pylint: disable=too-few-public-methods
         Returns
         --------
 
-            Adjacency matrix: :obj:`numpy.ndarray`
+            Adjacency matrix: :obj:`numpy.ndarray` or :class:`scipy.sparse.csr_matrix`
                 Size `|U|x|U|`.
 
         Raises
@@ -94,9 +95,19 @@ class SocialGraphGenerator:  # pylint: disable=too-few-public-methods
         """
         if not isinstance(num, int):
             raise ValueError("num must be an integer")
+        # networkx is slow to import, so it is only loaded when needed
+        import networkx as nx  # pylint: disable=import-outside-toplevel
+
         graph_type = kwargs.pop("graph_type", None)
+        sparse = kwargs.pop("sparse", False)
         if graph_type is None:
             graph_type = nx.fast_gnp_random_graph
             kwargs["p"] = 0.5
         graph = graph_type(n=num, *args, **kwargs)
+        if sparse:
+            # networkx < 2.7 only provides to_scipy_sparse_matrix
+            to_scipy_sparse = getattr(nx, "to_scipy_sparse_array", None)
+            if to_scipy_sparse is None:
+                to_scipy_sparse = nx.to_scipy_sparse_matrix
+            return sp.csr_matrix(to_scipy_sparse(graph, format="csr", dtype=float))
         return nx.convert_matrix.to_numpy_array(graph)
@@ -1,9 +1,10 @@
 from attr import attrs
 from trecs.models import ContentFiltering
-from trecs.components import Users, Creators
+from trecs.components import Users, Creators, DeltaHistory, EveryNSteps, ExplicitSteps
 import numpy as np
 import pytest
 import test_helpers
+from trecs.metrics import InteractionMeasurement, HomogeneityMeasurement
 from trecs.matrix_ops import normalize_matrix
 
 
@@ -306,3 +307,235 @@ class TestContentFiltering:
         assert cf.items.shape == (10, 150)  # 50 new items
         assert cf.items_hat.shape == (10, 150)
         assert cf.users.state_history[-1].shape == (100, 150)
+
+    def test_float32(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        users = np.random.normal(size=(50, 20))
+        items = np.random.uniform(size=(20, 200))
+        creator_profiles = np.random.uniform(size=(10, 20))
+        models = dict()
+        for dtype in [np.float64, np.float32]:
+            models[dtype] = ContentFiltering(
+                user_representation=np.copy(users),
+                item_representation=np.copy(items),
+                creators=Creators(creator_profiles, creation_probability=1.0, seed=seed),
+                dtype=dtype,
+                seed=seed,
+            )
+        single = models[np.float32]
+        assert single.users_hat.dtype == np.float32
+        assert single.items_hat.dtype == np.float32
+        assert single.predicted_scores.dtype == np.float32
+        assert single.users.actual_user_profiles.dtype == np.float32
+        assert single.users.get_actual_user_scores().dtype == np.float32
+        for model in models.values():
+            model.run(1, no_new_items=True)
+        # top-k items of both models only differ among items whose scores are
+        # within the documented tolerance of each other
+        scores = np.asarray(models[np.float64].predicted_scores)
+        top_k = models[np.float64].generate_recommendations(k=10)
+        top_k_single = models[np.float32].generate_recommendations(k=10)
+        tol = 1e-6 * np.abs(scores).max()
+        np.testing.assert_allclose(
+            np.take_along_axis(scores, top_k_single, axis=1),
+            np.take_along_axis(scores, top_k, axis=1),
+            rtol=0,
+            atol=tol,
+        )
+        single.run(1)
+        assert single.items.shape == (20, 210)
+        assert single.items_hat.dtype == np.float32
+        assert single.predicted_scores.dtype == np.float32
+        assert single.users.get_actual_user_scores().dtype == np.float32
+
+    def test_checkpoint(self, tmp_path, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        creator_profiles = np.random.uniform(size=(10, 20))
+
+        def make_model():
+            return ContentFiltering(
+                num_users=30,
+                num_items=100,
+                num_attributes=20,
+                creators=Creators(creator_profiles, creation_probability=0.5, seed=seed),
+                record_base_state=True,
+                seed=seed,
+            )
+
+        uninterrupted = make_model()
+        uninterrupted.run(timesteps=6, repeated_items=False)
+        interrupted = make_model()
+        interrupted.run(timesteps=3, repeated_items=False)
+        interrupted.save_checkpoint(tmp_path)
+        resumed = make_model()
+        resumed.load_checkpoint(tmp_path)
+        # the arrays are memory-mapped rather than read into memory
+        base = resumed.users_hat
+        while isinstance(base, np.ndarray) and not isinstance(base, np.memmap):
+            base = base.base
+        assert isinstance(base, np.memmap)
+        test_helpers.assert_equal_arrays(resumed.users_hat, interrupted.users_hat)
+        resumed.run(timesteps=3, repeated_items=False)
+        # the checkpoint itself is not modified
+        test_helpers.assert_equal_arrays(np.load(tmp_path / "users_hat.npy"), interrupted.users_hat)
+        test_helpers.assert_equal_arrays(resumed.items, uninterrupted.items)
+        test_helpers.assert_equal_arrays(resumed.users_hat, uninterrupted.users_hat)
+        test_helpers.assert_equal_arrays(resumed.predicted_scores, uninterrupted.predicted_scores)
+        test_helpers.assert_equal_measurements(
+            resumed.get_measurements(), uninterrupted.get_measurements()
+        )
+        test_helpers.assert_equal_system_state(
+            resumed.get_system_state(), uninterrupted.get_system_state()
+        )
+
+    def test_history_dir(self, tmp_path, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        models = [
+            ContentFiltering(num_users=30, num_items=50, record_base_state=True, seed=seed),
+            ContentFiltering(
+                num_users=30,
+                num_items=50,
+                record_base_state=True,
+                history_dir=tmp_path,
+                seed=seed,
+            ),
+        ]
+        for model in models:
+            model.run(timesteps=3)
+        assert (tmp_path / "system_state" / "predicted_user_scores").is_dir()
+        assert (tmp_path / "measurements" / "mse").is_dir()
+        state = models[1].get_system_state()
+        assert isinstance(state["predicted_user_scores"][-1], np.memmap)
+        test_helpers.assert_equal_system_state(models[0].get_system_state(), state)
+        test_helpers.assert_equal_measurements(
+            models[0].get_measurements(), models[1].get_measurements()
+        )
+
+    def test_history_keyframe_interval(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        models = [
+            ContentFiltering(num_users=30, num_items=50, record_base_state=True, seed=seed),
+            ContentFiltering(
+                num_users=30,
+                num_items=50,
+                record_base_state=True,
+                history_keyframe_interval=3,
+                seed=seed,
+            ),
+        ]
+        for model in models:
+            model.run(timesteps=7)
+        assert isinstance(models[1].predicted_scores.state_history, DeltaHistory)
+        test_helpers.assert_equal_system_state(
+            models[0].get_system_state(), models[1].get_system_state()
+        )
+        test_helpers.assert_equal_measurements(
+            models[0].get_measurements(), models[1].get_measurements()
+        )
+        with pytest.raises(ValueError):
+            ContentFiltering(history_dir="history", history_keyframe_interval=3)
+
+    def test_async_measurements(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        models = [
+            ContentFiltering(num_users=30, num_items=50, seed=seed),
+            ContentFiltering(
+                num_users=30,
+                num_items=50,
+                async_measurements=True,
+                max_pending_measurements=2,
+                seed=seed,
+            ),
+        ]
+        for model in models:
+            model.add_metrics(InteractionMeasurement(), HomogeneityMeasurement())
+            model.startup_and_train(timesteps=5)
+            model.run(timesteps=10)
+        # histograms are compared one by one
+        test_helpers.assert_equal_system_state(
+            models[0].get_measurements(), models[1].get_measurements()
+        )
+
+    def test_profile(self):
+        model = ContentFiltering(num_users=30, num_items=50, profile=True)
+        model.startup_and_train(timesteps=2)
+        model.run(timesteps=3)
+        profile = model.get_profile()
+        np.testing.assert_array_equal(profile["steps"]["step"], np.arange(1, 6))
+        assert profile["summary"]["recommend"]["calls"] == 5
+        assert profile["summary"]["train"]["calls"] == 3
+        assert np.isnan(profile["steps"]["train_time"][:2]).all()
+        assert profile["summary"]["user_feedback"]["total_time"] > 0
+        # the scores are |U|x|I| floats
+        assert profile["summary"]["train"]["peak_bytes"] >= 30 * 50 * 8
+        with pytest.raises(ValueError):
+            ContentFiltering().get_profile()
+
+    def test_probabilistic_recommendations(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        models = [
+            ContentFiltering(
+                num_users=30, num_items=50, probabilistic_recommendations=True, seed=seed
+            )
+            for _ in range(2)
+        ]
+        recommendations = list()
+        for model in models:
+            # the global random state does not affect the model
+            np.random.seed(None)
+            model.run(timesteps=3, repeated_items=False)
+            recommendations.append(model.recommend())
+        test_helpers.assert_equal_arrays(recommendations[0], recommendations[1])
+        test_helpers.assert_equal_measurements(
+            models[0].get_measurements(), models[1].get_measurements()
+        )
+        # users get different samples
+        assert len({tuple(row) for row in recommendations[0]}) > 1
+
+    def test_random_items_are_distinct(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        model = ContentFiltering(num_users=30, num_items=50, num_items_per_iter=10, seed=seed)
+        items = model.recommend(random_items_per_iter=8)
+        assert all(len(set(row)) == 10 for row in items)
+        model.run(timesteps=4, startup=True, repeated_items=False)
+        items = model.recommend(startup=True, repeated_items=False)
+        assert all(len(set(row)) == 10 for row in items)
+        consumed = model.consumed_items.to_mask()
+        assert not np.take_along_axis(consumed, items, axis=1).any()
+
+    def test_recording_schedule(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        models = [
+            ContentFiltering(num_users=30, num_items=50, record_base_state=True, seed=seed),
+            ContentFiltering(
+                num_users=30,
+                num_items=50,
+                record_base_state=True,
+                recording_schedule=EveryNSteps(4),
+                seed=seed,
+            ),
+        ]
+        models[1].users_hat.set_schedule(ExplicitSteps([2, 9]))
+        for model in models:
+            model.startup_and_train(timesteps=3)
+            model.run(timesteps=7)
+        measurements = models[1].get_measurements()
+        np.testing.assert_array_equal(measurements["timesteps"], [0, 3, 4, 8, 10])
+        full_measurements = models[0].get_measurements()
+        np.testing.assert_array_equal(full_measurements["timesteps"], np.arange(11))
+        for step, mse in zip(measurements["timesteps"][1:], measurements["mse"][1:]):
+            np.testing.assert_almost_equal(mse, full_measurements["mse"][step])
+        state = models[1].get_system_state()
+        np.testing.assert_array_equal(state["predicted_user_profiles_timesteps"], [0, 2, 9])
+        np.testing.assert_array_equal(
+            state["predicted_user_profiles"][-1],
+            models[0].get_system_state()["predicted_user_profiles"][9],
+        )
@@ -164,3 +164,16 @@ class TestPopularityRecommender:
         assert p.items.shape[1] == 150  # 50 new items
         assert p.items_hat.shape[1] == 150
         assert p.users.state_history[-1].shape[1] == 150
+
+    def test_incremental_train(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        creator_profiles = np.random.uniform(size=(20, 1))
+        s1 = PopularityRecommender(seed=seed, creators=Creators(creator_profiles, seed=seed))
+        s2 = PopularityRecommender(
+            seed=seed, creators=Creators(creator_profiles, seed=seed), incremental_train=True
+        )
+        s1.run(timesteps=5)
+        s2.run(timesteps=5)
+        test_helpers.assert_equal_arrays(s1.predicted_scores, s2.predicted_scores)
+        test_helpers.assert_equal_measurements(s1.get_measurements(), s2.get_measurements())
@@ -1,7 +1,9 @@
 import test_helpers
 import numpy as np
+import scipy.sparse as sp
 from trecs.models import SocialFiltering
-from trecs.components import Creators
+from trecs.components import Creators, Items, PredictedUserProfiles, SparseComponent
+from trecs.random import SocialGraphGenerator
 import pytest
 
 
@@ -232,3 +234,45 @@ class TestSocialFiltering:
         assert sf.items.shape == (10, 150)  # 50 new items
         assert sf.items_hat.shape == (100, 150)
         assert sf.users.state_history[-1].shape == (100, 150)
+
+    def test_sparse_graph(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        graph = SocialGraphGenerator.generate_random_graph(num=50, p=0.1, seed=seed, sparse=True)
+        assert sp.issparse(graph)
+        items = np.zeros((50, 80), dtype=int)
+        users = np.random.normal(size=(50, 50))
+        dense = SocialFiltering(
+            user_representation=graph.toarray(),
+            item_representation=items,
+            actual_user_representation=users,
+            seed=seed,
+        )
+        sparse = SocialFiltering(
+            user_representation=graph,
+            item_representation=sp.csr_matrix(items),
+            actual_user_representation=users,
+            seed=seed,
+            record_base_state=True,
+        )
+        assert isinstance(sparse.users_hat, SparseComponent)
+        assert isinstance(sparse.items_hat, SparseComponent)
+        # sparse components keep their type
+        assert isinstance(sparse.users_hat, PredictedUserProfiles)
+        assert isinstance(sparse.items_hat, Items)
+        dense.run(timesteps=5)
+        sparse.run(timesteps=5)
+        test_helpers.assert_equal_arrays(dense.items_hat, sparse.items_hat.toarray())
+        np.testing.assert_array_almost_equal(dense.predicted_scores, sparse.predicted_scores)
+        assert sp.issparse(sparse.get_system_state()["predicted_user_profiles"][-1])
+
+        # following and unfollowing keeps the graph sparse
+        user, following = 0, 1
+        sparse.unfollow(user, following)
+        nnz = sparse.users_hat.nnz
+        sparse.follow(user, following)
+        test_helpers.assert_social_graph_following(sparse.users_hat, user, following)
+        assert sparse.users_hat.nnz == nnz + 1
+        sparse.unfollow(user, following)
+        test_helpers.assert_social_graph_not_following(sparse.users_hat, user, following)
+        assert sparse.users_hat.nnz == nnz
@@ -1,5 +1,6 @@
 import numpy as np
 from trecs.components import Users, DNUsers
+from trecs.components.users import ActualUserProfiles
 from trecs.models import ContentFiltering
 import test_helpers
 import pytest
@@ -82,6 +83,43 @@ class TestUsers:
         with pytest.raises(AssertionError):
             test_helpers.assert_equal_arrays(shown_scores, dn_utilities)
 
+    def test_dn_errors(self, seed=None):
+        users = DNUsers(size=(10, 3), seed=seed)
+        eps = users.sample_from_error_dist(4, 200000)
+        assert eps.shape == (4, 200000)
+        expected_cov = np.full((4, 4), 0.5) + 0.5 * np.eye(4)
+        np.testing.assert_allclose(np.cov(eps), expected_cov, atol=0.02)
+        # general covariance matrices are factorized once
+        cov = np.array([[2.0, 0.3, 0.0], [0.3, 1.0, -0.2], [0.0, -0.2, 0.5]])
+        users = DNUsers(size=(10, 3), seed=seed, error_cov=cov)
+        eps = users.sample_from_error_dist(3, 200000)
+        np.testing.assert_allclose(np.cov(eps), cov, atol=0.03)
+        with pytest.raises(ValueError):
+            users.sample_from_error_dist(4, 10)
+        # the covariance matrix is copied, so modifying it in place has no effect
+        cov[0, 0] = 100
+        assert users.error_cov[0, 0] == 2
+        with pytest.raises(ValueError):
+            users.error_cov[0, 0] = 100
+        users.error_cov = cov
+        eps = users.sample_from_error_dist(3, 200000)
+        np.testing.assert_allclose(np.cov(eps), cov, rtol=0.03, atol=0.03)
+
+    def test_dn_float32(self, seed=None):
+        users = DNUsers(size=(10, 3), seed=seed, dtype=np.float32)
+        assert users.actual_user_profiles.dtype == np.float32
+        assert users.sample_from_error_dist(4, 10).dtype == np.float32
+        users.compute_user_scores(np.random.uniform(size=(3, 20)))
+        assert users.actual_user_scores.dtype == np.float32
+        items_shown = np.tile(np.arange(5), (10, 1))
+        scores = users.actual_user_scores[:, :5]
+        assert users.calc_dn_utilities(scores).dtype == np.float32
+        feedback = users.get_user_feedback(items_shown=items_shown)
+        assert feedback.shape == (10,)
+        cov = np.eye(5) + 0.1
+        users = DNUsers(size=(10, 3), seed=seed, dtype=np.float32, error_cov=cov)
+        assert users.sample_from_error_dist(5, 10).dtype == np.float32
+
     def test_value_normalization(self):
         users = DNUsers(np.array([[0, 1, 2, 3, 4]]), sigma=0.05, omega=0.25, beta=0.9)
         items = np.arange(20).reshape(5, 4)
@@ -115,3 +153,79 @@ class TestUsers:
         users.compute_user_scores(items)
         feedback = users.get_user_feedback(items_shown=items_shown)
         np.testing.assert_array_equal(feedback, np.ones(num_users))
+
+    def test_feedback_reuses_buffers(self):
+        users = Users(size=(6, 4), seed=1)
+        items = np.random.uniform(size=(4, 10))
+        users.compute_user_scores(items)
+        items_shown = np.random.randint(10, size=(6, 5))
+        scores = users.actual_user_scores[np.arange(6)[:, np.newaxis], items_shown]
+        expected = items_shown[np.arange(6), scores.argmax(axis=1)]
+        for _ in range(2):
+            feedback = users.get_user_feedback(items_shown=items_shown)
+            np.testing.assert_array_equal(feedback, expected)
+        # the number of items shown can change between calls
+        feedback = users.get_user_feedback(items_shown=items_shown[:, :2])
+        np.testing.assert_array_equal(
+            feedback, items_shown[np.arange(6), scores[:, :2].argmax(axis=1)]
+        )
+        # scores that are a view of a wider buffer are gathered into the buffers too
+        wide = np.random.uniform(size=(6, 16))
+        users.actual_user_scores = wide[:, :10]
+        scores = wide[np.arange(6)[:, np.newaxis], items_shown]
+        gathered = users._scores_of_items_shown(items_shown)  # pylint: disable=protected-access
+        np.testing.assert_array_equal(gathered, scores)
+        buffers = users._feedback_buffers  # pylint: disable=protected-access
+        assert gathered is buffers[1]
+        # ties are broken in favor of the item shown last
+        users.compute_user_scores(np.ones((4, 10)))
+        feedback = users.get_user_feedback(items_shown=np.tile([3, 5, 7, 1], (6, 1)))
+        np.testing.assert_array_equal(feedback, np.full(6, 1))
+        # integer scores are multiplied by the attention coefficients
+        scores = np.array([[1, 3, 2], [2, 1, 0]])
+        users = Users(actual_user_profiles=np.ones((2, 4)), actual_user_scores=scores)
+        users.attention_exp = -1
+        feedback = users.get_user_feedback(items_shown=np.array([[0, 1, 2], [0, 1, 2]]))
+        np.testing.assert_array_equal(feedback, [1, 0])
+
+    def test_lazy_scores(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(100000)
+        items = np.random.uniform(size=(5, 30))
+        items_shown = np.random.randint(30, size=(10, 4))
+        eager = Users(size=(10, 5), drift=0.2, seed=seed)
+        lazy = Users(size=(10, 5), drift=0.2, seed=seed, lazy_scores=True)
+        for users in (eager, lazy):
+            users.compute_user_scores(items)
+        for _ in range(3):
+            feedback = eager.get_user_feedback(items_shown=items_shown, item_attributes=items)
+            lazy_feedback = lazy.get_user_feedback(items_shown=items_shown, item_attributes=items)
+            np.testing.assert_array_equal(feedback, lazy_feedback)
+        # the full matrix is only computed when it is read
+        assert lazy._pending_items is not None  # pylint: disable=protected-access
+        np.testing.assert_allclose(lazy.actual_user_scores, eager.actual_user_scores)
+        assert lazy._pending_items is None  # pylint: disable=protected-access
+        assert len(lazy.state_history) < len(eager.state_history)
+
+    def test_drift_in_place(self, seed=None):
+        users = Users(size=(10, 4), drift=0.5, seed=seed)
+        profiles = users.actual_user_profiles
+        norms = np.linalg.norm(profiles, axis=1)
+        items = np.random.uniform(size=(4, 6))
+        # the first user is shown an item in the opposite direction
+        items[:, 0] = -profiles[0]
+        users.compute_user_scores(items)
+        items_shown = np.zeros((10, 1), dtype=int)
+        users.get_user_feedback(items_shown=items_shown, item_attributes=items)
+        assert users.actual_user_profiles is profiles
+        assert isinstance(users.actual_user_profiles, ActualUserProfiles)
+        assert np.isfinite(profiles).all()
+        np.testing.assert_allclose(np.linalg.norm(profiles, axis=1), norms)
+        # the array passed by the caller is not modified
+        initial = np.random.uniform(size=(10, 4))
+        expected = initial.copy()
+        users = Users(actual_user_profiles=initial, drift=0.5, seed=seed)
+        users.compute_user_scores(items)
+        users.get_user_feedback(items_shown=items_shown, item_attributes=items)
+        np.testing.assert_array_equal(initial, expected)
+        assert not np.allclose(users.actual_user_profiles, initial)
@@ -0,0 +1,96 @@
+from trecs.models import ContentFiltering, BatchedContentFiltering
+from trecs.metrics import InteractionMeasurement, HomogeneityMeasurement
+from trecs.components import Users, EveryNSteps
+import numpy as np
+import pytest
+import test_helpers
+
+
+def make_models(seeds, attention_exp=0.0):
+    models = list()
+    for seed in seeds:
+        users = Users(size=(20, 15), attention_exp=attention_exp, seed=seed)
+        model = ContentFiltering(
+            num_users=20,
+            num_items=60,
+            num_attributes=15,
+            actual_user_representation=users,
+            num_items_per_iter=5,
+            seed=seed,
+        )
+        model.add_metrics(InteractionMeasurement())
+        models.append(model)
+    return models
+
+
+class TestBatchedContentFiltering:
+    def test_same_as_sequential(self, seeds=None):
+        if seeds is None:
+            seeds = np.random.randint(100000, size=4)
+        for repeated_items, attention_exp in [(True, 0.0), (False, -0.8)]:
+            batch = BatchedContentFiltering(make_models(seeds, attention_exp))
+            models = make_models(seeds, attention_exp)
+            batch.run(timesteps=5, repeated_items=repeated_items)
+            for model in models:
+                model.run(timesteps=5, repeated_items=repeated_items)
+            measurements = batch.get_measurements()
+            for r, model in enumerate(models):
+                np.testing.assert_allclose(batch.users_hat[r], model.users_hat)
+                np.testing.assert_allclose(batch.predicted_scores[r], model.predicted_scores)
+                np.testing.assert_allclose(
+                    measurements["mse"][r][1:], model.get_measurements()["mse"][1:]
+                )
+                test_helpers.assert_equal_arrays(
+                    measurements["interaction_histogram"][r][1:],
+                    model.get_measurements()["interaction_histogram"][1:],
+                )
+                test_helpers.assert_equal_arrays(
+                    measurements["timesteps"][r], model.get_measurements()["timesteps"]
+                )
+                if not repeated_items:
+                    test_helpers.assert_equal_arrays(
+                        batch.consumed[r], model.consumed_items.to_mask()
+                    )
+
+    def test_startup(self):
+        batch = BatchedContentFiltering(make_models(range(3)), seed=1)
+        batch.startup_and_train(timesteps=4)
+        assert (batch.users_hat != 0).any(axis=2).all()
+        # the random items shown to each user are distinct
+        for repeated_items in (True, False):
+            shown = np.sort(batch.recommend(startup=True, repeated_items=repeated_items), axis=2)
+            assert (shown[:, :, 1:] != shown[:, :, :-1]).all()
+        batch.run(timesteps=3, repeated_items=False)
+        # each user interacted with 3 different items
+        np.testing.assert_array_equal(batch.consumed.sum(axis=2), 3)
+        with pytest.raises(ValueError):
+            batch.generate_recommendations(k=58, mask=batch.consumed)
+
+    def test_unsupported(self):
+        with pytest.raises(ValueError):
+            BatchedContentFiltering([])
+        with pytest.raises(ValueError):
+            BatchedContentFiltering(
+                [ContentFiltering(num_users=5), ContentFiltering(num_users=6)]
+            )
+        model = ContentFiltering()
+        model.add_metrics(HomogeneityMeasurement())
+        with pytest.raises(ValueError):
+            BatchedContentFiltering([model])
+        with pytest.raises(ValueError):
+            BatchedContentFiltering([ContentFiltering(recording_schedule=EveryNSteps(2))])
+        model = ContentFiltering()
+        model.metrics[0].set_schedule(EveryNSteps(2))
+        with pytest.raises(ValueError):
+            BatchedContentFiltering([model])
+
+    def test_dtype(self):
+        models = [ContentFiltering(num_users=10, seed=seed, dtype=np.float32) for seed in range(2)]
+        batch = BatchedContentFiltering(models, seed=1)
+        batch.startup_and_train(timesteps=2)
+        assert batch.predicted_scores.dtype == np.float32
+        expected = [
+            np.asarray(model.score_fn(u, i))
+            for model, u, i in zip(models, batch.users_hat, batch.items_hat)
+        ]
+        np.testing.assert_allclose(batch.predicted_scores, expected, rtol=1e-5)
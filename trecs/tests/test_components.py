@@ -1,6 +1,21 @@
 from trecs.models.recommender import SystemStateModule
-from trecs.components import PredictedUserProfiles
+from trecs.components import (
+    PredictedUserProfiles,
+    ConsumedItems,
+    Items,
+    DeltaHistory,
+    DiskHistory,
+    EveryNSteps,
+    ExplicitSteps,
+    LogSpacedSteps,
+    SparseComponent,
+    append_columns,
+)
+from trecs.matrix_ops import inner_product, normalize_matrix, slerp
+import pickle
 import numpy as np
+import scipy.sparse as sp
+import pytest
 
 
 class TestComponents:
@@ -20,11 +35,223 @@ class TestComponents:
         np.testing.assert_array_equal(profiles.state_history[1], 1 * np.ones((5, 5)))
         np.testing.assert_array_equal(profiles.state_history[2], 2 * np.ones((5, 5)))
 
-    def test_closed_logger(self):
+    def test_normalized_rows_cache(self):
+        values = np.random.uniform(size=(6, 3))
+        profiles = PredictedUserProfiles(values.copy())
+        normalized = profiles.normalized_rows()
+        np.testing.assert_allclose(normalized, normalize_matrix(values))
+        assert not normalized.flags.writeable
+        # unchanged profiles are not normalized again
+        assert np.shares_memory(profiles.normalized_rows(), normalized)
+        # assigning rows only renormalizes those rows
+        profiles[[1, 4], :] = values[[1, 4]] * 3 + 1
+        assert list(profiles._stale_rows) == [1, 4]  # pylint: disable=protected-access
+        np.testing.assert_allclose(profiles.normalized_rows(), normalize_matrix(profiles))
+        values = np.array(profiles) + 2
+        profiles += 2
+        np.testing.assert_allclose(profiles.normalized_rows(), normalize_matrix(values))
+        # derived arrays do not share the cache
+        assert profiles[:3].normalized_rows() is None
+        items = np.random.uniform(size=(3, 4))
+        np.testing.assert_allclose(inner_product(profiles, items), inner_product(values, items))
+
+        # writes through views, `out` arguments and ufunc.at are detected
+        writes = [
+            lambda: profiles[2].__setitem__(0, 7.0),
+            lambda: profiles[1:3].__imul__(-2),
+            lambda: np.add(profiles, 1, out=profiles),
+            lambda: np.add.at(profiles, ([0, 0], [1, 2]), 5),
+            lambda: slerp(profiles, np.ones((6, 3)), perc=0.5, out=profiles),
+        ]
+        for write in writes:
+            profiles.normalized_rows()
+            write()
+            np.testing.assert_allclose(profiles.normalized_rows(), normalize_matrix(profiles))
+        # writes that bypass the component must be followed by invalidate_norms
+        np.asarray(profiles)[3] = 1
+        profiles.invalidate_norms()
+        np.testing.assert_allclose(profiles.normalized_rows(), normalize_matrix(profiles))
+        assert type(profiles + 1) is PredictedUserProfiles
+
+    def test_sparse_normalized_rows_cache(self):
+        graph = sp.random(6, 6, density=0.5, format="csr", random_state=1)
+        profiles = PredictedUserProfiles(graph)
+        normalized = profiles.normalized_rows()
+        assert sp.issparse(normalized)
+        np.testing.assert_allclose(normalized.toarray(), normalize_matrix(graph.toarray()))
+        assert profiles.normalized_rows() is normalized
+        profiles[0, 0] = 3
+        profiles += sp.eye(6, format="csr")
+        expected = normalize_matrix(profiles.toarray())
+        np.testing.assert_allclose(profiles.normalized_rows().toarray(), expected)
+
+    def test_sparse_components(self):
+        graph = sp.random(6, 6, density=0.3, format="csr", random_state=0)
+        profiles = PredictedUserProfiles(graph)
+        items = Items(sp.csr_matrix(np.eye(6)))
+        assert isinstance(profiles, PredictedUserProfiles)
+        assert isinstance(profiles, SparseComponent)
+        assert isinstance(items, Items)
+        assert not isinstance(items, PredictedUserProfiles)
+        assert profiles.name == "predicted_user_profiles"
+        # the sparse counterpart of each class is created once
+        assert type(PredictedUserProfiles(graph)) is type(profiles)
+        copy = pickle.loads(pickle.dumps(profiles))
+        assert type(copy) is type(profiles)
+        assert copy.name == profiles.name
+        np.testing.assert_array_equal(copy.toarray(), graph.toarray())
+
+    def test_logging(self):
+        profiles = PredictedUserProfiles(np.zeros((5, 5)))
+        # non-verbose objects and their views never create a logger
+        assert profiles._logger is None  # pylint: disable=protected-access
+        assert not profiles[:2].is_verbose()
+        assert "verbose" not in vars(profiles[:2])
+        verbose = [PredictedUserProfiles(np.zeros((5, 5)), verbose=True) for _ in range(10)]
+        # verbose objects share a single handler
+        logger = verbose[0]._logger.logger  # pylint: disable=protected-access
+        assert len(logger.handlers) == 1
+        assert all(profiles.is_verbose() for profiles in verbose)
+        verbose[0].close()
+        assert not verbose[0].is_verbose()
+        assert verbose[1].is_verbose()
+
+    def test_consumed_items(self):
+        consumed = ConsumedItems(num_users=4, num_items=10)
+        assert consumed.bits.shape == (4, 2)
+        consumed.mark(np.arange(4), np.array([0, 3, 9, 3]))
+        consumed.mark(np.arange(4), np.array([0, 5, 8, 3]))  # repeated interactions
+        mask = consumed.to_mask()
+        assert mask.shape == (4, 10)
+        assert mask.sum() == 6
+        np.testing.assert_array_equal(np.where(mask[1])[0], [3, 5])
+        np.testing.assert_array_equal(consumed.num_consumed, mask.sum(axis=1))
+
+        # the bitset can be used as a mask without being unpacked
+        np.testing.assert_array_equal(consumed.sum(axis=1), mask.sum(axis=1))
+        np.testing.assert_array_equal(consumed[[1, 2]], mask[[1, 2]])
+        users, items = np.arange(4)[:, np.newaxis], np.array([[3, 5, 9]])
+        np.testing.assert_array_equal(consumed[users, items], mask[users, items])
+        scores = np.random.uniform(size=(4, 10))
+        masked = consumed.mask_scores(scores)
+        np.testing.assert_array_equal(masked, np.where(mask, -np.inf, scores))
+        assert consumed.mask_scores(scores) is masked  # the buffer is reused
+
+        # new items are added as unconsumed
+        consumed.add_items(7)
+        assert consumed.bits.shape == (4, 3)
+        assert consumed.to_mask().shape == (4, 17)
+        assert consumed.to_mask()[:, 10:].sum() == 0
+
+    def test_append_columns(self):
+        items = Items(np.ones((3, 4)))
+        grown = append_columns(items, np.zeros((3, 2)))
+        assert isinstance(grown, Items)
+        assert grown.state_history is items.state_history
+        np.testing.assert_array_equal(grown, np.hstack([np.ones((3, 4)), np.zeros((3, 2))]))
+        buffers = set()
+        for i in range(100):
+            previous = grown
+            grown = append_columns(grown, np.full((3, 1), i))
+            buffers.add(id(grown.base))
+            # old views are never modified
+            assert previous.shape[1] == grown.shape[1] - 1
+            np.testing.assert_array_equal(grown[:, :-1], previous)
+            np.testing.assert_array_equal(grown[:, -1], i)
+        # the capacity is doubled, so the buffer is rarely reallocated
+        assert len(buffers) <= 5
+        assert grown.base.shape[1] >= grown.shape[1]
+        # appending to a view that is no longer the active one makes a copy
+        branch = append_columns(previous, np.full((3, 1), -1))
+        np.testing.assert_array_equal(branch[:, -1], -1)
+        np.testing.assert_array_equal(grown[:, -1], 99)
+        # the type is promoted as with np.hstack
+        assert append_columns(np.zeros((2, 2), dtype=int), np.ones((2, 1))).dtype == float
+
+    def test_disk_history(self, tmp_path):
         profiles = PredictedUserProfiles(np.zeros((5, 5)))
-        logger = profiles._logger.logger  # pylint: disable=protected-access
-        handler = profiles._logger.handler  # pylint: disable=protected-access
-        assert len(logger.handlers) > 0  # before garbage collection
-        del profiles
-        # after garbage collection, handler should be closed
-        assert handler not in logger.handlers
+        profiles.set_history(DiskHistory(tmp_path / "profiles"))
+        for i in range(3):
+            profiles += 1
+            profiles.store_state()
+        history = profiles.get_component_state()["predicted_user_profiles"]
+        assert len(history) == 4
+        assert len(list((tmp_path / "profiles").iterdir())) == 4
+        # snapshots are memory-mapped when read
+        assert isinstance(history[-1], np.memmap)
+        np.testing.assert_array_equal(history[-1], np.full((5, 5), 3))
+        np.testing.assert_array_equal(history[0], np.zeros((5, 5)))
+        # non-array values are kept in memory
+        history.append(None)
+        assert history[-1] is None
+        assert history.pop(0).sum() == 0
+        assert len(history) == 4
+
+    def test_delta_history(self):
+        rng = np.random.default_rng(1234)
+        history = DeltaHistory(keyframe_interval=4)
+        snapshots = [None, rng.random((20, 30))]
+        for _ in range(10):
+            snapshot = snapshots[-1].copy()
+            snapshot[rng.integers(20), :] += 1
+            snapshots.append(snapshot)
+        # a catalog that grows forces a keyframe
+        snapshots.append(np.hstack([snapshots[-1], np.ones((20, 5))]))
+        for snapshot in snapshots:
+            history.append(snapshot)
+        assert len(history) == len(snapshots)
+        assert history[0] is None
+        # random access and sequential access
+        for i in [5, 2, 11, 7, -1]:
+            np.testing.assert_array_equal(history[i], snapshots[i])
+        for value, snapshot in zip(history[1:], snapshots[1:]):
+            np.testing.assert_array_equal(value, snapshot)
+        # returned snapshots are copies
+        history[3][:] = 0
+        np.testing.assert_array_equal(history[3], snapshots[3])
+        full_size = sum(snapshot.nbytes for snapshot in snapshots[1:])
+        assert history.nbytes() < full_size / 2
+        # removing or replacing a snapshot keeps the following ones intact
+        del history[2]
+        del snapshots[2]
+        history[4] = snapshots[4] + 1
+        snapshots[4] = snapshots[4] + 1
+        history.insert(6, np.zeros(3))
+        snapshots.insert(6, np.zeros(3))
+        for i, snapshot in enumerate(snapshots):
+            np.testing.assert_array_equal(history[i], snapshot)
+
+    def test_delta_history_long_runs(self):
+        rng = np.random.default_rng(1234)
+        history = DeltaHistory(keyframe_interval=3000)
+        snapshots = [rng.random((5, 8))]
+        for _ in range(1200):
+            snapshot = snapshots[-1].copy()
+            snapshot[rng.integers(5), rng.integers(8)] += 1
+            snapshots.append(snapshot)
+        # appends reuse the snapshot cached by the previous append
+        for i, snapshot in enumerate(snapshots):
+            history.append(snapshot)
+            assert i == 0 or history._cache[0] == i  # pylint: disable=protected-access
+        for i in [1200, 600, 1, 1199]:
+            np.testing.assert_array_equal(history[i], snapshots[i])
+
+    def test_schedules(self):
+        every = EveryNSteps(5)
+        assert [step for step in range(1, 21) if every.records(step)] == [5, 10, 15, 20]
+        assert every.records(7, last_step=True)
+        assert not EveryNSteps(5, record_last=False).records(7, last_step=True)
+        log_spaced = LogSpacedSteps(steps_per_decade=3)
+        assert [step for step in range(1, 101) if log_spaced.records(step)] == [
+            1,
+            2,
+            5,
+            10,
+            22,
+            46,
+            100,
+        ]
+        explicit = ExplicitSteps([3, 8])
+        assert [step for step in range(1, 11) if explicit.records(step, step == 10)] == [3, 8]
+        with pytest.raises(ValueError):
+            EveryNSteps(0)
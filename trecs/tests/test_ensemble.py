@@ -0,0 +1,51 @@
+from functools import partial
+from trecs.models import ContentFiltering, Ensemble
+import numpy as np
+import pytest
+import test_helpers
+
+
+def small_model(seed):
+    return ContentFiltering(num_users=20, num_items=50, seed=seed, record_base_state=True)
+
+
+class TestEnsemble:
+    def test_ordered_results(self):
+        seeds = [3, 1, 3]
+        ensemble = Ensemble(small_model, seeds, timesteps=3, startup_timesteps=2, max_workers=2)
+        ensemble.run()
+        measurements = ensemble.get_measurements()
+        assert len(measurements["mse"]) == 3
+        # results only depend on the seed
+        test_helpers.assert_equal_arrays(measurements["mse"][0], measurements["mse"][2])
+        state = ensemble.get_system_state()
+        test_helpers.assert_equal_system_state(ensemble.system_states[0], ensemble.system_states[2])
+        assert len(state["predicted_user_scores"]) == 3
+
+        # same results as a sequential run
+        sequential = Ensemble(small_model, seeds, timesteps=3, startup_timesteps=2, max_workers=1)
+        global_state = np.random.get_state()[1].copy()
+        sequential.run()
+        # the global random state is left alone
+        test_helpers.assert_equal_arrays(np.random.get_state()[1], global_state)
+        for parallel_meas, sequential_meas in zip(ensemble.measurements, sequential.measurements):
+            test_helpers.assert_equal_measurements(parallel_meas, sequential_meas)
+
+    def test_factory(self):
+        factory = partial(ContentFiltering, num_users=10, num_items=20)
+        ensemble = Ensemble(
+            factory, seeds=range(4), timesteps=2, run_kwargs={"repeated_items": False}
+        )
+        assert ensemble.max_workers <= 4
+        ensemble.run()
+        assert len(ensemble.get_measurements()["mse"]) == 4
+        with pytest.raises(ValueError):
+            ensemble.get_system_state()
+
+    def test_invalid_arguments(self):
+        with pytest.raises(TypeError):
+            Ensemble(None, seeds=[1])
+        with pytest.raises(ValueError):
+            Ensemble(small_model, seeds=[])
+        with pytest.raises(ValueError):
+            Ensemble(small_model, seeds=[1]).get_measurements()
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+# optional dependencies that are slow to import and only needed by some models
+HEAVY_MODULES = ("lenskit", "pandas", "networkx", "numba")
+
+
+def loaded_modules(statement):
+    """ Returns the heavy modules loaded by `statement` in a fresh interpreter """
+    code = (
+        f"import sys\n{statement}\n"
+        f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return set(filter(None, output.strip().split(",")))
+
+
+class TestImports:
+    def test_import_is_light(self):
+        assert loaded_modules("import trecs") == set()
+        assert loaded_modules("from trecs.models import ContentFiltering, ImplicitMF") == set()
+
+    def test_loaded_when_needed(self):
+        assert "networkx" in loaded_modules(
+            "from trecs.models import SocialFiltering; SocialFiltering(num_users=5, num_items=5)"
+        )
+        assert "pandas" in loaded_modules("from trecs.models import ImplicitMF; ImplicitMF()")
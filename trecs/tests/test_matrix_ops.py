@@ -1,6 +1,17 @@
 import numpy as np
+import pytest
+import scipy.sparse as sp
 import test_helpers
-from trecs.matrix_ops import normalize_matrix, contains_row, slerp
+from trecs.matrix_ops import (
+    normalize_matrix,
+    contains_row,
+    slerp,
+    top_k_indices,
+    rank_weighted_sample,
+    sample_without_replacement,
+    inner_product,
+    blocked_inner_product,
+)
 
 
 class TestMatrixOps:
@@ -20,12 +31,125 @@ class TestMatrixOps:
         normalized = normalize_matrix(mat_3, axis=1)
         assert (np.linalg.norm(normalized, axis=1) == 1).all()
 
+    def test_blocked_inner_product(self):
+        users = np.random.normal(size=(30, 8))
+        users[3, :] = 0  # zero vectors are not normalized
+        items = np.random.normal(size=(8, 50))
+        for normalize_users in [True, False]:
+            for normalize_items in [True, False]:
+                expected = inner_product(users, items, normalize_users, normalize_items)
+                for budget, item_block_size in [(8, None), (8 * 50 * 4, None), (800, 7)]:
+                    scores = blocked_inner_product(
+                        users,
+                        items,
+                        normalize_users=normalize_users,
+                        normalize_items=normalize_items,
+                        memory_budget=budget,
+                        item_block_size=item_block_size,
+                    )
+                    np.testing.assert_array_almost_equal(scores, expected)
+
+        # scores are written in the buffer passed in
+        out = np.zeros((30, 50))
+        scores = blocked_inner_product(users, items, out=out, memory_budget=800)
+        assert scores is out
+        np.testing.assert_array_almost_equal(out, inner_product(users, items))
+        with pytest.raises(ValueError):
+            blocked_inner_product(users, items, out=np.zeros((30, 49)))
+
+    def test_sparse_inner_product(self):
+        users = sp.random(30, 40, density=0.1, format="csr")
+        items = np.random.normal(size=(40, 50))
+        for normalize_users in [True, False]:
+            for normalize_items in [True, False]:
+                expected = inner_product(users.toarray(), items, normalize_users, normalize_items)
+                scores = inner_product(users, items, normalize_users, normalize_items)
+                assert isinstance(scores, np.ndarray)
+                np.testing.assert_array_almost_equal(scores, expected)
+                scores = blocked_inner_product(
+                    users,
+                    sp.csr_matrix(items),
+                    normalize_users=normalize_users,
+                    normalize_items=normalize_items,
+                    memory_budget=800,
+                )
+                np.testing.assert_array_almost_equal(scores, expected)
+        normalized = normalize_matrix(users)
+        assert sp.issparse(normalized)
+        np.testing.assert_array_almost_equal(
+            normalized.toarray(), normalize_matrix(users.toarray())
+        )
+
     def test_normalize_vector(self):
         vec = np.array([3, 4])
         unit_vec = normalize_matrix(vec)
         correct_unit_vec = np.array([[3 / 5, 4 / 5]])
         test_helpers.assert_equal_arrays(unit_vec, correct_unit_vec)
 
+    def test_top_k_indices(self):
+        mat = np.random.uniform(size=(20, 100))
+        for k in [1, 5, 99, 100]:
+            expected = np.fliplr(mat.argsort(kind="stable")[:, -k:])
+            test_helpers.assert_equal_arrays(top_k_indices(mat, k), expected)
+
+        # ties are broken in favor of the higher column index, including when
+        # the tied values straddle the k-th position
+        mat = np.random.randint(3, size=(20, 100))
+        mat[0, :] = 0
+        for k in [1, 5, 49, 50, 70]:
+            expected = np.fliplr(mat.argsort(kind="stable")[:, -k:])
+            test_helpers.assert_equal_arrays(top_k_indices(mat, k), expected)
+
+        vec = np.array([3, 1, 4, 1, 5])
+        test_helpers.assert_equal_arrays(top_k_indices(vec, 2), np.array([[4, 2]]))
+        assert top_k_indices(vec, 0).shape == (1, 0)
+
+    def test_rank_weighted_sample(self):
+        mat = np.random.uniform(size=(50, 1000))
+        mask = np.random.uniform(size=mat.shape) < 0.5
+        picks = rank_weighted_sample(mat, 10, np.random.default_rng(1), mask=mask)
+        assert picks.shape == (50, 10)
+        assert not np.take_along_axis(mask, picks, axis=1).any()
+        assert all(len(set(row)) == 10 for row in picks)
+        # reproducible with the same generator, independent across rows
+        same = rank_weighted_sample(mat, 10, np.random.default_rng(1), mask=mask)
+        test_helpers.assert_equal_arrays(picks, same)
+        ranks = np.fliplr(np.where(mask, -np.inf, mat).argsort())
+        first_ranks = (ranks == picks[:, :1]).argmax(axis=1)
+        assert len(set(first_ranks)) > 1
+
+        # the first pick follows the rank-based weights 2^(-(n/10) j/(n-1))
+        num_rows, num_cols = 20000, 10
+        mat = np.tile(np.arange(num_cols)[::-1], (num_rows, 1))
+        picks = rank_weighted_sample(mat, 3, np.random.default_rng(2))
+        weights = 2.0 ** (-np.arange(num_cols) / (num_cols - 1))
+        frequencies = np.bincount(picks[:, 0], minlength=num_cols) / num_rows
+        np.testing.assert_allclose(frequencies, weights / weights.sum(), atol=0.01)
+
+    def test_sample_without_replacement(self):
+        rng = np.random.default_rng(3)
+        exclude = rng.integers(100, size=(200, 10))
+        mask = rng.uniform(size=(200, 100)) < 0.3
+        # most rows are rejection-sampled, the last ones have few columns left
+        mask[-5:, :80] = True
+        samples = sample_without_replacement(200, 100, 8, rng, exclude=exclude, mask=mask)
+        assert samples.shape == (200, 8)
+        assert all(len(set(row)) == 8 for row in samples)
+        assert not np.take_along_axis(mask, samples, axis=1).any()
+        assert not (samples[:, :, np.newaxis] == exclude[:, np.newaxis, :]).any()
+        # uniform over the columns that are available
+        samples = sample_without_replacement(20000, 10, 3, rng, exclude=np.zeros((20000, 1)))
+        frequencies = np.bincount(samples.ravel(), minlength=10) / samples.size
+        np.testing.assert_allclose(frequencies, [0] + [1 / 9] * 9, atol=0.01)
+        # masked columns make up for missing available columns
+        samples = sample_without_replacement(
+            1, 5, 5, rng, mask=np.array([[True, False] * 2 + [True]])
+        )
+        assert set(samples[0][:2]) == {1, 3}
+        assert set(samples[0]) == set(range(5))
+        with pytest.raises(ValueError):
+            sample_without_replacement(1, 5, 6, rng)
+
     def test_contains_row(self):
         mat = np.arange(16).reshape((4, 4))
         assert contains_row(mat, [0, 1, 2, 3])
@@ -65,3 +189,17 @@ class TestMatrixOps:
         correct_rotation = np.array([[1, 0]])
         rotated = slerp(vec1, vec2, perc=0.5)
         test_helpers.assert_equal_arrays(rotated, correct_rotation)
+
+        # in place, with parallel, opposite and zero vectors
+        mat1 = np.array([[0.0, 2.0], [3.0, 0.0], [0.0, 0.0], [1.0, 1.0], [1.0, 1e-9]])
+        mat2 = np.array([[0.0, 5.0], [-1.0, 0.0], [1.0, 0.0], [0.0, 0.0], [1.0, -1e-9]])
+        expected_norms = np.linalg.norm(mat1, axis=1)
+        with np.errstate(all="raise"):
+            rotated = slerp(mat1, mat2, perc=0.5, out=mat1, work=np.empty_like(mat1))
+        assert rotated is mat1
+        np.testing.assert_array_almost_equal(np.linalg.norm(rotated, axis=1), expected_norms)
+        np.testing.assert_array_almost_equal(
+            rotated[[0, 2, 3, 4]], [[0, 2], [0, 0], [1, 1], [1, 0]]
+        )
+        # a quarter turn, in some direction orthogonal to the original vector
+        np.testing.assert_array_almost_equal(rotated[1] @ np.array([3.0, 0.0]), 0)
@@ -1,4 +1,6 @@
 import numpy as np
+import pytest
+from trecs.matrix_ops import blocked_inner_product, inner_product
 from trecs.models import BaseRecommender
 from trecs.components import Creators
 import test_helpers
@@ -32,12 +34,25 @@ class TestBaseRecommender:
     def test_generate_recommendations(self):
         dummy = DummyRecommender(self.users_hat, self.items_hat, self.users, self.items, 10, 50, 5)
         # recommend 5 items at this timestep
-        recs = dummy.generate_recommendations(k=5, item_indices=dummy.indices)
+        recs = dummy.generate_recommendations(k=5)
         # assert that the recommendations have dimensions
         # (number of users) x (number of items to recommend per user)
         assert recs.shape[1] == 5
         assert recs.shape[0] == 10
 
+    def test_deprecated_item_indices(self):
+        dummy = DummyRecommender(self.users_hat, self.items_hat, self.users, self.items, 10, 50, 5)
+        dummy.run(2, repeated_items=False)
+        with pytest.warns(DeprecationWarning):
+            indices = dummy.indices
+        assert (indices == -1).sum() == 20
+        test_helpers.assert_equal_arrays(indices == -1, dummy.consumed_items.to_mask())
+        # only the items that are left in item_indices can be recommended
+        unseen = np.tile(np.arange(40, 50), (10, 1))
+        with pytest.warns(DeprecationWarning):
+            recs = dummy.generate_recommendations(k=5, item_indices=unseen)
+        assert ((recs >= 40) & (recs < 50)).all()
+
     def test_interaction_indices(self):
         # show 5 items per iteration
         dummy = DummyRecommender(self.users_hat, self.items_hat, self.users, self.items, 10, 50, 5)
@@ -45,9 +60,12 @@ class TestBaseRecommender:
             dummy.run(1, repeated_items=False)  # run 1 timestep
             # check that the number of interactions is divisible by the
             # number of users
-            assert (dummy.indices == -1).sum() % dummy.num_users == 0
+            assert dummy.consumed_items.to_mask().sum() % dummy.num_users == 0
             # each user interacts with one new item
-            assert (dummy.indices == -1).sum() == (i + 1) * 10
+            assert dummy.consumed_items.to_mask().sum() == (i + 1) * 10
+            test_helpers.assert_equal_arrays(
+                dummy.consumed_items.num_consumed, np.repeat(i + 1, dummy.num_users)
+            )
 
     def test_item_order(self):
         # items should be recommended in order of increasing user-item scores
@@ -61,27 +79,39 @@ class TestBaseRecommender:
         num_users = self.users.shape[0]
         # we expect every user to be recommended: 4, 3, 2, 1, 0
         expected_rec = np.fliplr(np.tile(np.arange(5), (num_users, 1)))
-        recommended = dummy.generate_recommendations(k=5, item_indices=dummy.indices)
+        recommended = dummy.generate_recommendations(k=5)
         np.testing.assert_array_equal(recommended, expected_rec)
         recommended = dummy.recommend()
         np.testing.assert_array_equal(recommended, expected_rec)
+        # once users have interacted with item 4, the next best items are recommended
+        dummy.consumed_items.mark(dummy.users.user_vector, 4)
+        recommended = dummy.recommend(repeated_items=False)
+        np.testing.assert_array_equal(recommended[:, :4], expected_rec[:, 1:])
+        assert (recommended[:, 4] != 4).all()
 
     def test_repeated_items(self):
         # show 5 items per iteration
         dummy = DummyRecommender(self.users_hat, self.items_hat, self.users, self.items, 10, 50, 5)
         dummy.run(5, repeated_items=True)  # run 5 timesteps
         # check that no users are recorded as having interacted with items
-        assert (dummy.indices == -1).sum() == 0
+        assert dummy.consumed_items.to_mask().sum() == 0
 
-    def test_closed_logger(self):
+    def test_logger(self):
         dummy = DummyRecommender(self.users_hat, self.items_hat, self.users, self.items, 10, 50, 5)
         dummy.run(5, repeated_items=True)  # run 5 timesteps
+        # non-verbose models do not create a logger
+        assert not dummy.is_verbose()
+        assert dummy._logger is None  # pylint: disable=protected-access
+        dummy.set_verbose(True)
         logger = dummy._logger.logger  # pylint: disable=protected-access
-        handler = dummy._logger.handler  # pylint: disable=protected-access
-        assert len(logger.handlers) > 0  # before garbage collection
-        del dummy
-        # after garbage collection, handler should be closed
-        assert handler not in logger.handlers
+        handlers = list(logger.handlers)
+        other = DummyRecommender(self.users_hat, self.items_hat, self.users, self.items, 10, 50, 5)
+        other.set_verbose(True)
+        # the handler is shared by all verbose objects
+        assert logger.handlers == handlers
+        dummy.close()
+        assert not dummy.is_verbose()
+        assert other.is_verbose()
 
     def test_content_creators(self):
         # 10 content creators
@@ -99,3 +129,57 @@ class TestBaseRecommender:
         # the predicted scores normalize the user arrays before doing the dot product,
         # so instead we verify the sorted position of each item
         test_helpers.assert_equal_arrays(true_scores.argsort(), predicted_scores.argsort())
+
+    def test_incremental_train(self):
+        calls = []
+
+        def score_fn(user_profiles, item_attributes):
+            calls.append((user_profiles.shape[0], item_attributes.shape[1]))
+            return user_profiles @ item_attributes
+
+        creators = Creators(np.random.uniform(size=(10, 5)), creation_probability=1)
+        dummy = DummyRecommender(
+            self.users_hat,
+            self.items_hat,
+            self.users,
+            self.items,
+            10,
+            50,
+            5,
+            creators=creators,
+            score_fn=score_fn,
+            incremental_train=True,
+        )
+        calls.clear()
+        dummy.create_and_process_items()
+        # only the 10 new items are scored
+        assert calls == [(10, 10)]
+        # nothing changed since the last call
+        dummy.train()
+        assert calls == [(10, 10)]
+        dummy.invalidate_scores(users=[1, 3], items=[0])
+        dummy.train()
+        assert calls[1:] == [(2, 60), (10, 1)]
+        test_helpers.assert_equal_arrays(
+            dummy.predicted_scores, score_fn(dummy.users_hat, dummy.items_hat)
+        )
+
+    def test_blocked_score_fn(self):
+        dummy = DummyRecommender(
+            self.users_hat,
+            self.items_hat,
+            self.users,
+            self.items,
+            10,
+            50,
+            5,
+            score_fn=blocked_inner_product,
+        )
+        scores = dummy.predicted_scores
+        dummy.users_hat[:, :] = np.random.randint(10, size=(10, 5))
+        dummy.train()
+        # predicted scores are updated in place
+        assert dummy.predicted_scores is scores
+        np.testing.assert_array_almost_equal(
+            dummy.predicted_scores, inner_product(dummy.users_hat, dummy.items_hat)
+        )
@@ -1,5 +1,6 @@
 """Various utility functions, mainly used for input validation"""
 import numpy as np
+import scipy.sparse as sp
 
 # Common input validation functions
 def check_consistency(  # pylint: disable=too-many-arguments
@@ -154,6 +155,8 @@ def is_array_valid_or_none(array, ndim=2):
     """Return True if no array was passed in or if the array matches the
     dimensions specified
     """
+    if sp.issparse(array):
+        return array.ndim == ndim
     # check if array_like
     if not is_valid_or_none(array, (np.ndarray, list)):
         return False
@@ -213,3 +216,29 @@ def non_none_values(*args):
 def all_none(*args):
     """ Return True if all arguments passed in are None. """
     return all(a is None for a in args)
+
+
+def cast_to_dtype(array, dtype):
+    """Casts a floating-point array to `dtype`, and an integer array (e.g., a
+    matrix of counters) to the signed integer type of the same size as `dtype`
+    (e.g., `int32` for `float32`). Boolean arrays and other objects are
+    returned unchanged, as is everything if `dtype` is None.
+    """
+    if dtype is None or array is None:
+        return array
+    if isinstance(array, list):
+        array = np.asarray(array)
+    if not isinstance(array, np.ndarray) and not sp.issparse(array):
+        return array
+    dtype = np.dtype(dtype)
+    if np.issubdtype(array.dtype, np.floating):
+        target = dtype
+    elif np.issubdtype(array.dtype, np.integer):
+        target = np.dtype(f"int{8 * dtype.itemsize}")
+    else:
+        return array
+    if array.dtype == target:
+        return array
+    if sp.issparse(array):
+        return array.astype(target)
+    return np.asarray(array).astype(target)